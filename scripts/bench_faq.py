@@ -0,0 +1,133 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# mypy: ignore-errors
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+FILLERS = ["quisiera saber", "me puedes decir", "hola", "por favor", "una pregunta"]
+
+
+def _queries(faq, n, seed):
+    """Consultas de prueba derivadas del FAQ: q/keywords, con relleno y con erratas."""
+    seeds = []
+    for item in faq:
+        seeds.append(item.get("q") or "")
+        seeds += [k for k in item.get("keywords") or [] if isinstance(k, str)]
+    rnd = random.Random(seed)
+
+    def typo(s):
+        chars = list(s)
+        if len(chars) > 3:
+            i = rnd.randrange(len(chars))
+            chars[i:i + 1] = rnd.choice([[], [chars[i], chars[i]], [rnd.choice("aeiou")]])
+        return "".join(chars)
+
+    out = list(seeds)
+    while len(out) < n:
+        s = rnd.choice(seeds)
+        out.append(rnd.choice([typo(s), f"{rnd.choice(FILLERS)} {s}", f"{s} {rnd.choice(FILLERS)}", typo(f"{rnd.choice(FILLERS)} {s}")]))
+    return out[:n]
+
+
+def _synthetic_faq(faq, size, seed):
+    """FAQ de `size` entradas: variantes de las reales con un término distintivo cada una."""
+    rnd = random.Random(seed)
+    out = list(faq)
+    i = 0
+    while len(out) < size:
+        base = faq[i % len(faq)]
+        tag = "".join(rnd.choice("bcdfgklmnprstv") + rnd.choice("aeiou") for _ in range(3))
+        out.append({
+            "q": f"{base.get('q') or ''} {tag}",
+            "keywords": [f"{k} {tag}" for k in base.get("keywords") or [] if isinstance(k, str)],
+            "a": f"{base.get('a') or ''} [{tag}]",
+        })
+        i += 1
+    return out
+
+
+def _timed(index, queries, threshold, normalize):
+    lat = []
+    answers = []
+    for q in queries:
+        start = time.perf_counter()
+        t = normalize(q)
+        answers.append(index.match(t, threshold) if t and len(t) > 2 else None)
+        lat.append((time.perf_counter() - start) * 1000.0)
+    lat.sort()
+    return answers, {
+        "mean_ms": round(statistics.fmean(lat), 4),
+        "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 4),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del FAQ: motor difuso actual vs BM25")
+    parser.add_argument("--sizes", default="0,1000,5000", help="Tamaños de FAQ (0 = el FAQ real de rules.yaml)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--fuzzy-max-queries", type=int, default=100, help="Tope de consultas del motor difuso en FAQs grandes")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args(argv)
+
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    if str(SRC) not in sys.path:
+        sys.path.insert(0, str(SRC))
+
+    from src.config.rules_loader import get_rules  # type: ignore
+    from src.handlers.faq import FaqIndex, _faq_threshold, _normalize  # type: ignore
+    from src.handlers.faq_bm25 import Bm25FaqIndex  # type: ignore
+
+    rules = get_rules().get("default") or {}
+    faq = [item for item in rules.get("faq") or [] if isinstance(item, dict)]
+    threshold = _faq_threshold(rules) or 0.75
+    queries = _queries(faq, args.queries, args.seed)
+
+    # Coincidencia top-1 sobre el FAQ real (misma respuesta, incluido "sin respuesta")
+    fuzzy_answers, _ = _timed(FaqIndex(rules), queries, threshold, _normalize)
+    bm25_answers, _ = _timed(Bm25FaqIndex(rules), queries, threshold, _normalize)
+    both = sum(1 for a, b in zip(fuzzy_answers, bm25_answers) if a == b)
+    answered = [(a, b) for a, b in zip(fuzzy_answers, bm25_answers) if a is not None]
+    both_answer = [(a, b) for a, b in answered if b is not None]
+    report = {
+        "threshold": threshold,
+        "queries": len(queries),
+        "agreement": {
+            "top1": round(both / len(queries), 4),
+            "top1_when_fuzzy_answers": round(sum(1 for a, b in answered if a == b) / len(answered), 4) if answered else None,
+            "top1_when_both_answer": round(sum(1 for a, b in both_answer if a == b) / len(both_answer), 4) if both_answer else None,
+            "fuzzy_answered": round(len(answered) / len(queries), 4),
+            "bm25_answered": round(sum(1 for b in bm25_answers if b is not None) / len(queries), 4),
+        },
+        "latency": [],
+    }
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        big = {**rules, "faq": _synthetic_faq(faq, size, args.seed) if size else faq}
+        start = time.perf_counter()
+        bm25 = Bm25FaqIndex(big)
+        build_ms = (time.perf_counter() - start) * 1000.0
+        start = time.perf_counter()
+        fuzzy = FaqIndex(big)
+        fuzzy_build_ms = (time.perf_counter() - start) * 1000.0
+        # Muestra repartida (no las primeras): las keywords exactas resuelven por inclusión
+        step = max(1, len(queries) // args.fuzzy_max_queries)
+        fuzzy_queries = queries if not size else queries[::step][:args.fuzzy_max_queries]
+        _, fuzzy_lat = _timed(fuzzy, fuzzy_queries, threshold, _normalize)
+        _, bm25_lat = _timed(bm25, queries, threshold, _normalize)
+        report["latency"].append({
+            "faq_entries": len(big["faq"]),
+            "fuzzy": {**fuzzy_lat, "build_ms": round(fuzzy_build_ms, 1), "queries": len(fuzzy_queries)},
+            "bm25": {**bm25_lat, "build_ms": round(build_ms, 1), "queries": len(queries)},
+        })
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
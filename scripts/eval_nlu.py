@@ -0,0 +1,222 @@
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# mypy: ignore-errors
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+NONE_LABEL = "__none__"
+
+
+def _dataset(nlu_cfg, data_file):
+    """Ejemplos (texto, intent) desde rules.nlu.intents.patterns y un JSONL opcional."""
+    examples = []
+    for intent in nlu_cfg.get("intents") or []:
+        for p in intent.get("patterns") or []:
+            if isinstance(p, str) and p.strip():
+                examples.append((p, intent.get("name")))
+    if data_file:
+        with open(data_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                label = row.get("intent") or row.get("label")
+                if isinstance(row.get("text"), str) and label:
+                    examples.append((row["text"], label))
+    return examples
+
+
+def _folds(examples, k, seed):
+    """Reparto estratificado: los ejemplos de cada intent se distribuyen entre los k folds."""
+    by_label = {}
+    for ex in examples:
+        by_label.setdefault(ex[1], []).append(ex)
+    rnd = random.Random(seed)
+    folds = [[] for _ in range(k)]
+    offset = 0
+    for label in sorted(by_label):
+        items = by_label[label]
+        rnd.shuffle(items)
+        for i, ex in enumerate(items):
+            folds[(offset + i) % k].append(ex)
+        offset += len(items)
+    return folds
+
+
+def _train_cfg(nlu_cfg, train, overrides, model_path, key="ml"):
+    """Config nlu con los intents reducidos a los ejemplos de entrenamiento del fold."""
+    patterns = {}
+    for text, label in train:
+        patterns.setdefault(label, []).append(text)
+    intents = []
+    known = set()
+    for intent in nlu_cfg.get("intents") or []:
+        name = intent.get("name")
+        known.add(name)
+        intents.append({**intent, "patterns": patterns.get(name, [])})
+    for label in sorted(set(patterns) - known):
+        intents.append({"name": label, "patterns": patterns[label], "action": "reply"})
+    # Las opciones de features se aplican al bloque del proveedor (ml o linear)
+    ml = {**(nlu_cfg.get(key) or {}), **overrides.get("ml", {})}
+    ml.update({"model_path": str(model_path), "retrain_on_start": True, "incremental": False})
+    cfg = {**nlu_cfg, "intents": intents, key: ml}
+    if "threshold" in overrides:
+        cfg["threshold"] = overrides["threshold"]
+    return cfg
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def _evaluate_provider(provider, nlu_cfg, folds, overrides, tmp_dir):
+    from src.nlu.classifier import MLNLU, SimpleNLU  # type: ignore
+    from src.nlu.linear import LinearNLU  # type: ignore
+
+    trained = {"ml": MLNLU, "linear": LinearNLU}.get(provider)
+
+    y_true, y_pred, scores, latencies = [], [], [], []
+    batch_time = 0.0
+    threshold = None
+    for i, test in enumerate(folds):
+        if not test:
+            continue
+        train = [ex for j, f in enumerate(folds) if j != i for ex in f]
+        key = trained.config_key if trained else "ml"
+        cfg = _train_cfg(nlu_cfg, train, overrides, Path(tmp_dir) / f"{provider}_{i}.bin", key)
+        model = trained(cfg, data_dir=tmp_dir) if trained else SimpleNLU(cfg)
+        threshold = model.threshold
+        texts = [t for t, _ in test]
+
+        start = time.perf_counter()
+        results = model.classify_many(texts)
+        batch_time += time.perf_counter() - start
+
+        for text in texts:
+            start = time.perf_counter()
+            model.classify(text)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+        for (_, label), (match, score) in zip(test, results):
+            y_true.append(label)
+            y_pred.append(match.name if match else NONE_LABEL)
+            scores.append(score)
+
+    labels = sorted(set(y_true) | set(y_pred))
+    confusion = {t: {p: 0 for p in labels} for t in labels}
+    for t, p in zip(y_true, y_pred):
+        confusion[t][p] += 1
+    per_intent = {}
+    for label in sorted(set(y_true)):
+        tp = confusion[label][label]
+        predicted = sum(confusion[t][label] for t in labels)
+        actual = sum(confusion[label].values())
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = (2 * precision * recall / (precision + recall)) if (precision + recall) else 0.0
+        per_intent[label] = {
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "support": actual,
+        }
+
+    total = len(y_true)
+    correct = sum(1 for t, p in zip(y_true, y_pred) if t == p)
+    accepted = [(t, p) for t, p, s in zip(y_true, y_pred, scores) if threshold is not None and s >= threshold]
+    lat = sorted(latencies)
+    return {
+        "examples": total,
+        "accuracy": round(correct / total, 4) if total else None,
+        "threshold": threshold,
+        "coverage_at_threshold": round(len(accepted) / total, 4) if total else None,
+        "accuracy_at_threshold": round(sum(1 for t, p in accepted if t == p) / len(accepted), 4) if accepted else None,
+        "macro_f1": round(sum(v["f1"] for v in per_intent.values()) / len(per_intent), 4) if per_intent else None,
+        "per_intent": per_intent,
+        "confusion": confusion,
+        "throughput_msgs_per_s": round(total / batch_time, 1) if batch_time else None,
+        "latency_ms": {
+            "p50": round(_percentile(lat, 50), 4),
+            "p95": round(_percentile(lat, 95), 4),
+            "p99": round(_percentile(lat, 99), 4),
+        },
+    }
+
+
+def _pair(value):
+    a, b = [int(x) for x in value.split(",")]
+    return [a, b]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluación offline del NLU (k-fold) con salida JSON")
+    parser.add_argument("--providers", default="simple,ml", help="Proveedores a evaluar (simple, ml, linear), separados por comas")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--data", help="JSONL adicional con {\"text\": ..., \"intent\": ...} por línea")
+    parser.add_argument("--chat", help="chat_id cuyo override de reglas se evalúa (por defecto 'default')")
+    parser.add_argument("--char-ngrams", type=_pair, help="p.ej. 3,5")
+    parser.add_argument("--word-ngrams", type=_pair, help="p.ej. 1,2")
+    parser.add_argument("--alpha", type=float)
+    parser.add_argument("--hash-features", type=int)
+    parser.add_argument("--threshold", type=float)
+    parser.add_argument("--out", help="Archivo de salida JSON (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    if str(SRC) not in sys.path:
+        sys.path.insert(0, str(SRC))
+
+    from src.config.rules_loader import get_rules_for  # type: ignore
+
+    nlu_cfg = get_rules_for(args.chat).get("nlu") or {}
+    overrides = {"ml": {}}
+    if args.char_ngrams:
+        overrides["ml"]["char_ngrams"] = args.char_ngrams
+    if args.word_ngrams:
+        overrides["ml"]["word_ngrams"] = args.word_ngrams
+    if args.alpha is not None:
+        overrides["ml"]["alpha"] = args.alpha
+    if args.hash_features is not None:
+        overrides["ml"]["hash_features"] = args.hash_features
+    if args.threshold is not None:
+        overrides["threshold"] = args.threshold
+
+    examples = _dataset(nlu_cfg, args.data)
+    k = max(2, min(args.folds, len(examples)))
+    folds = _folds(examples, k, args.seed)
+    report = {
+        "config": {
+            "folds": k,
+            "seed": args.seed,
+            "examples": len(examples),
+            "data": args.data,
+            "overrides": overrides,
+        },
+        "providers": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for provider in [p.strip() for p in args.providers.split(",") if p.strip()]:
+            report["providers"][provider] = _evaluate_provider(provider, nlu_cfg, folds, overrides, tmp)
+
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(out, encoding="utf-8")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# mypy: ignore-errors
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+
+def _leave_one_out(MLNLU, nlu_cfg, hash_features, tmp_dir):
+    """Precisión leave-one-out: entrena sin cada patrón y lo clasifica."""
+    intents = list(nlu_cfg.get("intents") or [])
+    total = 0
+    hits = 0
+    vocab_sizes = []
+    for idx, intent in enumerate(intents):
+        pats = [p for p in (intent.get("patterns") or []) if isinstance(p, str) and p.strip()]
+        for held in pats:
+            reduced = [dict(it) for it in intents]
+            reduced[idx]["patterns"] = [p for p in pats if p != held]
+            cfg = {
+                **nlu_cfg,
+                "intents": reduced,
+                "ml": {
+                    **(nlu_cfg.get("ml") or {}),
+                    "model_path": str(Path(tmp_dir) / f"loo_{hash_features}.pkl"),
+                    "retrain_on_start": True,
+                    "hash_features": hash_features,
+                },
+            }
+            model = MLNLU(cfg, data_dir=tmp_dir)
+            match, _ = model.classify(held)
+            total += 1
+            hits += int(bool(match) and match.name == intent.get("name"))
+            vocab_sizes.append(len((model._model or {}).get("vocab") or {}))
+    return {
+        "hash_features": hash_features or None,
+        "examples": total,
+        "accuracy": round(hits / total, 4) if total else None,
+        "avg_columns": round(sum(vocab_sizes) / len(vocab_sizes), 1) if vocab_sizes else 0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compara vocabulario exacto vs hashing trick (leave-one-out)")
+    parser.add_argument("--buckets", default="256,1024,4096,65536", help="Lista de buckets separada por comas")
+    args = parser.parse_args()
+
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    if str(SRC) not in sys.path:
+        sys.path.insert(0, str(SRC))
+
+    from src.config.rules_loader import get_rules_for  # type: ignore
+    from src.nlu.classifier import MLNLU  # type: ignore
+
+    nlu_cfg = get_rules_for(None).get("nlu") or {}
+    buckets = [int(b) for b in args.buckets.split(",") if b.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [_leave_one_out(MLNLU, nlu_cfg, n, tmp) for n in [0] + buckets]
+    exact = rows[0]["accuracy"] or 0.0
+    for r in rows:
+        r["delta_vs_exact"] = round((r["accuracy"] or 0.0) - exact, 4)
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
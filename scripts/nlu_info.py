@@ -1,3 +1,4 @@
+import argparse
 import sys
 import json
 from pathlib import Path
@@ -10,6 +11,10 @@ SRC = ROOT / "src"
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Muestra información del modelo NLU")
+    parser.add_argument("model_path", nargs="?", help="Archivo de modelo (.bin o .pkl legado); por defecto ml.model_path")
+    args = parser.parse_args()
+
     # Asegurar imports locales
     if str(ROOT) not in sys.path:
         sys.path.insert(0, str(ROOT))
@@ -17,11 +22,17 @@ def main() -> None:
         sys.path.insert(0, str(SRC))
 
     from src.nlu.classifier import MLNLU  # type: ignore
+    from src.nlu.model_io import is_binary_model  # type: ignore
     from src.config.rules_loader import get_rules_for  # type: ignore
     from src.app.config import settings  # type: ignore
     from typing import cast
 
     nlu_cfg = cast(dict, get_rules_for(None) or {}).get("nlu") or {}  # type: ignore[union-attr]
+    if args.model_path:
+        if not Path(args.model_path).exists():
+            print("No existe el archivo de modelo:", args.model_path)
+            return
+        nlu_cfg = {**nlu_cfg, "ml": {**(nlu_cfg.get("ml") or {}), "model_path": args.model_path, "retrain_on_start": False}}
     model = MLNLU(nlu_cfg, data_dir=settings.data_dir)
     if not getattr(model, "_model", None):
         print("No hay modelo ML disponible. Entrena primero con scripts/train_nlu.py.")
@@ -31,6 +42,8 @@ def main() -> None:
     vocab = model._model.get("vocab", {})
     print("\n=== NLU ML INFO ===")
     print("Ruta:", Path(model.model_path).resolve())
+    fmt = "binario (mmap)" if is_binary_model(model.model_path) else "pickle (legado)"
+    print("Formato:", fmt, f"- {Path(model.model_path).stat().st_size} bytes")
     print("Labels:", ", ".join(labels))
     print("Vocab size:", len(vocab))
     print("Meta:")
@@ -0,0 +1,33 @@
+from pathlib import Path
+import argparse
+import sys
+
+# mypy: ignore-errors
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Reparte state.json / conversations.json (o sus particiones actuales) en N archivos. Ejecutar con el bot detenido."
+    )
+    parser.add_argument("--shards", type=int, required=True, help="Número de particiones (JSON_SHARDS)")
+    parser.add_argument("--data-dir", help="Directorio de datos (por defecto DATA_DIR)")
+    parser.add_argument("--kind", choices=["state", "conversations", "all"], default="all")
+    args = parser.parse_args()
+
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+    from src.app.config import settings  # type: ignore
+    from src.storage.sharded import reshard  # type: ignore
+
+    data_dir = Path(args.data_dir or settings.data_dir)
+    kinds = ["state", "conversations"] if args.kind == "all" else [args.kind]
+    for kind in kinds:
+        res = reshard(data_dir, kind, args.shards)
+        print(f"{kind}: {res['keys']} claves en {res['shards']} particiones -> {data_dir / kind}")
+
+
+if __name__ == "__main__":
+    main()
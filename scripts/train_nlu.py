@@ -1,4 +1,5 @@
 from pathlib import Path
+import argparse
 import sys
 import json
 
@@ -9,6 +10,18 @@ SRC = ROOT / "src"
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el modelo NLU desde rules.yaml")
+    parser.add_argument(
+        "--model-path",
+        help="Ruta de salida (por defecto ml.model_path o linear.model_path). Extensión .pkl = pickle legado; otra = formato binario",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignorar los conteos guardados y recontar todos los intents",
+    )
+    args = parser.parse_args()
+
     # Ensure local imports work
     if str(ROOT) not in sys.path:
         sys.path.insert(0, str(ROOT))
@@ -17,16 +30,34 @@ def main() -> None:
 
     from src.config.rules_loader import get_rules_for  # type: ignore
     from src.nlu.classifier import MLNLU  # type: ignore
+    from src.nlu.linear import LinearNLU  # type: ignore
     from src.app.config import settings  # type: ignore
 
     rules = get_rules_for(None)
     nlu_cfg = rules.get("nlu") or {}
+    # provider linear entrena la regresión logística; cualquier otro, Naive Bayes
+    cls = LinearNLU if str(nlu_cfg.get("provider") or "").lower() == "linear" else MLNLU
     # Forzamos reentrenamiento
-    nlu_cfg = {**nlu_cfg, "ml": {**(nlu_cfg.get("ml") or {}), "retrain_on_start": True}}
-    model = MLNLU(nlu_cfg, data_dir=settings.data_dir)
-    print("Modelo NLU entrenado y guardado en:", Path(model.model_path).resolve())
+    ml_cfg = {**(nlu_cfg.get(cls.config_key) or {}), "retrain_on_start": True}
+    if args.model_path:
+        ml_cfg["model_path"] = args.model_path
+    if args.full:
+        ml_cfg["incremental"] = False
+    nlu_cfg = {**nlu_cfg, cls.config_key: ml_cfg}
+    model = cls(nlu_cfg, data_dir=settings.data_dir)
+    fmt = "pickle" if Path(model.model_path).suffix == ".pkl" else "binario"
+    print(f"Modelo NLU entrenado y guardado ({fmt}) en:", Path(model.model_path).resolve())
     intents = [i.get("name") for i in (nlu_cfg.get("intents") or [])]
     print("Intents:", ", ".join(intents))
+    training = ((getattr(model, "_model", None) or {}).get("meta") or {}).get("training") or {}
+    if "loss" in training:
+        print("Pérdida (log-loss):", training.get("loss"), "| accuracy entrenamiento:", training.get("train_accuracy"))
+    elif training:
+        print(
+            "Recontados:", len(training.get("recounted") or []),
+            "| reutilizados:", len(training.get("reused") or []),
+            "| eliminados:", len(training.get("removed") or []),
+        )
 
     # Guardar reporte JSON
     report_path = Path(settings.data_dir) / "models" / "nlu_report.json"
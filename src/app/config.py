@@ -10,5 +10,18 @@ class Settings(BaseModel):
     telegram_token: str = os.getenv("TELEGRAM_TOKEN", "")
     telegram_bot_name: str = os.getenv("TELEGRAM_BOT_NAME", "AtencionClienteBot")
     data_dir: str = os.getenv("DATA_DIR", "data")
+    # Almacenamiento de estado, historial y tickets: "json" (archivos) o "sqlite" (data_dir/sqlite_file, WAL)
+    data_backend: str = os.getenv("DATA_BACKEND", "json")
+    sqlite_file: str = os.getenv("SQLITE_FILE", "clientcare.sqlite3")
+    # Solo historial: "log" (append-only por conversación), "json" o "sqlite"; vacío = data_backend
+    conversation_backend: str = os.getenv("CONVERSATION_BACKEND", "")
+    # Backend json: >0 reparte estado e historial en N archivos (data/state/NN.json, data/conversations/NN.json)
+    json_shards: int = int(os.getenv("JSON_SHARDS", "0") or 0)
+    # Caché write-back de state.json (solo backend json): flush cada N segundos o con N claves sucias
+    state_cache: bool = os.getenv("STATE_CACHE", "0").strip().lower() in ("1", "true", "yes", "on")
+    state_flush_interval: float = float(os.getenv("STATE_FLUSH_INTERVAL", "2") or 2)
+    state_max_dirty: int = int(os.getenv("STATE_MAX_DIRTY", "100") or 100)
+    # Mensajes procesados a la vez por process_message_async (hilos del executor)
+    bot_concurrency: int = int(os.getenv("BOT_CONCURRENCY", "4") or 4)
 
 settings = Settings()
@@ -1,11 +1,25 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, HTTPException
 from .config import settings
 from ..connectors.webchat_router import router as webchat_router
 from ..connectors.whatsapp_router import router as whatsapp_router
 import os
 from ..config.rules_loader import reload_rules_cache, get_rules
+from ..bot_core.dispatcher import dispatcher
+from ..nlu.cache import classification_cache
+from ..nlu.registry import registry as nlu_registry
+from ..storage.backends import flush_storage, storage_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Apagado: persistir el estado pendiente de la caché write-back
+    flush_storage()
 
-app = FastAPI(title="AtencionCliente API")
+
+app = FastAPI(title="AtencionCliente API", lifespan=lifespan)
 
 @app.get("/health")
 def health():
@@ -16,6 +30,13 @@ app.include_router(webchat_router)
 app.include_router(whatsapp_router)
 
 
+def _check_admin_token(req: Request) -> None:
+    configured = os.getenv("ADMIN_RELOAD_TOKEN")
+    token = req.headers.get("X-Admin-Token") or req.query_params.get("token")
+    if configured and token != configured:
+        raise HTTPException(status_code=403, detail="Forbidden: invalid token")
+
+
 @app.get("/admin/reload_rules")
 async def admin_reload(req: Request):
     """Recargar reglas en el proceso actual. Opcionalmente protege con ADMIN_RELOAD_TOKEN env var.
@@ -23,10 +44,7 @@ async def admin_reload(req: Request):
     - Si ADMIN_RELOAD_TOKEN está definido, se debe enviar en header X-Admin-Token o query ?token=...
     - Devuelve 200 y las claves principales de rules tras recargar, o 500 con error de parseo.
     """
-    configured = os.getenv("ADMIN_RELOAD_TOKEN")
-    token = req.headers.get("X-Admin-Token") or req.query_params.get("token")
-    if configured and token != configured:
-        raise HTTPException(status_code=403, detail="Forbidden: invalid token")
+    _check_admin_token(req)
     try:
         reload_rules_cache()
         rules = get_rules()
@@ -34,3 +52,24 @@ async def admin_reload(req: Request):
         return {"status": "ok", "top_keys": list(rules.keys())[:20]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/admin/nlu_cache")
+async def admin_nlu_cache(req: Request):
+    """Contadores de la caché de clasificación NLU y del registro de modelos (por tenant) para dimensionarlos."""
+    _check_admin_token(req)
+    return {"status": "ok", "cache": classification_cache.stats(), "registry": nlu_registry.stats()}
+
+
+@app.get("/admin/dispatcher")
+async def admin_dispatcher(req: Request):
+    """Buzones por conversación: profundidad de cola, tiempo de espera y buzones expulsados por inactividad."""
+    _check_admin_token(req)
+    return {"status": "ok", "dispatcher": dispatcher.stats()}
+
+
+@app.get("/admin/storage")
+async def admin_storage(req: Request):
+    """Caché write-back de estado: claves sucias y duración de los flush."""
+    _check_admin_token(req)
+    return {"status": "ok", "storage": storage_stats()}
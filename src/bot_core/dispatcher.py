@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from ..app.config import settings
+
+_Item = Tuple[Callable[..., Any], Tuple[Any, ...], Future, float]
+
+
+class _Mailbox:
+    __slots__ = ("queue", "running", "last_active")
+
+    def __init__(self, now: float) -> None:
+        self.queue: Deque[_Item] = deque()
+        self.running = False
+        self.last_active = now
+
+
+class ConversationDispatcher:
+    """Reparte mensajes en buzones por conversación sobre un pool de hilos.
+
+    Cada clave (chat_id, user_id) tiene un buzón que se procesa en orden y de a un
+    mensaje: tres mensajes seguidos del mismo usuario no compiten por el
+    leer-modificar-escribir de estado e historial. Buzones distintos sí corren en
+    paralelo en el pool (max_workers hilos). Un worker atiende como mucho `burst`
+    mensajes de un buzón y vuelve a encolarse para no acaparar el pool.
+
+    Los buzones vacíos se eliminan tras `idle_seconds` sin actividad. stats()
+    expone profundidad de cola y tiempo de espera (encolado -> inicio).
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        idle_seconds: float = 60.0,
+        burst: int = 8,
+    ) -> None:
+        self.max_workers = max_workers
+        self.idle_seconds = idle_seconds
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._mailboxes: Dict[Hashable, _Mailbox] = {}
+        self._last_sweep = time.monotonic()
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self.pending = 0
+        self.max_depth = 0
+        self.started = 0
+        self.processed = 0
+        self.errors = 0
+        self.evictions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                workers = self.max_workers or settings.bot_concurrency
+                self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bot")
+            return self._executor
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Future:
+        """Encola fn(*args) en el buzón `key`; devuelve un Future con el resultado."""
+        executor = self.executor
+        fut: Future = Future()
+        now = time.monotonic()
+        with self._lock:
+            box = self._mailboxes.get(key)
+            if box is None:
+                box = self._mailboxes[key] = _Mailbox(now)
+            box.queue.append((fn, args, fut, now))
+            box.last_active = now
+            self.pending += 1
+            self.max_depth = max(self.max_depth, len(box.queue))
+            start = not box.running
+            box.running = True
+            self._sweep(now)
+        if start:
+            executor.submit(self._drain, key, box)
+        return fut
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """submit() esperable desde el event loop."""
+        return await asyncio.wrap_future(self.submit(key, fn, *args))
+
+    def _drain(self, key: Hashable, box: _Mailbox) -> None:
+        for _ in range(self.burst):
+            with self._lock:
+                if not box.queue:
+                    box.running = False
+                    box.last_active = time.monotonic()
+                    return
+                fn, args, fut, enqueued = box.queue.popleft()
+                self.pending -= 1
+                self.started += 1
+                wait = time.monotonic() - enqueued
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                logging.exception(f"dispatcher: error procesando mensaje de {key}")
+                with self._lock:
+                    self.errors += 1
+                fut.set_exception(e)
+            with self._lock:
+                self.processed += 1
+        # Quedan mensajes: ceder el worker y reencolar el buzón al final del pool
+        self.executor.submit(self._drain, key, box)
+
+    def _sweep(self, now: float) -> None:
+        """Elimina buzones vacíos e inactivos (llamar con el lock tomado)."""
+        if now - self._last_sweep < self.idle_seconds:
+            return
+        self._last_sweep = now
+        idle = [
+            k for k, b in self._mailboxes.items()
+            if not b.running and not b.queue and now - b.last_active >= self.idle_seconds
+        ]
+        for k in idle:
+            del self._mailboxes[k]
+        self.evictions += len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers or settings.bot_concurrency,
+                "mailboxes": len(self._mailboxes),
+                "active": sum(1 for b in self._mailboxes.values() if b.running),
+                "pending": self.pending,
+                "max_depth": self.max_depth,
+                "processed": self.processed,
+                "errors": self.errors,
+                "evictions": self.evictions,
+                "wait_avg_ms": (self.wait_total / self.started * 1000) if self.started else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+            }
+
+    def clear_stats(self) -> None:
+        with self._lock:
+            self._reset_counters()
+            self.pending = sum(len(b.queue) for b in self._mailboxes.values())
+
+
+dispatcher = ConversationDispatcher()
+
+
+def conversation_key(payload: Dict[str, Any]) -> Tuple[str, str]:
+    """(chat_id, user_id) del payload, igual que los lee MessageContext."""
+    return (str(payload.get("group_id") or ""), str(payload.get("platform_user_id") or ""))
+
+
+__all__ = ["ConversationDispatcher", "conversation_key", "dispatcher"]
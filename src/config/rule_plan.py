@@ -0,0 +1,187 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ..utils.aho_corasick import KeywordMatcher
+from ..utils.duration import parse_duration_to_seconds
+
+DEFAULT_TICKET_ASK = "Por favor, cuéntame brevemente el problema."
+DEFAULT_REMINDER = "¿Sigues ahí? Si necesitas ayuda, puedes contarme más o escribe 'menu' para ver opciones."
+DEFAULT_CLOSE = "He cerrado el chat por inactividad. Si necesitas algo más, escribe de nuevo para empezar un nuevo tema."
+DEFAULT_RESUME = "Veo que tenías pendiente: {topic}. ¿Quieres continuar?"
+
+
+def _first_response(cfg: Dict[str, Any]) -> Optional[str]:
+    """reply_text o, si no hay, la primera de responses (selección determinista)."""
+    rep = cfg.get("reply_text")
+    if not rep:
+        res_list = list(cfg.get("responses") or [])
+        if res_list:
+            rep = res_list[0]
+    return rep or None
+
+
+def _lowered(words: Any) -> Tuple[str, ...]:
+    return tuple(w.lower() for w in (words or []) if isinstance(w, str))
+
+
+@dataclass(frozen=True)
+class MenuOption:
+    action: str
+    target: str
+    reply: Optional[str]
+
+
+@dataclass(frozen=True)
+class MenuNode:
+    text: str
+    options: Tuple[MenuOption, ...]
+    # Triggers de todas las opciones; first_group() da el índice de la opción
+    matcher: KeywordMatcher
+
+    def match(self, tnorm: str) -> Optional[MenuOption]:
+        hit = self.matcher.first_group(tnorm)
+        return self.options[hit] if hit is not None else None
+
+
+@dataclass(frozen=True)
+class IntentShortcut:
+    """Pre-check por patterns de un intent (catálogo, satisfacción)."""
+
+    matcher: KeywordMatcher
+    reply: Optional[str]
+
+    def matches(self, tnorm: str) -> bool:
+        # coincidencia flexible: igualdad, inclusión o viceversa
+        return bool(self.matcher) and (self.matcher.any(tnorm) or self.matcher.any_contains(tnorm))
+
+
+class RulePlan(Mapping):
+    """Reglas efectivas de un chat (default + override) ya compiladas.
+
+    Se construye una vez por chat_id y versión de reglas (ver get_rules_for) y no
+    se modifica. Como Mapping de solo lectura se sigue usando igual que el dict
+    fusionado (`plan.get("tickets")`), y además expone lo que el bot derivaba en
+    cada mensaje: sinónimos en minúsculas y sus autómatas, duraciones ya
+    parseadas, el grafo de menús con los triggers de cada opción e intents por
+    nombre.
+    """
+
+    def __init__(self, merged: Dict[str, Any], chat_id: Optional[str] = None, own_nlu: bool = False) -> None:
+        self._raw = merged
+        self.chat_id = chat_id
+        self.own_nlu = own_nlu
+        get = merged.get
+
+        self.nlu: Dict[str, Any] = get("nlu") or {}
+        self.fallback_text: str = get("fallback_text", "No entendí tu mensaje.")
+        self.menu_text_default: str = get("menu_text", "Escribe tu consulta.")
+        self.catalog_message = (get("catalog", {}) or {}).get("message")
+        self.ticket_ask: str = (get("tickets", {}) or {}).get("message_ask_detail") or DEFAULT_TICKET_ASK
+        features = get("features") or {}
+        self._features = {k: bool(v.get("enabled", True)) if isinstance(v, dict) else True for k, v in features.items()}
+
+        # Sinónimos: listas en minúsculas y autómatas "alguna contenida en el texto"
+        synonyms = get("synonyms") or {}
+        self.synonyms: Dict[str, KeywordMatcher] = {k: KeywordMatcher(_lowered(v)) for k, v in synonyms.items()}
+        self.menu_accept = frozenset(_lowered(synonyms.get("menu_accept")))
+
+        # Saludo
+        self.greeting_enabled = bool(get("greeting_enabled", True))
+        self.greeting_force_on_first = bool(get("greeting_force_on_first_message", True))
+        self.greeting_triggers = frozenset(_lowered((self.nlu.get("greetings") or {}).get("triggers")))
+        self.greeting_menu_prompt_enabled = bool(get("greeting_menu_prompt_enabled", True))
+        self.greeting_menu_prompt_text = get("greeting_menu_prompt_text")
+        try:
+            self.greeting_menu_prompt_delay = float(get("greeting_menu_prompt_delay", 5) or 5)
+        except Exception:
+            self.greeting_menu_prompt_delay = 5.0
+
+        # Memoria e inactividad (duraciones parseadas una vez)
+        memory = get("memory") or {}
+        self.history_max = int(memory.get("history_max") or 100)
+        # Retrocompatibilidad: resume_after_minutes (minutos) o resume_after ("30m", "2h", "1d")
+        if "resume_after_minutes" in memory:
+            self.resume_seconds = int(memory.get("resume_after_minutes") or 60) * 60
+        else:
+            self.resume_seconds = parse_duration_to_seconds(memory.get("resume_after") or "60m", default_unit="m")
+        self.offer_resume_message = memory.get("offer_resume_message") or DEFAULT_RESUME
+        inactivity = memory.get("inactivity") or {}
+        self.inactivity_enabled = inactivity.get("enabled", True) is not False
+        self.reminder_after = parse_duration_to_seconds(inactivity.get("reminder_after") or "30m")
+        self.close_after = parse_duration_to_seconds(inactivity.get("close_after") or "24h")
+        self.reminder_message = inactivity.get("reminder_message") or DEFAULT_REMINDER
+        self.close_message = inactivity.get("close_message") or DEFAULT_CLOSE
+        self.send_reminder_once = bool(inactivity.get("send_reminder_once", True))
+        # Estados que esperan respuesta del usuario
+        self.monitor_states = frozenset(inactivity.get("monitor_states") or ["ticket:ask_detail"])
+
+        # Grafo de menús: solo items habilitados y opciones habilitadas
+        menus = get("menus") or {}
+        self.menus_enabled = bool(menus.get("enabled", True))
+        self.menu_root = str(menus.get("root") or "main")
+        self.menu_nodes: Dict[str, MenuNode] = {}
+        for mid, item in (menus.get("items") or {}).items():
+            if not item or item.get("enabled") is False:
+                continue
+            opts = [o for o in (item.get("options") or []) if o.get("enabled", True) is not False]
+            self.menu_nodes[mid] = MenuNode(
+                text=str(item.get("text") or get("menu_text") or "Escribe tu consulta."),
+                options=tuple(
+                    MenuOption(action=(o.get("action") or "").lower(), target=o.get("target") or "", reply=_first_response(o))
+                    for o in opts
+                ),
+                matcher=KeywordMatcher.from_groups(o.get("triggers") for o in opts),
+            )
+        self.dynamic_menus = self.menus_enabled and bool(menus.get("items") or {})
+
+        # Intents por nombre (el primero con ese nombre) y pre-checks por patterns
+        self.intents: Dict[str, Dict[str, Any]] = {}
+        for it in self.nlu.get("intents") or []:
+            self.intents.setdefault((it.get("name") or "").lower(), it)
+        self.catalog = self._shortcut("ver_catalogo", _first_response)
+        self.satisfaction = self._shortcut("satisfaccion", self._satisfaction_reply)
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise AttributeError("RulePlan es de solo lectura")
+        super().__setattr__(name, value)
+
+    def _shortcut(self, name: str, reply) -> Optional[IntentShortcut]:
+        it = self.intents.get(name)
+        if it is None:
+            return None
+        return IntentShortcut(KeywordMatcher([str(p).lower() for p in (it.get("patterns") or [])]), reply(it))
+
+    @staticmethod
+    def _satisfaction_reply(it: Dict[str, Any]) -> Optional[str]:
+        responses = list(it.get("responses") or [])
+        if it.get("reply_text"):
+            responses.append(it.get("reply_text"))
+        return responses[0] if responses else None
+
+    # Mapping de solo lectura sobre las reglas fusionadas
+    def __getitem__(self, key: str) -> Any:
+        return self._raw[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def enabled(self, feature: str) -> bool:
+        return self._features.get(feature, True)
+
+    def synonym(self, name: str) -> KeywordMatcher:
+        return self.synonyms.get(name) or _EMPTY
+
+    def menu_text(self, mid: str) -> str:
+        node = self.menu_nodes.get(mid)
+        return node.text if node else str(self._raw.get("menu_text") or "Escribe tu consulta.")
+
+
+_EMPTY = KeywordMatcher([])
+
+__all__ = ["IntentShortcut", "MenuNode", "MenuOption", "RulePlan"]
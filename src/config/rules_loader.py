@@ -1,6 +1,9 @@
 from pathlib import Path
+import threading
 import yaml
 
+from .rule_plan import RulePlan
+
 ROOT = Path(__file__).resolve().parents[2]
 RULES_FILE = ROOT / "config" / "rules.yaml"
 
@@ -64,18 +67,43 @@ def get_rules():
             pass
     return _cache
 
-def get_rules_for(chat_id: str | None):
+# Planes compilados por chat_id para la versión de reglas en caché
+_plans: dict = {}
+_plans_source = None
+# Los hilos de process_message_async comparten la caché: comprobar la versión y
+# guardar el plan van juntos, para no guardar un plan viejo bajo reglas nuevas
+_plans_lock = threading.Lock()
+
+
+def get_rules_for(chat_id: str | None) -> RulePlan:
+    """Reglas efectivas del chat como RulePlan (Mapping de solo lectura ya compilado).
+
+    Se compila una vez por chat_id y versión de reglas; los chats sin override
+    comparten el plan de default.
+    """
+    global _plans_source
     rules = get_rules()
-    if chat_id and chat_id in rules:
-        base = rules.get("default", {}) or {}
-        override = rules.get(chat_id) or {}
-        # merge simple (override sobre default)
-        merged = {**base, **override}
-        return merged
-    return rules.get("default", {}) or {}
+    key = chat_id if chat_id and chat_id in rules else None
+    with _plans_lock:
+        if _plans_source is not rules:
+            _plans.clear()
+            _plans_source = rules
+        plan = _plans.get(key)
+        if plan is None:
+            base = rules.get("default", {}) or {}
+            if key is not None:
+                override = rules.get(chat_id) or {}
+                # merge simple (override sobre default)
+                plan = RulePlan({**base, **override}, chat_id=key, own_nlu="nlu" in override)
+            else:
+                plan = RulePlan(base)
+            _plans[key] = plan
+    return plan
 
 def reload_rules_cache():
     global _cache
     global _cache_mtime
     _cache = None
     _cache_mtime = None
+    with _plans_lock:
+        _plans.clear()
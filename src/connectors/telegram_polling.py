@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, ContextTypes, filters
 from telegram import Update
 from ..bot_core.manager import BotManager
-from ..storage.repository import TicketRepository
+from ..storage.backends import flush_storage, ticket_repository
 from ..app.config import settings
 
 ROOT = Path(__file__).resolve().parents[2]
@@ -13,7 +13,7 @@ TOKEN = os.getenv("TELEGRAM_TOKEN", "")
 BOT_NAME = os.getenv("TELEGRAM_BOT_NAME", "AtencionClienteBot")
 
 manager = BotManager()
-repo = TicketRepository(Path(settings.data_dir))
+repo = ticket_repository(Path(settings.data_dir))
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Validaciones para evitar None en atributos opcionales
@@ -25,7 +25,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "group_id": str(update.effective_chat.id),
         "text": "/start",
     }
-    resp = manager.process_message(payload) or {}
+    resp = await manager.process_message_async(payload) or {}
     if resp.get("text") and update.message is not None:
         await update.message.reply_text(resp["text"])
 
@@ -39,7 +39,7 @@ async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "group_id": str(update.effective_chat.id),
         "text": text,
     }
-    resp = manager.process_message(payload) or {}
+    resp = await manager.process_message_async(payload) or {}
     if resp.get("text") and update.message is not None:
         await update.message.reply_text(resp["text"])
 
@@ -81,7 +81,11 @@ def main():
     app.add_handler(CommandHandler("reload", cmd_reload))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_message))
     print(f"[{BOT_NAME}] Iniciado en modo polling")
-    app.run_polling()
+    try:
+        app.run_polling()
+    finally:
+        # Persistir el estado pendiente de la caché write-back al salir
+        flush_storage()
 
 if __name__ == "__main__":
     main()
@@ -20,14 +20,14 @@ def _auth(x_api_key: str | None = Header(default=None)):
 
 
 @router.post("/message")
-def post_message(msg: WebchatMessage, _=Depends(_auth)):
+async def post_message(msg: WebchatMessage, _=Depends(_auth)):
     payload = {
         "platform": "webchat",
         "platform_user_id": msg.user_id,
         "group_id": msg.chat_id or "",
         "text": msg.text,
     }
-    res = manager.process_message(payload) or {}
+    res = await manager.process_message_async(payload) or {}
     # Si manager devuelve mensajes múltiples, devolvemos esa estructura para que el cliente la respete
     if res.get("messages"):
         return {"ok": True, "response": {"messages": res.get("messages")}}
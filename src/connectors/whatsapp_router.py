@@ -12,6 +12,8 @@ manager = BotManager()
 VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "").strip()
 # NOTE: read ACCESS_TOKEN and PHONE_ID at call-time to allow runtime updates if the process env is changed
 _token_invalid_until = 0.0
+# Envíos en segundo plano (referencia fuerte hasta que terminan)
+_send_tasks: set = set()
 
 
 
@@ -87,6 +89,34 @@ async def _send_whatsapp_text(to: str, text: str):
             logging.exception(f"Error sending message to WhatsApp API for {to}")
 
 
+async def _deliver(to: str, responses: list):
+    """Enviar en orden las respuestas de un usuario, respetando los delays de {'messages': [...]}."""
+    try:
+        for res in responses:
+            # Soportar respuestas múltiples con delays: {'messages': [{'text': 'a'}, {'text': 'b', 'delay':5}]}
+            messages_list = res.get("messages")
+            if isinstance(messages_list, list):
+                for m in messages_list:
+                    try:
+                        d = float(m.get("delay", 0) or 0)
+                    except Exception:
+                        d = 0
+                    if d > 0:
+                        logging.info(f"Delaying {d}s before sending next message to {to}")
+                        await asyncio.sleep(d)
+                    text_to_send = m.get("text")
+                    if isinstance(text_to_send, str) and text_to_send:
+                        logging.info(f"Sending reply to {to}: {text_to_send}")
+                        await _send_whatsapp_text(to, text_to_send)
+            else:
+                text_to_send = res.get("text")
+                if isinstance(text_to_send, str) and text_to_send:
+                    logging.info(f"Sending reply to {to}: {text_to_send}")
+                    await _send_whatsapp_text(to, text_to_send)
+    except Exception:
+        logging.exception(f"Error delivering replies to {to}")
+
+
 @router.post("/webhook")
 async def receive(request: Request):
     # Proteger la lectura del JSON para evitar 500 si el body no es JSON válido
@@ -100,6 +130,7 @@ async def receive(request: Request):
     logging.info(f"Webhook POST received: {data}")
 
     # Extraer mensajes entrantes básicos (validando tipos para mypy/CI)
+    payloads = []
     try:
         entries = data.get("entry")
         if not isinstance(entries, list):
@@ -128,38 +159,28 @@ async def receive(request: Request):
                         if isinstance(body, str):
                             text = body
                     logging.info(f"Incoming message from {from_id}: {text}")
-                    payload = {
+                    payloads.append({
                         "platform": "whatsapp",
                         "platform_user_id": from_id,
                         "group_id": value.get("metadata", {}).get("display_phone_number", "") if isinstance(value.get("metadata"), dict) else "",
                         "text": text,
-                    }
-                    res = manager.process_message(payload) or {}
-                    logging.info(f"Manager response for {from_id}: {res}")
-                    logging.debug(f"[DEBUG] Respuesta completa del manager (payload={payload}): {res}")
-                    # Soportar respuestas múltiples con delays: {'messages': [{'text': 'a'}, {'text': 'b', 'delay':5}]}
-                    messages_list = res.get("messages")
-                    if isinstance(messages_list, list):
-                        for m in messages_list:
-                            try:
-                                d = float(m.get("delay", 0) or 0)
-                            except Exception:
-                                d = 0
-                            if d > 0:
-                                logging.info(f"Delaying {d}s before sending next message to {from_id}")
-                                await asyncio.sleep(d)
-                            text_to_send = m.get("text")
-                            if isinstance(text_to_send, str) and text_to_send:
-                                logging.info(f"Sending reply to {from_id}: {text_to_send}")
-                                await _send_whatsapp_text(from_id, text_to_send)
-                    else:
-                        text_to_send = res.get("text")
-                        if isinstance(text_to_send, str) and text_to_send:
-                            logging.info(f"Sending reply to {from_id}: {text_to_send}")
-                            await _send_whatsapp_text(from_id, text_to_send)
+                    })
+        # Todo el lote de una vez: en orden por usuario y usuarios distintos en paralelo
+        results = await manager.process_batch_async(payloads) if payloads else []
     except Exception:
         # Registrar excepción para poder depurar y devolver 500 para visibilidad
         logging.exception("Error processing webhook POST")
         raise HTTPException(status_code=500, detail="Error processing webhook event")
 
+    # Enviar sin retener la respuesta del webhook (los delays entre mensajes no bloquean a Meta)
+    replies: dict = {}
+    for payload, res in zip(payloads, results):
+        logging.info(f"Manager response for {payload['platform_user_id']}: {res}")
+        logging.debug(f"[DEBUG] Respuesta completa del manager (payload={payload}): {res}")
+        replies.setdefault(payload["platform_user_id"], []).append(res or {})
+    for to, responses in replies.items():
+        task = asyncio.create_task(_deliver(to, responses))
+        _send_tasks.add(task)
+        task.add_done_callback(_send_tasks.discard)
+
     return {"ok": True}
@@ -1,6 +1,8 @@
 import re
 from difflib import SequenceMatcher
+from typing import Any
 from ..config.rules_loader import get_rules
+from ..utils.aho_corasick import KeywordMatcher
 
 
 def build_auto_capabilities(rules: dict, max_examples: int = 3) -> str:
@@ -75,14 +77,155 @@ def _normalize(s: str) -> str:
     return s.strip()
 
 
+def _faq_settings(rules: dict) -> dict:
+    features = rules.get("features", {}) or {}
+    faq_cfg = features.get("faq", {}) if isinstance(features, dict) else {}
+    return faq_cfg if isinstance(faq_cfg, dict) else {}
+
+
+def _faq_threshold(rules: dict) -> float | None:
+    """features.faq.match_threshold si está definido (numérico)."""
+    value = _faq_settings(rules).get("match_threshold")
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _faq_entries(rules: dict) -> list[tuple[dict, str | None]]:
+    """Items del FAQ con su respuesta ya resuelta ({auto}); None si no tienen respuesta."""
+    auto = None
+    entries = []
+    for item in rules.get("faq", []) or []:
+        if not isinstance(item, dict):
+            continue
+        ans = item.get("a") or None
+        if ans and "{auto}" in ans:
+            if auto is None:
+                auto = build_auto_capabilities(rules)
+            ans = ans.replace("{auto}", auto)
+        entries.append((item, ans))
+    return entries
+
+
+class FaqIndex:
+    """Índice del FAQ compilado una vez por versión de reglas.
+
+    Guarda las keywords ya normalizadas (en el mismo orden que recorría answer_faq),
+    un autómata Aho–Corasick sobre ellas, los tokens de cada keyword y un índice
+    invertido token -> keywords, y las respuestas ya resueltas ({auto}).
+
+    Por mensaje:
+    - Inclusión: gana la primera keyword (en orden) contenida en el texto; el
+      autómata las encuentra todas en una pasada (cubre también la igualdad exacta).
+    - Solapamiento de tokens: se evalúa cada token distinto de las keywords una vez
+      contra los tokens del mensaje y el índice invertido da las keywords con
+      solapamiento > 0; el resto tiene puntaje 0.
+    - Similitud difusa: un solo SequenceMatcher con el mensaje como seq2 (su índice
+      se construye una vez) y cotas superiores baratas (longitudes, quick_ratio):
+      una keyword cuya cota no alcanza el umbral ni el mejor puntaje no puede
+      cambiar la respuesta, así que el resultado es idéntico al recorrido completo.
+    """
+
+    def __init__(self, rules: dict, entries: list[tuple[dict, Any]] | None = None) -> None:
+        self.rules = rules
+        self.threshold = _faq_threshold(rules)
+        # `entries` permite indexar otros items (p.ej. candidatos del FAQ externo) con
+        # cualquier valor como "respuesta"; match() devuelve ese valor.
+        if entries is None:
+            entries = _faq_entries(rules)
+        self.answers: list[Any] = [ans for _, ans in entries]
+        # (keyword normalizada, índice del item) en orden de evaluación
+        self.keywords: list[tuple[str, int]] = []
+        for idx, (item, _) in enumerate(entries):
+            self.keywords.append((_normalize(item.get("q") or ""), idx))
+            if "keywords" in item and isinstance(item["keywords"], list):
+                self.keywords += [(_normalize(k), idx) for k in item["keywords"] if isinstance(k, str)]
+
+        self._matcher = KeywordMatcher(kw for kw, _ in self.keywords)
+        self._tokens: list[frozenset[str]] = []
+        self._token_index: dict[str, list[int]] = {}
+        for pos, (kw, _) in enumerate(self.keywords):
+            tokens = frozenset(kw.split())
+            self._tokens.append(tokens)
+            for tok in tokens:
+                self._token_index.setdefault(tok, []).append(pos)
+
+    def match(self, t: str, threshold: float) -> str | None:
+        """Respuesta para el texto ya normalizado `t` (misma semántica que answer_faq)."""
+        # 1) Coincidencia exacta / inclusión: la primera keyword en orden
+        pos = self._matcher.first(t)
+        if pos is not None:
+            return self.answers[self.keywords[pos][1]]
+
+        # 3) Solapamiento de tokens, una vez por token distinto de las keywords
+        t_tokens = set(t.split())
+        overlap: dict[int, int] = {}
+        for ktk, positions in self._token_index.items():
+            if any(ktk == ttk or ktk in ttk or ttk in ktk for ttk in t_tokens):
+                for pos in positions:
+                    overlap[pos] = overlap.get(pos, 0) + 1
+
+        # 2) Similitud difusa con poda por cotas superiores
+        sm = SequenceMatcher(None, "", t)
+        lt = len(t)
+        best_score = 0.0
+        best_answer = None
+        for pos, (kw, idx) in enumerate(self.keywords):
+            score = overlap.get(pos, 0) / max(1, len(self._tokens[pos]))
+            bound = max(threshold, best_score)
+            lk = len(kw)
+            if 2.0 * min(lk, lt) / (lk + lt) >= bound:
+                sm.set_seq1(kw)
+                if sm.quick_ratio() >= bound:
+                    score = max(score, sm.ratio())
+            if score > best_score:
+                best_score = score
+                best_answer = self.answers[idx]
+
+        # Solo responde si la mejor coincidencia supera el umbral
+        if best_score >= threshold and best_answer:
+            return best_answer
+        return None
+
+
+_faq_index = None
+
+
+def get_faq_index(rules: dict):
+    """Índice del FAQ para este objeto de reglas (se recompila cuando get_rules() recarga).
+
+    features.faq.engine elige el motor: "fuzzy" (por defecto, FaqIndex) o "bm25"
+    (Bm25FaqIndex, para bases de conocimiento grandes). Con features.faq.source el
+    FAQ externo se consulta en su índice en disco (ExternalFaqIndex). Todos exponen
+    threshold y match(texto_normalizado, umbral).
+    """
+    global _faq_index
+    index = _faq_index
+    if index is None or index.rules is not rules:
+        if _faq_settings(rules).get("source"):
+            from .faq_store import ExternalFaqIndex
+
+            index = ExternalFaqIndex(rules)
+        else:
+            index = build_faq_engine(rules)
+        _faq_index = index
+    return index
+
+
+def build_faq_engine(rules: dict):
+    """Motor configurado en features.faq.engine sobre el FAQ inline de las reglas."""
+    engine = str(_faq_settings(rules).get("engine") or "fuzzy").lower()
+    if engine == "bm25":
+        from .faq_bm25 import Bm25FaqIndex
+
+        return Bm25FaqIndex(rules)
+    return FaqIndex(rules)
+
+
 def answer_faq(text: str, threshold: float = 0.75) -> str | None:
     """Respuesta flexible para FAQs con keywords y normalización avanzada.
     Solo responde si la similitud supera el umbral (por defecto 0.75).
     """
     all_rules = get_rules() or {}
     rules = (all_rules.get("default") or {})
-    faq = rules.get("faq", []) or []
-    # synonyms_list = (rules.get("synonyms") or {}).get("faq") or []
 
     t = _normalize(text)
     if not t:
@@ -90,63 +233,9 @@ def answer_faq(text: str, threshold: float = 0.75) -> str | None:
     # Ignorar inputs muy cortos (e.g., 'no', 'ok') para evitar coincidencias erróneas
     if len(t) <= 2:
         return None
-    t_tokens = set(t.split())
-
-    # Leer umbral desde la configuración si está definido en rules.yaml
-    try:
-        cfg_threshold = (
-            rules.get("features", {})
-            .get("faq", {})
-            .get("match_threshold")
-        )
-        if isinstance(cfg_threshold, (int, float)):
-            threshold = float(cfg_threshold)
-    except Exception:
-        # Si algo falla, usamos el valor por parámetro (por defecto 0.75)
-        pass
-
-    best_score = 0.0
-    best_answer = None
-
-    for item in faq:
-        q = (item.get("q") or "")
-        qn = _normalize(q)
-        keywords = [qn]
-        if "keywords" in item and isinstance(item["keywords"], list):
-            keywords += [_normalize(k) for k in item["keywords"] if isinstance(k, str)]
-
-        for kw in keywords:
-            # 1) Exact match / inclusion (evitar usar 't in kw' que provoca falsos positivos: 'no' in 'novedades')
-            if kw == t or kw in t:
-                ans = item.get("a") or None
-                if ans and "{auto}" in ans:
-                    ans = ans.replace("{auto}", build_auto_capabilities(rules))
-                return ans
-            # 2) Fuzzy similarity
-            try:
-                ratio = SequenceMatcher(None, kw, t).ratio()
-                if ratio > best_score:
-                    best_score = ratio
-                    best_answer = item.get("a")
-            except Exception:
-                pass
-            # 3) Token overlap
-            kw_tokens = set(kw.split())
-            overlap = 0
-            for ktk in kw_tokens:
-                for ttk in t_tokens:
-                    if ktk == ttk or ktk in ttk or ttk in ktk:
-                        overlap += 1
-                        break
-            score = overlap / max(1, len(kw_tokens))
-            if score > best_score:
-                best_score = score
-                best_answer = item.get("a")
 
-    # Solo responde si la mejor coincidencia supera el umbral
-    if best_score >= threshold and best_answer:
-        ans = best_answer
-        if ans and "{auto}" in ans:
-            ans = ans.replace("{auto}", build_auto_capabilities(rules))
-        return ans
-    return None
+    index = get_faq_index(rules)
+    # Umbral desde la configuración (features.faq.match_threshold) si está definido
+    if index.threshold is not None:
+        threshold = index.threshold
+    return index.match(t, threshold)
@@ -0,0 +1,131 @@
+import math
+import re
+import unicodedata
+
+from .faq import _faq_entries, _faq_settings, _faq_threshold
+
+_WORD = re.compile(r"\w+")
+
+
+def _deletes(term: str) -> set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _terms(text: str) -> list[str]:
+    """Términos para BM25: minúsculas, sin acentos, tokens de 2+ caracteres y plural simple ("s" final)."""
+    t = unicodedata.normalize("NFKD", (text or "").lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    out = []
+    for tok in _WORD.findall(t):
+        if len(tok) < 2:
+            continue
+        if len(tok) > 3 and tok.endswith("s"):
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+class Bm25FaqIndex:
+    """Motor BM25 para FAQs grandes (features.faq.engine: bm25).
+
+    Cada item del FAQ es un documento con los términos de `q` + `keywords` (y de `a`
+    con features.faq.bm25.include_answers). Al compilar se guardan las posting lists
+    término -> [(doc, tf)], el IDF de cada término y la longitud de cada documento,
+    así que por mensaje solo se recorren las postings de los términos de la consulta.
+
+    Para conservar la semántica de match_threshold (0..1) el puntaje se normaliza
+    contra el de un documento ideal de longitud media que contiene una vez cada
+    término conocido de la consulta (= suma de sus IDF), acotado a 1. Los términos
+    que no aparecen en ningún documento (relleno tipo "quisiera", "por favor") no
+    penalizan, pero sí descuentan en proporción `unknown_penalty` de su IDF máximo.
+
+    Erratas: un término desconocido de 5+ letras se corrige al término del índice a
+    distancia de edición 1 (borrado, inserción o sustitución) con más documentos,
+    usando un índice de borrados precomputado (búsquedas en dict, sin recorrer el
+    vocabulario).
+
+    Config en features.faq.bm25: k1 (1.2), b (0.75), include_answers (False),
+    unknown_penalty (0.25).
+    """
+
+    def __init__(self, rules: dict) -> None:
+        self.rules = rules
+        self.threshold = _faq_threshold(rules)
+        cfg = _faq_settings(rules).get("bm25") or {}
+        self.k1 = float(cfg.get("k1", 1.2))
+        self.b = float(cfg.get("b", 0.75))
+        self.unknown_penalty = float(cfg.get("unknown_penalty", 0.25))
+        include_answers = bool(cfg.get("include_answers", False))
+
+        entries = _faq_entries(rules)
+        self.answers: list[str | None] = [ans for _, ans in entries]
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.doc_len: list[int] = []
+        for doc, (item, _) in enumerate(entries):
+            parts = [item.get("q") or ""]
+            parts += [k for k in (item.get("keywords") or []) if isinstance(k, str)]
+            if include_answers and isinstance(item.get("a"), str):
+                parts.append(item["a"])
+            tf: dict[str, int] = {}
+            for part in parts:
+                for term in _terms(part):
+                    tf[term] = tf.get(term, 0) + 1
+            for term, count in tf.items():
+                self.postings.setdefault(term, []).append((doc, count))
+            self.doc_len.append(sum(tf.values()))
+
+        n_docs = len(self.doc_len)
+        self.avgdl = (sum(self.doc_len) / n_docs) if n_docs else 0.0
+        # IDF con la variante de Lucene (siempre positivo)
+        self.idf = {t: math.log(1.0 + (n_docs - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+        self.max_idf = math.log(1.0 + (n_docs + 0.5) / 0.5) if n_docs else 0.0
+        # Índice de borrados: variante con un carácter menos -> términos del vocabulario
+        self._deletes: dict[str, set[str]] = {}
+        for term in self.postings:
+            if len(term) >= 4:  # consultas de 5+ letras con un carácter menos
+                for d in _deletes(term):
+                    self._deletes.setdefault(d, set()).add(term)
+        # Factor de normalización por longitud de cada documento: k1 * (1 - b + b * dl / avgdl)
+        self._norm = [self.k1 * (1.0 - self.b + self.b * dl / self.avgdl) if self.avgdl else self.k1 for dl in self.doc_len]
+
+    def scores(self, t: str) -> dict[int, float]:
+        """Puntajes normalizados (0..1) de los documentos con algún término de la consulta."""
+        terms = set(_terms(t))
+        known = {term if term in self.idf else self._correct(term) for term in terms}
+        known.discard(None)
+        if not known:
+            return {}
+        k1 = self.k1
+        acc: dict[int, float] = {}
+        for term in known:
+            idf = self.idf[term]
+            for doc, tf in self.postings[term]:
+                acc[doc] = acc.get(doc, 0.0) + idf * tf * (k1 + 1.0) / (tf + self._norm[doc])
+        ideal = sum(self.idf[term] for term in known)
+        ideal += self.unknown_penalty * self.max_idf * (len(terms) - len(known))
+        return {doc: min(1.0, score / ideal) for doc, score in acc.items()}
+
+    def _correct(self, term: str) -> str | None:
+        if len(term) < 5:
+            return None
+        found = set(self._deletes.get(term, ()))  # al término le falta un carácter
+        for d in _deletes(term):
+            if d in self.postings:  # le sobra un carácter
+                found.add(d)
+            found |= self._deletes.get(d, set())  # un carácter distinto
+        if not found:
+            return None
+        return max(sorted(found), key=lambda w: len(self.postings[w]))
+
+    def match(self, t: str, threshold: float) -> str | None:
+        scores = self.scores(t)
+        if not scores:
+            return None
+        # Mayor puntaje; en empate gana el item que aparece primero en el FAQ
+        doc = min(scores, key=lambda d: (-scores[d], d))
+        if scores[doc] >= threshold:
+            return self.answers[doc]
+        return None
+
+
+__all__ = ["Bm25FaqIndex"]
@@ -0,0 +1,337 @@
+import csv
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from ..app.config import settings
+from ..config.rules_loader import ROOT
+from .faq_bm25 import _terms
+from .faq import FaqIndex, _faq_settings, _faq_threshold, build_auto_capabilities, build_faq_engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_NAME = "faq_index.sqlite"
+_SUFFIXES = (".jsonl", ".csv")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS faq_meta (k TEXT PRIMARY KEY, v TEXT);
+CREATE TABLE IF NOT EXISTS faq_entries (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    hash TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    q TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    a TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS faq_fts USING fts5(
+    q, keywords, content='faq_entries', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS faq_vocab USING fts5vocab(faq_fts, row);
+"""
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else ROOT / p
+
+
+def _source_files(source: Path) -> list[Path]:
+    if source.is_dir():
+        return sorted(p for p in source.iterdir() if p.is_file() and p.suffix.lower() in _SUFFIXES)
+    return [source] if source.is_file() else []
+
+
+def _entry(raw: dict[str, Any]) -> dict[str, Any] | None:
+    q = str(raw.get("q") or "").strip()
+    keywords = raw.get("keywords") or []
+    if isinstance(keywords, str):
+        keywords = keywords.split("|")
+    keywords = [k.strip() for k in keywords if isinstance(k, str) and k.strip()]
+    if not q and not keywords:
+        return None
+    ident = raw.get("id")
+    return {"id": str(ident) if ident not in (None, "") else None, "q": q, "a": str(raw.get("a") or ""), "keywords": keywords}
+
+
+def read_faq_source(source: Path) -> list[dict[str, Any]]:
+    """Entradas del FAQ externo en orden: archivo JSONL/CSV o directorio con varios.
+
+    JSONL: un objeto por línea con q, a, keywords (lista) e id opcional.
+    CSV: cabecera con columnas q, a, keywords (separadas por "|") e id opcional.
+    Las líneas inválidas se registran y se ignoran.
+    """
+    out: list[dict[str, Any]] = []
+    for file in _source_files(source):
+        with file.open(encoding="utf-8", newline="") as fh:
+            if file.suffix.lower() == ".csv":
+                rows = csv.DictReader(fh)
+            else:
+                rows = []
+                for n, line in enumerate(fh, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        logger.warning("faq_store: línea %s inválida en %s", n, file)
+            for raw in rows:
+                entry = _entry(raw) if isinstance(raw, dict) else None
+                if entry is not None:
+                    out.append(entry)
+    return out
+
+
+def _content_hash(entry: dict[str, Any]) -> str:
+    payload = json.dumps([entry["q"], entry["keywords"], entry["a"]], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class FaqStore:
+    """Índice en disco (SQLite FTS5) de un FAQ externo (features.faq.source).
+
+    Cada entrada se guarda con un hash de su contenido; sync() solo reindexa las
+    entradas nuevas, modificadas o eliminadas, y si ningún archivo de la fuente
+    cambió (tamaño y mtime) ni siquiera la vuelve a leer. Las consultas traen de
+    disco solo los candidatos (q + keywords) y la respuesta del ganador, así que
+    las respuestas no se cargan en memoria.
+
+    sync() escribe con su propia conexión y la base está en modo WAL: mientras
+    se reindexa, las consultas siguen viendo el último índice confirmado.
+    """
+
+    # Fracción máxima de entradas en las que puede aparecer un término consultado
+    max_df_ratio = 0.05
+
+    def __init__(self, source: Path, db_path: Path) -> None:
+        self.source = source
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # Conexión de escritura de sync(), con su propio lock: no bloquea las consultas
+        self._sync_lock = threading.Lock()
+        self._writer = sqlite3.connect(str(db_path), check_same_thread=False)
+
+    def _meta(self, key: str) -> str | None:
+        row = self._writer.execute("SELECT v FROM faq_meta WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _signature(self, files: list[Path]) -> str:
+        sig = []
+        for f in files:
+            st = f.stat()
+            sig.append([str(f), st.st_size, st.st_mtime_ns])
+        return json.dumps(sig)
+
+    def _fts_delete(self, row_id: int) -> None:
+        q, keywords = self._writer.execute("SELECT q, keywords FROM faq_entries WHERE id = ?", (row_id,)).fetchone()
+        self._writer.execute("INSERT INTO faq_fts(faq_fts, rowid, q, keywords) VALUES('delete', ?, ?, ?)", (row_id, q, keywords))
+
+    def sync(self, force: bool = False) -> dict[str, int]:
+        """Sincroniza el índice con la fuente. Devuelve conteos added/updated/removed/unchanged."""
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        if not self.source.exists():
+            logger.warning("faq_store: la fuente %s no existe; se mantiene el índice actual", self.source)
+            return counts
+        with self._sync_lock:
+            files = _source_files(self.source)
+            signature = self._signature(files)
+            same_source = self._meta("source") == str(self.source)
+            if not force and same_source and self._meta("signature") == signature:
+                counts["unchanged"] = self._writer.execute("SELECT COUNT(*) FROM faq_entries").fetchone()[0]
+                return counts
+
+            entries = read_faq_source(self.source)
+            with self._writer:
+                if not same_source:
+                    self._writer.execute("DELETE FROM faq_entries")
+                    self._writer.execute("INSERT INTO faq_fts(faq_fts) VALUES('delete-all')")
+                existing = {key: (row_id, h, pos) for row_id, key, h, pos in self._writer.execute("SELECT id, key, hash, pos FROM faq_entries")}
+                seen = set()
+                for pos, entry in enumerate(entries):
+                    key = entry["id"] or entry["q"] or "|".join(entry["keywords"])
+                    base, n = key, 1
+                    while key in seen:
+                        n += 1
+                        key = f"{base}#{n}"
+                    seen.add(key)
+                    h = _content_hash(entry)
+                    values = (h, pos, entry["q"], "\n".join(entry["keywords"]), entry["a"])
+                    old = existing.get(key)
+                    if old is None:
+                        cur = self._writer.execute("INSERT INTO faq_entries(key, hash, pos, q, keywords, a) VALUES(?, ?, ?, ?, ?, ?)", (key,) + values)
+                        row_id = cur.lastrowid
+                        counts["added"] += 1
+                    elif old[1] != h:
+                        row_id = old[0]
+                        self._fts_delete(row_id)
+                        self._writer.execute("UPDATE faq_entries SET hash = ?, pos = ?, q = ?, keywords = ?, a = ? WHERE id = ?", values + (row_id,))
+                        counts["updated"] += 1
+                    else:
+                        if old[2] != pos:
+                            self._writer.execute("UPDATE faq_entries SET pos = ? WHERE id = ?", (pos, old[0]))
+                        counts["unchanged"] += 1
+                        continue
+                    self._writer.execute("INSERT INTO faq_fts(rowid, q, keywords) VALUES(?, ?, ?)", (row_id, values[2], values[3]))
+                for key, (row_id, _, _) in existing.items():
+                    if key not in seen:
+                        self._fts_delete(row_id)
+                        self._writer.execute("DELETE FROM faq_entries WHERE id = ?", (row_id,))
+                        counts["removed"] += 1
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO faq_meta(k, v) VALUES(?, ?)",
+                    [("source", str(self.source)), ("signature", signature)],
+                )
+        logger.info("faq_store: %s sincronizado %s", self.source, counts)
+        return counts
+
+    def candidates(self, t: str, limit: int = 20) -> list[tuple[int, str, list[str], bool]]:
+        """Hasta `limit` entradas que comparten algún término (o prefijo) con el texto normalizado.
+
+        Devuelve (id, q, keywords, tiene_respuesta) en el orden de la fuente.
+        """
+        terms = set(_terms(t))
+        if not terms:
+            return []
+        sql = (
+            "SELECT e.id, e.pos, e.q, e.keywords, length(e.a) > 0 FROM faq_fts "
+            "JOIN faq_entries e ON e.id = faq_fts.rowid WHERE faq_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        with self._lock:
+            # Frecuencia documental de cada término (como prefijo, para plurales y
+            # variantes). Ordenar por bm25 cuesta O(coincidencias), así que las
+            # coincidencias se limitan a los términos poco frecuentes (o al menos
+            # frecuente si no hay ninguno); los frecuentes ("de", "como") van en un
+            # segundo grupo que contiene al primero: no añaden filas pero bm25 los
+            # pondera al ordenar.
+            n_docs = self._conn.execute("SELECT COUNT(*) FROM faq_entries").fetchone()[0]
+            max_df = max(limit, int(n_docs * self.max_df_ratio))
+            dfs = []
+            for term in terms:
+                df = self._conn.execute(
+                    "SELECT COALESCE(SUM(doc), 0) FROM faq_vocab WHERE term >= ? AND term < ?", (term, term + "\uffff")
+                ).fetchone()[0]
+                if df:
+                    dfs.append((df, term))
+            if not dfs:
+                return []
+            selected = [term for df, term in dfs if df <= max_df] or [min(dfs)[1]]
+            query = " OR ".join('"%s"*' % term for term in selected)
+            if len(selected) < len(dfs):
+                query = "(%s) AND (%s)" % (query, " OR ".join('"%s"*' % term for _, term in dfs))
+            try:
+                rows = self._conn.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError as e:
+                logger.debug("faq_store: consulta FTS inválida para %r: %s", t, e)
+                return []
+        rows.sort(key=lambda r: r[1])
+        return [(r[0], r[2], r[3].split("\n") if r[3] else [], bool(r[4])) for r in rows]
+
+    def answer(self, entry_id: int) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT a FROM faq_entries WHERE id = ?", (entry_id,)).fetchone()
+        return (row[0] or None) if row else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM faq_entries").fetchone()[0]
+
+    def close(self) -> None:
+        with self._sync_lock, self._lock:
+            self._writer.close()
+            self._conn.close()
+
+
+_stores: dict[tuple[str, str], FaqStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_faq_store(source: Path, db_path: Path) -> FaqStore:
+    """Un FaqStore (y una conexión) por par fuente/índice, reutilizado entre recargas de reglas."""
+    key = (str(source), str(db_path))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = FaqStore(source, db_path)
+        return store
+
+
+class ExternalFaqIndex:
+    """FAQ con entradas externas (features.faq.source) además del FAQ inline de rules.yaml.
+
+    Primero responde el motor configurado sobre el FAQ inline; si no hay respuesta,
+    FTS5 preselecciona hasta `features.faq.candidates` (20) entradas externas que
+    comparten términos con el mensaje y se puntúan con FaqIndex (misma semántica de
+    inclusión, solapamiento y match_threshold). Solo se lee de disco la respuesta
+    ganadora. Los cambios en la fuente se detectan al recargar las reglas y, como
+    mucho, cada `features.faq.source_check_seconds` (5) segundos: esa comprobación
+    corre en un hilo de fondo y, hasta que termina, se responde con el índice anterior
+    (también al crear el índice tras recargar las reglas).
+
+    Config en features.faq: source (archivo o directorio, relativo a la raíz del
+    proyecto), index_path (por defecto DATA_DIR/faq_index.sqlite), candidates,
+    source_check_seconds.
+    """
+
+    def __init__(self, rules: dict) -> None:
+        self.rules = rules
+        self.threshold = _faq_threshold(rules)
+        cfg = _faq_settings(rules)
+        self.inline = build_faq_engine(rules) if rules.get("faq") else None
+        self.limit = int(cfg.get("candidates", 20))
+        self.check_interval = float(cfg.get("source_check_seconds", 5))
+        index_path = _resolve(str(cfg["index_path"])) if cfg.get("index_path") else Path(settings.data_dir) / DEFAULT_INDEX_NAME
+        self.store = get_faq_store(_resolve(str(cfg["source"])), index_path)
+        self._lock = threading.Lock()
+        self._sync_thread: threading.Thread | None = None
+        self._checked = time.monotonic()
+        self._start_sync()
+
+    def _sync(self) -> None:
+        try:
+            self.store.sync()
+        except Exception as e:
+            logger.error("faq_store: no se pudo indexar %s: %s", self.store.source, e)
+
+    def _check_source(self) -> None:
+        """Lanza la sincronización en segundo plano si toca y no hay otra en curso."""
+        if time.monotonic() - self._checked >= self.check_interval:
+            self._start_sync()
+
+    def _start_sync(self) -> None:
+        with self._lock:
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return
+            self._checked = time.monotonic()
+            self._sync_thread = threading.Thread(target=self._sync, name="faq-sync", daemon=True)
+            self._sync_thread.start()
+
+    def match(self, t: str, threshold: float) -> str | None:
+        if self.inline is not None:
+            ans = self.inline.match(t, threshold)
+            if ans:
+                return ans
+        self._check_source()
+        candidates = self.store.candidates(t, self.limit)
+        if not candidates:
+            return None
+        entries = [({"q": q, "keywords": keywords}, entry_id if has_answer else None) for entry_id, q, keywords, has_answer in candidates]
+        entry_id = FaqIndex(self.rules, entries).match(t, threshold)
+        if entry_id is None:
+            return None
+        ans = self.store.answer(entry_id)
+        if ans and "{auto}" in ans:
+            ans = ans.replace("{auto}", build_auto_capabilities(self.rules))
+        return ans
+
+
+__all__ = ["ExternalFaqIndex", "FaqStore", "get_faq_store", "read_faq_source"]
@@ -1,9 +1,9 @@
 from pathlib import Path
 from ..app.config import settings
-from ..storage.repository import TicketRepository
+from ..storage.backends import ticket_repository
 from ..config.rules_loader import get_rules_for
 
-_repo = TicketRepository(Path(settings.data_dir))
+_repo = ticket_repository(Path(settings.data_dir))
 
 def open_ticket(user_id: str, text: str, chat_id: str | None = None) -> str:
     t = _repo.create(user_id, text)
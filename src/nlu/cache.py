@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .classifier import IntentMatch, _normalize
+
+_Result = Tuple[Optional[IntentMatch], float]
+
+
+class ClassificationCache:
+    """LRU acotada de resultados de clasificación NLU.
+
+    Gran parte del tráfico son textos cortos repetidos ("hola", "menu", "1", "ok").
+    La clave es (texto normalizado, versión del clasificador, umbral): cuando el
+    registro entrega un modelo nuevo su `version` cambia, así que las entradas
+    viejas dejan de acertar y salen por LRU sin invalidación explícita.
+
+    Expone contadores hits/misses/evictions (ver stats()) para dimensionarla.
+    max_entries <= 0 desactiva la caché.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[str, str, float], _Result]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def classify(self, classifier: Any, text: str) -> _Result:
+        if self.max_entries <= 0:
+            return classifier.classify(text)
+        key = (_normalize(text), str(getattr(classifier, "version", id(classifier))), float(classifier.threshold))
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        # Clasificar fuera del lock: dos hilos con el mismo texto pueden calcularlo a la vez
+        result = classifier.classify(text)
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            self._evict()
+        return result
+
+    def resize(self, max_entries: int) -> None:
+        with self._lock:
+            self.max_entries = max_entries
+            if max_entries <= 0:
+                self._data.clear()
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.max_entries > 0 and len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+classification_cache = ClassificationCache()
+
+
+__all__ = ["ClassificationCache", "classification_cache"]
@@ -8,6 +8,16 @@ import pickle
 from pathlib import Path
 from datetime import datetime
 import hashlib
+import json
+import logging
+
+from ..storage.locking import atomic_write_bytes, atomic_write_text
+from .model_io import is_binary_model, load_binary, save_binary
+
+try:  # NumPy es opcional: si está instalado se usa para el scoring vectorizado
+    import numpy as np
+except ImportError:  # pragma: no cover - entorno sin numpy
+    np = None  # type: ignore[assignment]
 
 
 def _normalize(text: str) -> str:
@@ -20,6 +30,36 @@ def _normalize(text: str) -> str:
     return t
 
 
+DEFAULT_MODEL_NAME = "nlu_nb.bin"
+
+# FNV-1a de 32 bits para el hashing trick; semillas distintas para char y word n-gramas
+_FNV_PRIME = 16777619
+_FNV_MASK = 0xFFFFFFFF
+_FNV_CHAR_SEED = 2166136261 ^ ord("c")
+_FNV_WORD_SEED = 2166136261 ^ ord("w")
+
+
+def config_checksum(nlu_cfg: Dict[str, Any]) -> str:
+    """Checksum estable del bloque nlu (incluye intents, umbral y opciones ml)."""
+    raw = json.dumps(nlu_cfg or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def intents_checksum(intents: List[Dict[str, Any]]) -> str:
+    """Checksum de intents/patterns (el mismo que se guarda en meta.checksum)."""
+    checksum_src = []
+    for intent in intents or []:
+        name = str(intent.get("name") or "")
+        pats = [str(p) for p in (intent.get("patterns") or [])]
+        checksum_src.append(name + "::" + "|".join(sorted(pats)))
+    return hashlib.sha256("\n".join(sorted(checksum_src)).encode("utf-8")).hexdigest()
+
+
+def _label_checksum(label: str, patterns: List[str]) -> str:
+    raw = str(label) + "::" + "|".join(sorted(patterns))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
 @dataclass
 class IntentMatch:
     name: str
@@ -35,27 +75,98 @@ class SimpleNLU:
       - threshold: float (0-1) para aceptar una intención
       - low_confidence_message: str para orientar al usuario cuando la confianza es baja
       - intents: lista de intents con 'name', 'patterns', 'action', 'target' (opcional)
+
+    Los patrones se normalizan una sola vez al construir la instancia (una por versión
+    de reglas, ver registry). La búsqueda mantiene exactamente el score de
+    difflib.SequenceMatcher.ratio(), pero solo lo calcula para los patrones que pueden
+    superar al mejor actual: un índice invertido de bigramas ordena los candidatos y
+    dos cotas superiores (longitudes y LCS bit-paralela) descartan el resto.
     """
 
     def __init__(self, nlu_cfg: Dict[str, Any]):
         self.cfg = nlu_cfg or {}
         self.threshold = float(self.cfg.get('threshold') or 0.75)
+        self._intents = list(self.cfg.get('intents') or [])
+        # Identifica la versión de reglas servida (clave de la caché de resultados)
+        self.version = config_checksum(self.cfg)
+        # Patrones normalizados únicos: (texto, índice del primer intent que lo declara)
+        self._patterns: List[Tuple[str, int]] = []
+        seen: set[str] = set()
+        for idx, intent in enumerate(self._intents):
+            for p in (intent.get('patterns') or []):
+                norm = _normalize(str(p))
+                if norm and norm not in seen:
+                    seen.add(norm)
+                    self._patterns.append((norm, idx))
+        # Máscaras de bits por carácter (LCS bit-paralela) e índice invertido de bigramas
+        self._masks: List[Dict[str, int]] = []
+        self._grams: Dict[str, List[int]] = {}
+        for pid, (norm, _) in enumerate(self._patterns):
+            masks: Dict[str, int] = {}
+            for bit, ch in enumerate(norm):
+                masks[ch] = masks.get(ch, 0) | (1 << bit)
+            self._masks.append(masks)
+            for g in set(_bigrams(norm)):
+                self._grams.setdefault(g, []).append(pid)
+
+    def memory_bytes(self) -> int:
+        """Estimación aproximada de memoria (presupuesto del registro NLU)."""
+        chars = sum(len(p) for p, _ in self._patterns)
+        return 200 * len(self._patterns) + 4 * chars + 100 * len(self._grams)
 
     def classify(self, text: str) -> Tuple[Optional[IntentMatch], float]:
         t = _normalize(text)
-        best: Optional[IntentMatch] = None
+        if not t or not self._patterns:
+            return None, 0.0
         best_score = 0.0
-        intents = list(self.cfg.get('intents') or [])
-        for intent in intents:
-            name = intent.get('name') or ''
-            action = (intent.get('action') or '').lower()
-            patterns = [ _normalize(str(p)) for p in (intent.get('patterns') or []) ]
-            score = self._max_similarity(t, patterns)
-            if score > best_score:
+        best_idx: Optional[int] = None
+        len_t = len(t)
+        for pid in self._candidates(t):
+            norm, idx = self._patterns[pid]
+            total = len_t + len(norm)
+            # Un intent igual o posterior al mejor solo gana si lo supera estrictamente
+            # (mismo criterio que el recorrido secuencial por intents)
+            need_gt = best_idx is not None and idx >= best_idx
+            # Cota 1: el número de coincidencias no supera la longitud menor
+            if not self._may_win(2.0 * min(len_t, len(norm)) / total, best_score, need_gt):
+                continue
+            # Cota 2: los bloques de SequenceMatcher forman una subsecuencia común (<= LCS)
+            if not self._may_win(2.0 * _lcs_length(t, self._masks[pid], len(norm)) / total, best_score, need_gt):
+                continue
+            score = difflib.SequenceMatcher(a=t, b=norm).ratio()
+            if score > best_score or (score == best_score and score > 0 and not need_gt):
                 best_score = score
-                best = IntentMatch(name=name, action=action, score=score, intent_cfg=intent)
+                best_idx = idx
+        if best_idx is None:
+            return None, 0.0
+        intent = self._intents[best_idx]
+        best = IntentMatch(
+            name=intent.get('name') or '',
+            action=(intent.get('action') or '').lower(),
+            score=best_score,
+            intent_cfg=intent,
+        )
         return best, best_score
 
+    def classify_many(self, texts: List[str]) -> List[Tuple[Optional[IntentMatch], float]]:
+        """Clasifica un lote (misma interfaz que MLNLU.classify_many)."""
+        return [self.classify(t) for t in texts]
+
+    @staticmethod
+    def _may_win(bound: float, best_score: float, need_gt: bool) -> bool:
+        if bound <= 0.0:
+            return False
+        return bound > best_score if need_gt else bound >= best_score
+
+    def _candidates(self, t: str) -> List[int]:
+        """Todos los patrones, primero los que más bigramas comparten con el texto."""
+        shared: Dict[int, int] = {}
+        for g in set(_bigrams(t)):
+            for pid in self._grams.get(g, ()):
+                shared[pid] = shared.get(pid, 0) + 1
+        ranked = sorted(shared, key=lambda pid: (-shared[pid], pid))
+        return ranked + [pid for pid in range(len(self._patterns)) if pid not in shared]
+
     @staticmethod
     def _max_similarity(text: str, patterns: List[str]) -> float:
         if not text or not patterns:
@@ -65,40 +176,128 @@ class SimpleNLU:
         return max(scores) if scores else 0.0
 
 
+def _bigrams(text: str) -> List[str]:
+    if len(text) < 2:
+        return [text] if text else []
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def _lcs_length(text: str, masks: Dict[str, int], m: int) -> int:
+    """Longitud de la LCS entre text y un patrón de m caracteres (algoritmo bit-paralelo).
+
+    masks[c] tiene el bit i encendido si pattern[i] == c; cada carácter del texto
+    cuesta unas pocas operaciones sobre enteros de m bits.
+    """
+    full = (1 << m) - 1
+    v = full
+    for ch in text:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return m - v.bit_count()
+
+
 class MLNLU:
     """Clasificador NLU con Machine Learning puro (sin dependencias externas pesadas).
 
     Implementa un Multinomial Naive Bayes con n-gramas de caracteres y palabras.
     - Entrena a partir de rules.nlu.intents.patterns
-    - Serializa modelo en data/models/nlu_nb.pkl
+    - Serializa modelo en data/models/nlu_nb.bin (formato binario, ver model_io)
     - Usa un umbral de confianza configurable (rules.nlu.threshold)
 
     Config opcional en rules.nlu.ml:
-      - model_path: ruta del archivo de modelo (por defecto data/models/nlu_nb.pkl)
+      - model_path: ruta del archivo de modelo (por defecto data/models/nlu_nb.bin).
+        Extensión .pkl = formato pickle legado; cualquier otra = formato binario mmap.
       - retrain_on_start: bool (False) para reentrenar siempre desde rules
       - char_ngrams: [3,5] rango n-gramas de caracteres
       - word_ngrams: [1,2] rango n-gramas de palabras
       - alpha: 1.0 suavizado Laplace
+      - engine: "auto" (numpy si está disponible), "numpy" o "dict"
+      - auto_retrain: True para reentrenar (incremental) al cargar un modelo cuyo
+        meta.checksum no coincide con los intents actuales
+      - incremental: True para reutilizar los conteos guardados de los intents sin cambios
+      - hash_features: N (opcional) hashea los n-gramas en N buckets (hashing trick):
+        sin strings por feature y memoria acotada a labels × N
     """
 
+    # Bloque de rules.nlu con las opciones, archivo por defecto y algoritmo (meta.algorithm)
+    config_key = "ml"
+    default_model_name = DEFAULT_MODEL_NAME
+    algorithm = "naive_bayes"
+
     def __init__(self, nlu_cfg: Dict[str, Any], data_dir: str | Path = "data"):
         self.cfg = nlu_cfg or {}
         self.threshold = float(self.cfg.get("threshold") or 0.75)
-        self.ml_cfg = dict(self.cfg.get("ml") or {})
-        self.model_path = Path(self.ml_cfg.get("model_path") or Path(data_dir) / "models" / "nlu_nb.pkl")
+        self.ml_cfg = dict(self.cfg.get(self.config_key) or {})
+        self.model_path = self.resolve_model_path(self.cfg, data_dir)
         self.model_path.parent.mkdir(parents=True, exist_ok=True)
         self.char_ng = tuple(self.ml_cfg.get("char_ngrams") or (3, 5))
         self.word_ng = tuple(self.ml_cfg.get("word_ngrams") or (1, 2))
         self.alpha = float(self.ml_cfg.get("alpha") or 1.0)
+        self.engine = str(self.ml_cfg.get("engine") or "auto").lower()
+        self.hash_buckets = int(self.ml_cfg.get("hash_features") or 0)
         self._model: Optional[dict] = None
+        self._arrays: Optional[dict] = None
+        self._train_state: Optional[dict] = None
+        self._intent_map = {i.get("name"): i for i in (self.cfg.get("intents") or [])}
 
         retrain = bool(self.ml_cfg.get("retrain_on_start", False))
+        incremental = self.ml_cfg.get("incremental", True) is not False
         if retrain or not self.model_path.exists():
-            trained = self._train_from_rules()
+            trained = self._train_from_rules(self._load_train_state() if incremental else None)
             if trained:
                 self._save()
         else:
             self._load()
+            if self._model and int(self._model.get("hash_features") or 0) != self.hash_buckets:
+                # El modelo en disco usa otro espacio de features (exacto vs hashing)
+                if self._train_from_rules():
+                    self._save()
+            elif self.is_stale() and self.ml_cfg.get("auto_retrain", True) is not False:
+                # Reglas editadas desde el último entrenamiento
+                if self._train_from_rules(self._load_train_state() if incremental else None):
+                    self._save()
+        self._build_arrays()
+        # Versión servida = config nlu + modelo concreto cargado/entrenado
+        meta = (self._model or {}).get("meta") or {}
+        self.version = config_checksum({
+            "cfg": config_checksum(self.cfg),
+            "checksum": meta.get("checksum"),
+            "created_at": meta.get("created_at"),
+        })
+
+    @classmethod
+    def resolve_model_path(cls, nlu_cfg: Dict[str, Any], data_dir: str | Path = "data") -> Path:
+        ml_cfg = dict((nlu_cfg or {}).get(cls.config_key) or {})
+        return Path(ml_cfg.get("model_path") or Path(data_dir) / "models" / cls.default_model_name)
+
+    def is_stale(self) -> bool:
+        """True si el modelo no corresponde a los intents actuales (meta.checksum)."""
+        if not self._model:
+            return True
+        meta = self._model.get("meta") or {}
+        if meta.get("algorithm", "naive_bayes") != self.algorithm:
+            # Archivo entrenado por otro proveedor (p.ej. ml y linear con la misma ruta)
+            return True
+        stored = meta.get("checksum")
+        return stored != intents_checksum(list(self.cfg.get("intents") or []))
+
+    def memory_bytes(self) -> int:
+        """Estimación aproximada de memoria (presupuesto del registro NLU).
+
+        ~100 bytes por entrada de dict (vocab y, sin numpy, log_probs) más la matriz.
+        Una matriz mapeada desde el archivo binario se cuenta igual aunque sus páginas
+        se compartan entre procesos.
+        """
+        if not self._model:
+            return 0
+        n_labels = len(self._model.get("labels") or [])
+        n_vocab = len(self._model.get("vocab") or {})
+        total = 100 * n_vocab
+        if self._arrays is not None:
+            total += int(self._arrays["matrix"].nbytes)
+        else:
+            total += 100 * n_labels * n_vocab
+        return total
 
     # =============== API principal ===============
     def classify(self, text: str) -> Tuple[Optional[IntentMatch], float]:
@@ -111,7 +310,64 @@ class MLNLU:
         # Si no hay ningún n-gram conocido, no hay confianza
         if not feats:
             return None, 0.0
-        # Vectoriza
+        if self._arrays is not None:
+            best_label, best_prob = self._best_numpy(feats)
+        else:
+            best_label, best_prob = self._best_dict(feats)
+        return self._to_match(best_label, best_prob, len(feats))
+
+    def classify_many(self, texts: List[str]) -> List[Tuple[Optional[IntentMatch], float]]:
+        """Clasifica un lote de textos (evaluación/scoring offline).
+
+        Con numpy construye una matriz dispersa (COO) del lote y resuelve todos los
+        productos en una sola pasada; sin numpy equivale a llamar classify() por texto.
+        """
+        if not self._model or self._arrays is None:
+            return [self.classify(t) for t in texts]
+        index = self._arrays["index"]
+        matrix = self._arrays["matrix"]
+        logpriors = self._arrays["logpriors"]
+        labels = self._model["labels"]
+
+        results: List[Tuple[Optional[IntentMatch], float]] = [(None, 0.0)] * len(texts)
+        rows: List[int] = []  # textos con al menos una feature (conocida o no)
+        n_feats: List[int] = []
+        starts: List[int] = []  # inicio de cada fila no vacía en cols/vals
+        nonempty: List[int] = []  # posición en `rows` de las filas con features conocidas
+        cols: List[int] = []
+        vals: List[float] = []
+        for pos, text in enumerate(texts):
+            feats = self._extract_features(_normalize(text))
+            if not feats:
+                continue
+            begin = len(cols)
+            for f, c in feats.items():
+                j = index.get(f)
+                if j is not None:
+                    cols.append(j)
+                    vals.append(c)
+            if len(cols) > begin:
+                nonempty.append(len(rows))
+                starts.append(begin)
+            rows.append(pos)
+            n_feats.append(len(feats))
+        if not rows:
+            return results
+
+        scores = np.tile(logpriors, (len(rows), 1))
+        if cols:
+            weighted = matrix[:, cols] * np.asarray(vals, dtype=np.float64)
+            scores[nonempty] += np.add.reduceat(weighted, starts, axis=1).T
+        probs = self._softmax(scores)
+        best = probs.argmax(axis=1)
+        for i, pos in enumerate(rows):
+            k = int(best[i])
+            results[pos] = self._to_match(labels[k], float(probs[i, k]), n_feats[i])
+        return results
+
+    # =============== Scoring ===============
+    def _best_dict(self, feats: Dict[str, int]) -> Tuple[str, float]:
+        assert self._model is not None
         scores = {}
         for label in self._model["labels"]:
             logprior = self._model["logpriors"].get(label, -1e9)
@@ -130,16 +386,37 @@ class MLNLU:
         probs = {k: v / total for k, v in exp_scores.items()}
         # Usar lambda para que mypy acepte el tipo del key callable
         best_label = max(probs, key=lambda k: probs[k])
-        best_prob = probs[best_label]
+        return best_label, probs[best_label]
+
+    def _best_numpy(self, feats: Dict[str, int]) -> Tuple[str, float]:
+        assert self._model is not None and self._arrays is not None
+        index = self._arrays["index"]
+        cols: List[int] = []
+        vals: List[int] = []
+        for f, c in feats.items():
+            j = index.get(f)
+            if j is not None:
+                cols.append(j)
+                vals.append(c)
+        scores = self._arrays["logpriors"]
+        if cols:
+            scores = scores + self._arrays["matrix"][:, cols] @ np.asarray(vals, dtype=np.float64)
+        probs = self._softmax(scores)
+        k = int(probs.argmax())
+        return self._model["labels"][k], float(probs[k])
+
+    @staticmethod
+    def _softmax(scores: Any) -> Any:
+        exp_scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        return exp_scores / exp_scores.sum(axis=-1, keepdims=True)
 
+    def _to_match(self, best_label: str, best_prob: float, n_feats: int) -> Tuple[Optional[IntentMatch], float]:
         # Mapear a intent config
-        intents = list(self.cfg.get("intents") or [])
-        intent_map = {i.get("name"): i for i in intents}
-        matched_cfg = intent_map.get(best_label)
+        matched_cfg = self._intent_map.get(best_label)
 
         # Heurística: si el texto no contiene ningún token conocido de ese intent, bajar confianza
         # (ya reducimos si no hay feats en absoluto). Aquí podríamos comparar cobertura de features.
-        if best_prob < 1.0 and len(feats) < 2:
+        if best_prob < 1.0 and n_feats < 2:
             best_prob *= 0.85
 
         if not matched_cfg:
@@ -153,65 +430,101 @@ class MLNLU:
         )
         return match, best_prob
 
+    def _build_arrays(self) -> None:
+        """Construye la representación matricial del modelo (labels × vocab).
+
+        El vocab ya asigna a cada feature su columna. Con suavizado de Laplace todas
+        las celdas tienen valor, así que la matriz es densa; la dispersión está en el
+        vector de entrada, que se resuelve indexando solo las columnas presentes.
+        """
+        self._arrays = None
+        if not self._model or np is None or self.engine == "dict":
+            return
+        labels = self._model["labels"]
+        vocab = self._model["vocab"]
+        logpriors = np.array([self._model["logpriors"].get(lbl, -1e9) for lbl in labels], dtype=np.float64)
+        if self._model.get("matrix") is not None:
+            # Modelo binario: la matriz float32 ya está mapeada desde el archivo
+            self._arrays = {"index": vocab, "matrix": self._model["matrix"], "logpriors": logpriors}
+            return
+        matrix = np.zeros((len(labels), len(vocab)), dtype=np.float64)
+        for row, label in enumerate(labels):
+            for f, lp in (self._model["log_probs"].get(label) or {}).items():
+                col = vocab.get(f)
+                if col is not None:
+                    matrix[row, col] = lp
+        self._arrays = {"index": vocab, "matrix": matrix, "logpriors": logpriors}
+
     # =============== Entrenamiento ===============
-    def _train_from_rules(self) -> bool:
+    def _train_from_rules(self, previous: Optional[Dict[str, Any]] = None) -> bool:
+        """Entrena desde rules.nlu.intents.
+
+        `previous` es el estado de entrenamiento guardado (conteos crudos por clase y
+        checksum por intent, ver _load_train_state). Las clases cuyo checksum no cambió
+        reutilizan sus conteos; solo se re-extraen features de las agregadas o editadas.
+        Las log-probabilidades se recalculan desde los conteos, por lo que el resultado
+        es idéntico a un reentrenamiento completo.
+        """
         intents = list(self.cfg.get("intents") or [])
-        # Construir dataset a partir de patterns
-        X: list[str] = []
-        y: list[str] = []
+        # Construir dataset a partir de patterns, agrupado por label
+        patterns_by_label: Dict[str, List[str]] = {}
         for intent in intents:
             name = intent.get("name")
             pats = [p for p in (intent.get("patterns") or []) if isinstance(p, str) and p.strip()]
-            for p in pats:
-                X.append(_normalize(p))
-                y.append(name)
+            if pats:
+                patterns_by_label.setdefault(name, []).extend(pats)
         # Necesitamos al menos 2 clases con muestras
-        labels = sorted(set(y))
+        labels = sorted(patterns_by_label)
         if len(labels) < 2:
             self._model = None
             return False
-        # Construir vocabulario de n-gramas
-        vocab: Dict[str, int] = {}
-        def add_feat(f: str):
-            if f not in vocab:
-                vocab[f] = len(vocab)
-        for txt in X:
-            feats = self._extract_features(txt, build_vocab=True, _vocab=vocab)
-            # acceso para forzar creación en vocab
-            _ = feats
-        # Contabilizar por clase
-        class_counts: Dict[str, Dict[str, int]] = {lbl: {} for lbl in labels}
-        total_counts: Dict[str, int] = {lbl: 0 for lbl in labels}
-        for txt, lbl in zip(X, y):
-            feats = self._extract_features(txt, build_vocab=False, _vocab=vocab)
-            for f, c in feats.items():
-                class_counts[lbl][f] = class_counts[lbl].get(f, 0) + c
-                total_counts[lbl] += c
+
+        prev_classes = dict((previous or {}).get("classes") or {})
+        classes: Dict[str, Dict[str, Any]] = {}
+        recounted: List[str] = []
+        for lbl in labels:
+            pats = patterns_by_label[lbl]
+            lbl_checksum = _label_checksum(lbl, pats)
+            prev = prev_classes.get(lbl)
+            if prev and prev.get("checksum") == lbl_checksum:
+                classes[lbl] = prev
+                continue
+            # Contabilizar features de la clase
+            counts: Dict[Any, int] = {}
+            for p in pats:
+                for f, c in self._extract_features(_normalize(p)).items():
+                    counts[f] = counts.get(f, 0) + c
+            classes[lbl] = {"checksum": lbl_checksum, "examples": len(pats), "counts": counts}
+            recounted.append(lbl)
+        removed = sorted(set(prev_classes) - set(labels))
+        self._train_state = {"classes": classes, **self._train_params()}
+
+        # Vocabulario = unión de features observadas en todas las clases
+        vocab: Dict[Any, int] = {}
+        for lbl in labels:
+            for f in classes[lbl]["counts"]:
+                if f not in vocab:
+                    vocab[f] = len(vocab)
+        total_counts = {lbl: sum(classes[lbl]["counts"].values()) for lbl in labels}
 
         # Calcular log-probabilidades con suavizado de Laplace
         V = len(vocab)
         alpha = self.alpha
-        log_probs: Dict[str, Dict[str, float]] = {lbl: {} for lbl in labels}
+        log_probs: Dict[str, Dict[Any, float]] = {lbl: {} for lbl in labels}
         for lbl in labels:
+            class_counts = classes[lbl]["counts"]
             denom = total_counts[lbl] + alpha * V
             for f in vocab.keys():
-                count = class_counts[lbl].get(f, 0)
+                count = class_counts.get(f, 0)
                 prob = (count + alpha) / denom
                 log_probs[lbl][f] = math.log(prob)
         # Priors uniformes o proporcionales a ejemplos
-        label_freq = {lbl: 0 for lbl in labels}
-        for lbl in y:
-            label_freq[lbl] += 1
-        total_docs = len(y)
+        label_freq = {lbl: int(classes[lbl]["examples"]) for lbl in labels}
+        total_docs = sum(label_freq.values())
         logpriors = {lbl: math.log((label_freq[lbl] / total_docs) if total_docs else (1.0 / len(labels))) for lbl in labels}
 
         # Checksum de intents/patterns para trazabilidad
-        checksum_src = []
-        for intent in intents:
-            name = str(intent.get("name") or "")
-            pats = [str(p) for p in (intent.get("patterns") or [])]
-            checksum_src.append(name + "::" + "|".join(sorted(pats)))
-        checksum = hashlib.sha256("\n".join(sorted(checksum_src)).encode("utf-8")).hexdigest()
+        checksum = intents_checksum(intents)
 
         # Metadatos
         meta = {
@@ -225,6 +538,13 @@ class MLNLU:
             "alpha": alpha,
             "threshold": self.threshold,
             "checksum": checksum,
+            "algorithm": self.algorithm,
+            "hash_features": self.hash_buckets,
+            "training": {
+                "recounted": recounted,
+                "reused": [lbl for lbl in labels if lbl not in recounted],
+                "removed": removed,
+            },
             "version": 1,
         }
 
@@ -236,39 +556,97 @@ class MLNLU:
             "char_ng": self.char_ng,
             "word_ng": self.word_ng,
             "alpha": alpha,
+            "hash_features": self.hash_buckets,
             "meta": meta,
         }
         return True
 
     # =============== Persistencia ===============
+    @property
+    def train_state_path(self) -> Path:
+        return self.model_path.with_name(self.model_path.name + ".counts.json")
+
+    def _train_params(self) -> Dict[str, Any]:
+        # Parámetros que determinan los conteos; alpha no (se aplica al recalcular)
+        return {
+            "char_ng": list(self.char_ng),
+            "word_ng": list(self.word_ng),
+            "hash_features": self.hash_buckets,
+        }
+
+    def _load_train_state(self) -> Optional[Dict[str, Any]]:
+        """Conteos crudos por clase del último entrenamiento, si son compatibles."""
+        try:
+            state = json.loads(self.train_state_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        if any(state.get(k) != v for k, v in self._train_params().items()):
+            return None
+        if self.hash_buckets:
+            for cls in (state.get("classes") or {}).values():
+                cls["counts"] = {int(f): c for f, c in (cls.get("counts") or {}).items()}
+        return state
+
+    def _save_train_state(self) -> None:
+        if not self._train_state:
+            return
+        atomic_write_text(self.train_state_path, json.dumps({"version": 1, **self._train_state}, ensure_ascii=False))
+
     def _save(self) -> None:
         if not self._model:
             return
         try:
-            with open(self.model_path, "wb") as f:
-                pickle.dump(self._model, f)
+            if self.model_path.suffix == ".pkl":
+                # Formato legado: escritura atómica vía archivo temporal único
+                atomic_write_bytes(self.model_path, pickle.dumps(self._model))
+            else:
+                save_binary(self._model, self.model_path)
+            self._save_train_state()
         except Exception:
             # Si falla el guardado, continuamos con el modelo en memoria
-            pass
+            logging.exception(f"NLU: no se pudo guardar {self.model_path}")
 
     def _load(self) -> None:
         try:
-            with open(self.model_path, "rb") as f:
-                self._model = pickle.load(f)
+            if is_binary_model(self.model_path):
+                model = load_binary(self.model_path)
+                if "log_probs" not in model and (np is None or self.engine == "dict"):
+                    model["log_probs"] = self._log_probs_from_matrix(model)
+                self._model = model
+            else:
+                # Modelos .pkl anteriores al formato binario
+                with open(self.model_path, "rb") as f:
+                    self._model = pickle.load(f)
         except Exception:
             self._model = None
 
+    @staticmethod
+    def _log_probs_from_matrix(model: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+        feats = sorted(model["vocab"], key=model["vocab"].__getitem__)
+        return {lbl: dict(zip(feats, row.tolist())) for lbl, row in zip(model["labels"], model["matrix"])}
+
     # =============== Feature extraction ===============
     def _extract_features(
         self,
         text: str,
         build_vocab: bool = False,
         _vocab: Optional[Dict[str, int]] = None,
-    ) -> Dict[str, int]:
+    ) -> Dict[Any, int]:
         """Extrae n-gramas de caracteres y palabras como características discretas.
         Si build_vocab=True, también rellena el vocab.
+        Con hash_features las claves son buckets enteros en lugar de strings.
         """
         text = text or ""
+        if self.hash_buckets > 0:
+            hashed = self._extract_hashed(text)
+            if _vocab is None:
+                return hashed
+            if build_vocab:
+                for b in hashed:
+                    if b not in _vocab:
+                        _vocab[b] = len(_vocab)
+                return hashed
+            return {b: c for b, c in hashed.items() if b in _vocab}
         feats: Dict[str, int] = {}
 
         def add_feat(tok: str):
@@ -299,3 +677,42 @@ class MLNLU:
                 add_feat("w:" + "_".join(words[i:i+k]))
 
         return feats
+
+    def _extract_hashed(self, text: str) -> Dict[int, int]:
+        """Mismos n-gramas que la versión exacta, hasheados con FNV-1a sobre code points.
+
+        El hash se acumula carácter a carácter (rolling), así que no se crea ningún
+        string por n-grama; el hash es estable entre procesos (a diferencia de hash()).
+        """
+        nb = self.hash_buckets
+        feats: Dict[int, int] = {}
+        codes = [ord(ch) for ch in text]
+        n = len(codes)
+
+        cmin, cmax = self.char_ng
+        cmin = max(1, cmin)
+        cmax = max(cmin, cmax)
+        for i in range(n - cmin + 1):
+            h = _FNV_CHAR_SEED
+            for j in range(i, min(n, i + cmax)):
+                h = ((h ^ codes[j]) * _FNV_PRIME) & _FNV_MASK
+                if j - i + 1 >= cmin:
+                    b = h % nb
+                    feats[b] = feats.get(b, 0) + 1
+
+        words = text.split()
+        wmin, wmax = self.word_ng
+        wmin = max(1, wmin)
+        wmax = max(wmin, wmax)
+        W = len(words)
+        for i in range(W - wmin + 1):
+            h = _FNV_WORD_SEED
+            for k in range(min(wmax, W - i)):
+                if k:
+                    h = ((h ^ 95) * _FNV_PRIME) & _FNV_MASK  # separador "_"
+                for ch in words[i + k]:
+                    h = ((h ^ ord(ch)) * _FNV_PRIME) & _FNV_MASK
+                if k + 1 >= wmin:
+                    b = h % nb
+                    feats[b] = feats.get(b, 0) + 1
+        return feats
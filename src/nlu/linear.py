@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .classifier import MLNLU, _normalize, intents_checksum
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - entorno sin numpy
+    np = None  # type: ignore[assignment]
+
+DEFAULT_LINEAR_MODEL_NAME = "nlu_linear.bin"
+
+
+class LinearNLU(MLNLU):
+    """Regresión logística multinomial (softmax) entrenada con SGD por mini-lotes en NumPy.
+
+    Usa las mismas features que MLNLU (_extract_features, con o sin hashing trick) y
+    el mismo layout de modelo: los pesos son la matriz labels × vocab y el sesgo va en
+    `logpriors`, así que la inferencia es el mismo producto matriz dispersa-vector
+    (scores = W[:, cols] @ counts + b) y se reutilizan el formato binario mmap, el
+    scoring vectorizado, classify_many y el hot swap del registro.
+
+    Frente a Naive Bayes aprende pesos discriminativos (no asume independencia entre
+    n-gramas solapados) y, con poda L2, guarda solo las columnas con peso relevante.
+
+    Config opcional en rules.nlu.linear:
+      - model_path: por defecto data/models/nlu_linear.bin
+      - char_ngrams, word_ngrams, hash_features, engine, retrain_on_start, auto_retrain:
+        igual que en rules.nlu.ml
+      - epochs: 200 pasadas sobre los ejemplos
+      - batch_size: 16
+      - learning_rate: 4.0 (se divide por la norma² media de los ejemplos)
+      - l2: 1e-4 regularización L2
+      - prune: 1e-2 pesos con |w| menor se anulan; columnas vacías se eliminan
+      - seed: 0 (entrenamiento determinista)
+
+    Requiere NumPy para entrenar (RuntimeError si no está); un modelo ya entrenado
+    puede servirse sin NumPy con engine "dict".
+    """
+
+    config_key = "linear"
+    default_model_name = DEFAULT_LINEAR_MODEL_NAME
+    algorithm = "logistic_regression"
+
+    def __init__(self, nlu_cfg: Dict[str, Any], data_dir: str | Path = "data"):
+        cfg = dict((nlu_cfg or {}).get(self.config_key) or {})
+        self.epochs = int(cfg.get("epochs") or 200)
+        self.batch_size = max(1, int(cfg.get("batch_size") or 16))
+        self.learning_rate = float(cfg.get("learning_rate") or 4.0)
+        self.l2 = float(cfg.get("l2") if cfg.get("l2") is not None else 1e-4)
+        self.prune = float(cfg.get("prune") if cfg.get("prune") is not None else 1e-2)
+        self.seed = int(cfg.get("seed") or 0)
+        super().__init__(nlu_cfg, data_dir=data_dir)
+
+    # Sin conteos incrementales: el modelo discriminativo se reentrena completo
+    def _load_train_state(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def _train_from_rules(self, previous: Optional[Dict[str, Any]] = None) -> bool:
+        if np is None:
+            raise RuntimeError("nlu.provider 'linear' requiere numpy para entrenar")
+        intents = list(self.cfg.get("intents") or [])
+        texts: List[str] = []
+        targets: List[str] = []
+        for intent in intents:
+            for p in intent.get("patterns") or []:
+                if isinstance(p, str) and p.strip():
+                    texts.append(p)
+                    targets.append(intent.get("name"))
+        labels = sorted(set(targets))
+        if len(labels) < 2:
+            self._model = None
+            return False
+        label_idx = {lbl: k for k, lbl in enumerate(labels)}
+
+        # Ejemplos en formato CSR (indptr/cols/vals) sobre el vocab observado
+        vocab: Dict[Any, int] = {}
+        indptr = [0]
+        cols: List[int] = []
+        vals: List[float] = []
+        for text in texts:
+            for f, c in self._extract_features(_normalize(text)).items():
+                j = vocab.get(f)
+                if j is None:
+                    j = vocab[f] = len(vocab)
+                cols.append(j)
+                vals.append(c)
+            indptr.append(len(cols))
+        n, V, L = len(texts), len(vocab), len(labels)
+        ptr = np.asarray(indptr)
+        col_arr = np.asarray(cols, dtype=np.int64)
+        val_arr = np.asarray(vals, dtype=np.float64)
+        y = np.array([label_idx[t] for t in targets])
+        Y = np.eye(L)[y]
+
+        def batch_matrix(batch: Any) -> Any:
+            # Solo el mini-lote se densifica (B × V), nunca la matriz completa n × V
+            lengths = ptr[batch + 1] - ptr[batch]
+            idx = np.concatenate([np.arange(ptr[r], ptr[r + 1]) for r in batch])
+            Xb = np.zeros((len(batch), V), dtype=np.float64)
+            Xb[np.repeat(np.arange(len(batch)), lengths), col_arr[idx]] = val_arr[idx]
+            return Xb
+
+        # Paso normalizado por la norma² media: con conteos de n-gramas los logits crecen
+        # con la longitud del texto y un paso fijo diverge en textos largos
+        row_of = np.repeat(np.arange(n), np.diff(ptr))
+        mean_sq = float(np.bincount(row_of, weights=val_arr * val_arr, minlength=n).mean()) or 1.0
+        lr = self.learning_rate / mean_sq
+        W = np.zeros((L, V), dtype=np.float64)
+        b = np.zeros(L, dtype=np.float64)
+        rng = np.random.default_rng(self.seed)
+        for _ in range(self.epochs):
+            order = rng.permutation(n)
+            for start in range(0, n, self.batch_size):
+                batch = order[start:start + self.batch_size]
+                Xb = batch_matrix(batch)
+                probs = self._softmax(Xb @ W.T + b)
+                grad = (probs - Y[batch]) / len(batch)
+                W -= lr * (grad.T @ Xb + self.l2 * W)
+                b -= lr * grad.sum(axis=0)
+
+        log_loss = 0.0
+        correct = 0
+        for start in range(0, n, self.batch_size):
+            batch = np.arange(start, min(n, start + self.batch_size))
+            probs = self._softmax(batch_matrix(batch) @ W.T + b)
+            log_loss -= float(np.log(np.maximum(probs[np.arange(len(batch)), y[batch]], 1e-12)).sum())
+            correct += int((probs.argmax(axis=1) == y[batch]).sum())
+        loss = log_loss / n
+        train_accuracy = correct / n
+
+        # Poda: anular pesos pequeños y quitar las columnas que quedan vacías
+        W[np.abs(W) < self.prune] = 0.0
+        keep = np.flatnonzero(np.abs(W).sum(axis=0) > 0)
+        feats: List[Any] = [None] * V
+        for f, j in vocab.items():
+            feats[j] = f
+        pruned_vocab = {feats[j]: i for i, j in enumerate(keep.tolist())}
+        W = W[:, keep]
+
+        label_freq: Dict[str, int] = {lbl: 0 for lbl in labels}
+        for t in targets:
+            label_freq[t] += 1
+        meta = {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "examples_total": n,
+            "labels_total": L,
+            "examples_per_label": label_freq,
+            "vocab_size": len(pruned_vocab),
+            "vocab_size_unpruned": V,
+            "char_ngrams": self.char_ng,
+            "word_ngrams": self.word_ng,
+            "threshold": self.threshold,
+            "checksum": intents_checksum(intents),
+            "algorithm": self.algorithm,
+            "hash_features": self.hash_buckets,
+            "training": {
+                "epochs": self.epochs,
+                "batch_size": self.batch_size,
+                "learning_rate": self.learning_rate,
+                "l2": self.l2,
+                "prune": self.prune,
+                "loss": round(loss, 6) if math.isfinite(loss) else None,
+                "train_accuracy": round(train_accuracy, 4),
+            },
+            "version": 1,
+        }
+        self._model = {
+            "labels": labels,
+            "vocab": pruned_vocab,
+            "matrix": W,
+            "logpriors": dict(zip(labels, b.tolist())),
+            "char_ng": self.char_ng,
+            "word_ng": self.word_ng,
+            "alpha": None,
+            "hash_features": self.hash_buckets,
+            "meta": meta,
+        }
+        if self.engine == "dict":
+            self._model["log_probs"] = self._log_probs_from_matrix(self._model)
+        return True
+
+
+__all__ = ["LinearNLU", "DEFAULT_LINEAR_MODEL_NAME"]
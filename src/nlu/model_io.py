@@ -0,0 +1,190 @@
+"""Formato binario versionado para el modelo NLU (reemplazo de pickle).
+
+Estructura del archivo (little-endian):
+
+    MAGIC (4 bytes, b"NLUB") | versión (uint32) | longitud del header (uint64)
+    header JSON utf-8 (labels, logpriors, meta, parámetros y offsets de secciones)
+    tabla de strings: offsets uint32 (V + 1) seguidos del blob utf-8 del vocab
+    matriz float32 contigua labels × vocab (fila = label, columna = índice del vocab)
+
+Las secciones se alinean a 16 bytes para que la matriz pueda mapearse con `mmap`
+directamente como arreglo NumPy: los workers comparten las páginas del archivo en
+lugar de deserializar cada uno su copia del modelo. En Windows el archivo se lee a
+memoria: un archivo mapeado no se puede reemplazar con os.replace y el reentrenamiento
+(save_binary) fallaría mientras algún modelo siga cargado.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - entorno sin numpy
+    np = None  # type: ignore[assignment]
+
+from ..storage.locking import atomic_write_bytes
+
+MAGIC = b"NLUB"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<4sIQ")
+_ALIGN = 16
+# mmap del archivo al cargar (False en Windows, ver docstring del módulo)
+MMAP_MODELS = os.name != "nt"
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def _section_offsets(header_len: int, n_vocab: int, blob_len: int) -> tuple[int, int]:
+    """Offsets (alineados) de la tabla de strings y de la matriz."""
+    strings_offset = _PREFIX.size + header_len
+    strings_offset += _pad(strings_offset)
+    matrix_offset = strings_offset + 4 * (n_vocab + 1) + blob_len
+    matrix_offset += _pad(matrix_offset)
+    return strings_offset, matrix_offset
+
+
+def is_binary_model(path: str | Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_binary(model: Dict[str, Any], path: str | Path) -> None:
+    """Escribe el modelo (layout en dicts de MLNLU) en formato binario, de forma atómica."""
+    labels: List[str] = list(model["labels"])
+    vocab: Dict[Any, int] = model["vocab"]
+    n_vocab = len(vocab)
+
+    # Tabla de strings ordenada por índice de columna
+    feats: List[Any] = [""] * n_vocab
+    for f, i in vocab.items():
+        feats[i] = f
+    # Con hashing trick las features son buckets enteros: se guardan como texto decimal
+    encoded = [str(f).encode("utf-8") for f in feats]
+    offsets = array("I", [0])
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    blob = b"".join(encoded)
+
+    if model.get("matrix") is not None and np is not None:
+        # Modelos que ya traen la matriz labels × vocab (p.ej. el lineal)
+        matrix = array("f", np.ascontiguousarray(model["matrix"], dtype=np.float32).tobytes())
+    else:
+        matrix = array("f", bytes(4 * len(labels) * n_vocab))
+        for row, label in enumerate(labels):
+            base = row * n_vocab
+            for f, lp in (model["log_probs"].get(label) or {}).items():
+                col = vocab.get(f)
+                if col is not None:
+                    matrix[base + col] = lp
+
+    header: Dict[str, Any] = {
+        "labels": labels,
+        "logpriors": [model["logpriors"].get(lbl, -1e9) for lbl in labels],
+        "char_ng": list(model.get("char_ng") or ()),
+        "word_ng": list(model.get("word_ng") or ()),
+        "alpha": model.get("alpha"),
+        "hash_features": int(model.get("hash_features") or 0),
+        "meta": model.get("meta") or {},
+        "n_labels": len(labels),
+        "n_vocab": n_vocab,
+        "dtype": "float32",
+        "strings_bytes": len(blob),
+    }
+    raw = json.dumps(header, ensure_ascii=False, default=str).encode("utf-8")
+    strings_offset, matrix_offset = _section_offsets(len(raw), n_vocab, len(blob))
+
+    if sys.byteorder != "little":  # pragma: no cover - el formato es little-endian
+        offsets.byteswap()
+        matrix.byteswap()
+
+    buf = io.BytesIO()
+    buf.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(raw)))
+    buf.write(raw)
+    buf.write(b"\0" * (strings_offset - buf.tell()))
+    buf.write(offsets.tobytes())
+    buf.write(blob)
+    buf.write(b"\0" * (matrix_offset - buf.tell()))
+    buf.write(matrix.tobytes())
+    # Temporal único (mkstemp): varios workers pueden reentrenar el mismo modelo a la vez
+    atomic_write_bytes(Path(path), buf.getvalue())
+
+
+def load_binary(path: str | Path) -> Dict[str, Any]:
+    """Carga un modelo binario.
+
+    Con NumPy la matriz queda mapeada en memoria (`model["matrix"]`, float32 de solo
+    lectura) y no se reconstruye el dict `log_probs`. Sin NumPy se materializa
+    `log_probs` para que el clasificador use el camino en Python puro.
+    """
+    with open(path, "rb") as f:
+        mm: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if MMAP_MODELS else f.read()
+    magic, version, header_len = _PREFIX.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: no es un modelo NLU binario")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"{path}: versión de formato {version} no soportada")
+    header = json.loads(bytes(mm[_PREFIX.size:_PREFIX.size + header_len]).decode("utf-8"))
+
+    labels: List[str] = list(header["labels"])
+    n_labels = int(header["n_labels"])
+    n_vocab = int(header["n_vocab"])
+    s_off, m_off = _section_offsets(header_len, n_vocab, int(header["strings_bytes"]))
+
+    offsets = array("I")
+    offsets.frombytes(mm[s_off:s_off + 4 * (n_vocab + 1)])
+    if sys.byteorder != "little":  # pragma: no cover
+        offsets.byteswap()
+    blob_start = s_off + 4 * (n_vocab + 1)
+    blob = mm[blob_start:blob_start + offsets[-1]]
+    hash_features = int(header.get("hash_features") or 0)
+    if hash_features:
+        vocab: Dict[Any, int] = {int(blob[offsets[i]:offsets[i + 1]]): i for i in range(n_vocab)}
+    else:
+        vocab = {blob[offsets[i]:offsets[i + 1]].decode("utf-8"): i for i in range(n_vocab)}
+
+    model: Dict[str, Any] = {
+        "labels": labels,
+        "vocab": vocab,
+        "logpriors": dict(zip(labels, header["logpriors"])),
+        "char_ng": tuple(header.get("char_ng") or ()),
+        "word_ng": tuple(header.get("word_ng") or ()),
+        "alpha": header.get("alpha"),
+        "hash_features": hash_features,
+        "meta": header.get("meta") or {},
+        "format": {"name": "binary", "version": version},
+    }
+    if np is not None:
+        model["matrix"] = np.frombuffer(mm, dtype="<f4", count=n_labels * n_vocab, offset=m_off).reshape(n_labels, n_vocab)
+        model["_mmap"] = mm  # mantener vivo el mapeo (o el buffer) mientras exista el modelo
+    else:
+        values = array("f")
+        values.frombytes(mm[m_off:m_off + 4 * n_labels * n_vocab])
+        if sys.byteorder != "little":  # pragma: no cover
+            values.byteswap()
+        feats: List[Any] = [""] * n_vocab
+        for f, i in vocab.items():
+            feats[i] = f
+        model["log_probs"] = {
+            lbl: {feats[c]: float(values[r * n_vocab + c]) for c in range(n_vocab)}
+            for r, lbl in enumerate(labels)
+        }
+        if isinstance(mm, mmap.mmap):
+            mm.close()
+    return model
+
+
+__all__ = ["MAGIC", "FORMAT_VERSION", "is_binary_model", "save_binary", "load_binary"]
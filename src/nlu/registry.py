@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .classifier import MLNLU, SimpleNLU, config_checksum, intents_checksum
+from .linear import LinearNLU
+
+# Proveedores con archivo de modelo entrenado (el resto usa SimpleNLU)
+_TRAINED = {"ml": MLNLU, "linear": LinearNLU}
+
+_Slot = Tuple[str, str, str, str]
+
+
+def _model_mtime(path: Optional[Path]) -> Optional[float]:
+    if path is None:
+        return None
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def _instance_bytes(instance: Any) -> int:
+    """Memoria estimada de un clasificador (para el presupuesto del registro)."""
+    try:
+        return int(instance.memory_bytes())
+    except Exception:
+        return 0
+
+
+class NLURegistry:
+    """Registro de clasificadores NLU compartido por todo el proceso.
+
+    Entrega un clasificador listo para usar por clave (provider, checksum de la
+    config nlu, ruta y mtime del archivo de modelo). Cada modelo se carga una única
+    vez y se comparte entre todas las instancias de BotManager (Telegram, WhatsApp,
+    webchat).
+
+    Hot swap: cuando cambian las reglas o el archivo de modelo y ya hay un modelo
+    ML listo para esa ruta, la nueva instancia se construye en un hilo de fondo
+    (reentrenando si meta.checksum no coincide con los intents) y mientras tanto
+    las peticiones siguen usando la anterior. Solo el primer modelo de cada ruta
+    se construye en el camino de la petición.
+
+    Multi-tenant: con `tenant` (chat con su propio bloque nlu) el modelo se guarda en
+    `<dir del modelo>/tenants/<checksum de intents>/`, así que los overrides no pisan
+    el modelo global y los chats con los mismos intents comparten archivo. En memoria
+    se mantienen los `max_entries` modelos más usados (LRU) y, con `memory_budget`
+    (bytes, 0 = sin límite), se desalojan los menos usados hasta caber. Cada modelo
+    frío se carga con su propio lock: una carga lenta no bloquea a otros tenants.
+    """
+
+    def __init__(self, max_entries: int = 32, background: bool = True, memory_budget: int = 0) -> None:
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        self.background = background
+        self._lock = threading.Lock()
+        # (provider, data_dir, checksum, ruta) -> (mtime, instancia), en orden LRU
+        self._entries: "OrderedDict[_Slot, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._sizes: Dict[_Slot, int] = {}
+        self._tenants: Dict[_Slot, Optional[str]] = {}
+        # ruta del modelo -> última instancia lista (se sirve mientras se reconstruye)
+        self._latest: Dict[str, Any] = {}
+        self._pending: Dict[_Slot, threading.Thread] = {}
+        self._building: Dict[_Slot, threading.Lock] = {}
+        # id(config nlu) -> (config, resultado de _resolve); ver _resolve
+        self._resolved: Dict[Tuple[int, str, Optional[str]], Tuple[Dict[str, Any], Any]] = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def configure(self, max_entries: Optional[int] = None, memory_budget: Optional[int] = None) -> None:
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if memory_budget is not None:
+                self.memory_budget = memory_budget
+            self._evict()
+
+    def _resolve(self, nlu_cfg: Dict[str, Any], data_dir: str | Path, tenant: Optional[str]) -> Tuple[str, Dict[str, Any], Optional[Path], _Slot]:
+        """(provider, config efectiva, ruta del modelo, slot) para esta config.
+
+        Se memoriza por identidad del dict: las reglas llegan como el mismo objeto
+        hasta la siguiente recarga (RulePlan), así que el checksum (json + sha256
+        del bloque nlu) se calcula una vez por versión y no en cada mensaje.
+        """
+        key = (id(nlu_cfg), str(data_dir), tenant)
+        hit = self._resolved.get(key)
+        if hit is not None and hit[0] is nlu_cfg:
+            return hit[1]
+        provider = str(nlu_cfg.get("provider") or "simple").lower()
+        trained = _TRAINED.get(provider)
+        cfg = nlu_cfg
+        if trained is not None and tenant:
+            cfg = self._tenant_cfg(trained, nlu_cfg, data_dir)
+        path = trained.resolve_model_path(cfg, data_dir) if trained else None
+        resolved = (provider, cfg, path, (provider, str(data_dir), config_checksum(cfg), str(path or "")))
+        if len(self._resolved) >= 256:
+            self._resolved.clear()
+        self._resolved[key] = (nlu_cfg, resolved)
+        return resolved
+
+    def get(self, nlu_cfg: Dict[str, Any], data_dir: str | Path = "data", tenant: Optional[str] = None) -> Any:
+        provider, nlu_cfg, path, slot = self._resolve(nlu_cfg or {}, data_dir, tenant)
+
+        entry = self._entries.get(slot)
+        if entry is not None and entry[0] == _model_mtime(path):
+            with self._lock:
+                if slot in self._entries:
+                    self._entries.move_to_end(slot)
+                self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            # Otro hilo pudo haberlo construido mientras esperábamos el lock
+            entry = self._entries.get(slot)
+            if entry is not None and entry[0] == _model_mtime(path):
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return entry[1]
+            serving = entry[1] if entry is not None else (self._latest.get(str(path)) if path else None)
+            if serving is not None and self.background:
+                # Hay un modelo listo: reconstruir fuera del camino de la petición
+                if slot not in self._pending:
+                    # Si solo cambió el archivo (config igual) se recarga sin reentrenar
+                    reload_only = entry is not None
+                    worker = threading.Thread(
+                        target=self._rebuild,
+                        args=(slot, provider, nlu_cfg, data_dir, path, reload_only, tenant),
+                        name="nlu-rebuild",
+                        daemon=True,
+                    )
+                    self._pending[slot] = worker
+                    worker.start()
+                return serving
+            build_lock = self._building.setdefault(slot, threading.Lock())
+
+        # Carga en frío fuera del lock global: solo esperan las peticiones de este modelo
+        with build_lock:
+            entry = self._entries.get(slot)
+            if entry is not None and entry[0] == _model_mtime(path):
+                return entry[1]
+            try:
+                instance = self._build(provider, nlu_cfg, data_dir)
+                with self._lock:
+                    self._store(slot, path, instance, tenant)
+            finally:
+                with self._lock:
+                    self._building.pop(slot, None)
+        return instance
+
+    @staticmethod
+    def _tenant_cfg(trained: Any, nlu_cfg: Dict[str, Any], data_dir: str | Path) -> Dict[str, Any]:
+        """Config con model_path propio del tenant, derivado del checksum de sus intents."""
+        base = trained.resolve_model_path(nlu_cfg, data_dir)
+        digest = intents_checksum(list(nlu_cfg.get("intents") or []))[:16]
+        key = trained.config_key
+        path = base.parent / "tenants" / digest / base.name
+        return {**nlu_cfg, key: {**(nlu_cfg.get(key) or {}), "model_path": str(path)}}
+
+    def _rebuild(
+        self,
+        slot: _Slot,
+        provider: str,
+        nlu_cfg: Dict[str, Any],
+        data_dir: str | Path,
+        path: Optional[Path],
+        reload_only: bool,
+        tenant: Optional[str] = None,
+    ) -> None:
+        try:
+            if reload_only:
+                # Recarga por cambio del archivo: no reentrenar, para que dos configs
+                # que comparten ruta no se pisen el modelo una a la otra en bucle.
+                key = _TRAINED[provider].config_key if provider in _TRAINED else "ml"
+                cfg = {**nlu_cfg, key: {**(nlu_cfg.get(key) or {}), "auto_retrain": False, "retrain_on_start": False}}
+                instance = self._build(provider, cfg, data_dir)
+                if getattr(instance, "is_stale", lambda: False)():
+                    with self._lock:
+                        entry = self._entries.get(slot)
+                        if entry is not None:
+                            # Conservar la instancia actual, pero no reintentar con este mtime
+                            self._entries[slot] = (_model_mtime(path), entry[1])
+                    return
+            else:
+                instance = self._build(provider, nlu_cfg, data_dir)
+            with self._lock:
+                self._store(slot, path, instance, tenant)
+            logging.info(f"nlu registry: modelo {provider} actualizado en segundo plano ({path})")
+        except Exception:
+            logging.exception("nlu registry: error reconstruyendo el modelo NLU")
+        finally:
+            with self._lock:
+                self._pending.pop(slot, None)
+
+    def _store(self, slot: _Slot, path: Optional[Path], instance: Any, tenant: Optional[str] = None) -> None:
+        # Llamar con el lock tomado. El mtime se toma tras construir: si el modelo se
+        # (re)entrenó y guardó, la siguiente consulta debe reconocer el archivo nuevo.
+        self._entries.pop(slot, None)
+        self._entries[slot] = (_model_mtime(path), instance)
+        self._sizes[slot] = _instance_bytes(instance)
+        self._tenants[slot] = tenant
+        self.loads += 1
+        if path is not None:
+            self._latest[str(path)] = instance
+        self._evict()
+
+    def _evict(self) -> None:
+        # Llamar con el lock tomado. Nunca se desaloja el modelo recién usado.
+        while len(self._entries) > 1 and (
+            (self.max_entries > 0 and len(self._entries) > self.max_entries)
+            or (self.memory_budget > 0 and sum(self._sizes.values()) > self.memory_budget)
+        ):
+            slot, (_, instance) = self._entries.popitem(last=False)
+            self._sizes.pop(slot, None)
+            self._tenants.pop(slot, None)
+            for key in [k for k, v in self._latest.items() if v is instance]:
+                del self._latest[key]
+            self.evictions += 1
+
+    @staticmethod
+    def _build(provider: str, nlu_cfg: Dict[str, Any], data_dir: str | Path) -> Any:
+        if provider == "ml":
+            return MLNLU(nlu_cfg, data_dir=data_dir)
+        if provider == "linear":
+            try:
+                return LinearNLU(nlu_cfg, data_dir=data_dir)
+            except RuntimeError as e:
+                # Sin numpy no se puede entrenar: degradar a Naive Bayes
+                logging.warning(f"nlu registry: {e}; usando provider 'ml'")
+                return MLNLU(nlu_cfg, data_dir=data_dir)
+        return SimpleNLU(nlu_cfg)
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Espera a que terminen las reconstrucciones en curso (tests/arranque)."""
+        with self._lock:
+            workers = list(self._pending.values())
+        for w in workers:
+            w.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "max_models": self.max_entries,
+                "memory_bytes": sum(self._sizes.values()),
+                "memory_budget_bytes": self.memory_budget,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                # De menos a más usado recientemente
+                "entries": [
+                    {"provider": slot[0], "model_path": slot[3] or None, "tenant": self._tenants.get(slot), "bytes": self._sizes.get(slot, 0)}
+                    for slot in self._entries
+                ],
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = OrderedDict()
+            self._sizes = {}
+            self._tenants = {}
+            self._latest = {}
+            self._resolved = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+registry = NLURegistry()
+
+
+def get_classifier(nlu_cfg: Dict[str, Any], data_dir: str | Path = "data", tenant: Optional[str] = None) -> Any:
+    """Atajo sobre el registro global del proceso."""
+    return registry.get(nlu_cfg, data_dir=data_dir, tenant=tenant)
+
+
+__all__ = ["NLURegistry", "registry", "get_classifier", "config_checksum"]
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+from ..app.config import settings
+from .conversation_repository import ConversationRepository
+from .repository import TicketRepository
+from .state_repository import StateRepository
+
+BACKENDS = ("json", "sqlite")
+# El historial admite además el log append-only (CONVERSATION_BACKEND=log)
+CONVERSATION_BACKENDS = BACKENDS + ("log",)
+
+_databases: Dict[str, Any] = {}
+_caches: List[Any] = []
+# Backend efectivo de cada repositorio creado ("state" / "conversations"), para /admin/storage
+_effective: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _backend(backend: str | None, options: tuple = BACKENDS) -> str:
+    name = (backend or settings.data_backend or "json").strip().lower()
+    if name not in options:
+        raise ValueError(f"backend de datos desconocido: {name!r} (opciones: {', '.join(options)})")
+    return name
+
+
+def get_database(data_dir: Path):
+    """SqliteDatabase de data_dir (una por archivo); la primera vez migra los JSON existentes."""
+    from .sqlite_repository import SqliteDatabase, migrate_json
+
+    path = Path(data_dir) / settings.sqlite_file
+    with _lock:
+        db = _databases.get(str(path))
+        if db is None:
+            db = _databases[str(path)] = SqliteDatabase(path)
+            migrate_json(Path(data_dir), db)
+        return db
+
+
+def state_repository(data_dir: Path, backend: str | None = None):
+    if _backend(backend) == "sqlite":
+        from .sqlite_repository import SqliteStateRepository
+
+        _effective["state"] = "sqlite"
+        return SqliteStateRepository(get_database(data_dir))
+    if settings.json_shards > 0:
+        if settings.state_cache:
+            logging.warning("STATE_CACHE se ignora con JSON_SHARDS > 0: el estado particionado se escribe sin caché")
+        _effective["state"] = f"json_shards({settings.json_shards})"
+        return _sharded(data_dir, "state")
+    if settings.state_cache:
+        from .state_cache import CachedStateRepository
+
+        repo = CachedStateRepository(Path(data_dir), settings.state_flush_interval, settings.state_max_dirty)
+        with _lock:
+            _caches.append(repo)
+        _effective["state"] = "json_cache"
+        return repo
+    _effective["state"] = "json"
+    return StateRepository(Path(data_dir))
+
+
+def flush_storage() -> None:
+    """Persiste lo pendiente de las cachés write-back (llamar al apagar el proceso)."""
+    with _lock:
+        caches = list(_caches)
+    for repo in caches:
+        try:
+            repo.flush()
+        except Exception:
+            logging.exception(f"flush de {repo.file} falló")
+
+
+def storage_stats() -> Dict[str, Any]:
+    """Backend efectivo de cada repositorio y métricas de las cachés write-back de estado."""
+    with _lock:
+        return {"backends": dict(_effective), "state_cache": [{"file": str(r.file), **r.stats()} for r in _caches]}
+
+
+def conversation_repository(data_dir: Path, backend: str | None = None):
+    name = _backend(backend or settings.conversation_backend, CONVERSATION_BACKENDS)
+    if name == "sqlite":
+        from .sqlite_repository import SqliteConversationRepository
+
+        _effective["conversations"] = "sqlite"
+        return SqliteConversationRepository(get_database(data_dir))
+    if name == "log":
+        from .event_log import EventLogConversationRepository
+
+        _effective["conversations"] = "log"
+        return EventLogConversationRepository(Path(data_dir))
+    if settings.json_shards > 0:
+        _effective["conversations"] = f"json_shards({settings.json_shards})"
+        return _sharded(data_dir, "conversations")
+    _effective["conversations"] = "json"
+    return ConversationRepository(Path(data_dir))
+
+
+def _sharded(data_dir: Path, kind: str):
+    """Repositorio JSON particionado; la primera vez reparte el archivo único existente.
+
+    La comprobación y el reparto van bajo el lock entre procesos de `<kind>.json`:
+    si varios workers arrancan a la vez solo uno reparte y los demás ven el
+    directorio ya creado al tomar el lock.
+    """
+    from .locking import file_lock
+    from .sharded import ShardedConversationRepository, ShardedStateRepository, read_shard_count, reshard
+
+    data_dir = Path(data_dir)
+    single = data_dir / f"{kind}.json"
+    if read_shard_count(data_dir / kind) is None and single.exists():
+        with file_lock(single):
+            if read_shard_count(data_dir / kind) is None:
+                reshard(data_dir, kind, settings.json_shards)
+    cls = ShardedStateRepository if kind == "state" else ShardedConversationRepository
+    return cls(data_dir, settings.json_shards)
+
+
+def ticket_repository(data_dir: Path, backend: str | None = None):
+    if _backend(backend) == "sqlite":
+        from .sqlite_repository import SqliteTicketRepository
+
+        return SqliteTicketRepository(get_database(data_dir))
+    return TicketRepository(Path(data_dir))
+
+
+atexit.register(flush_storage)
+
+__all__ = ["BACKENDS", "CONVERSATION_BACKENDS", "conversation_repository", "flush_storage", "get_database", "state_repository", "storage_stats", "ticket_repository"]
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 from pathlib import Path
-import json
+import threading
 import time
 from typing import Any, Dict, List, Optional
 
+from .locking import JsonFileMixin, ensure_file, synchronized_key
 
-class ConversationRepository:
+
+class ConversationRepository(JsonFileMixin):
     """Almacena historial de conversación y temas abiertos por usuario y chat.
 
     Estructura JSON:
@@ -23,27 +25,32 @@ class ConversationRepository:
 
     def __init__(self, data_dir: Path, filename: str = "conversations.json"):
         self.dir = data_dir
+        self._lock = threading.RLock()
         self.dir.mkdir(parents=True, exist_ok=True)
         self.file = self.dir / filename
-        if not self.file.exists():
-            self.file.write_text("{}", encoding="utf-8")
+        ensure_file(self.file, "{}")
 
     @staticmethod
     def _key(user_id: str, chat_id: Optional[str]) -> str:
         return f"{chat_id or '-'}|{user_id or '-'}"
 
-    def _load(self) -> Dict[str, Any]:
-        try:
-            return json.loads(self.file.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
+    def _file_for(self, key: Optional[str] = None) -> Path:
+        """Archivo que guarda la clave (uno solo aquí; ver ShardedStateRepository)."""
+        return self.file
+
+    def _lock_for(self, user_id: str, chat_id: Optional[str]):
+        return self._lock
+
+    def _load(self, key: Optional[str] = None) -> Dict[str, Any]:
+        return self._read(self._file_for(key), {})
 
-    def _save(self, data: Dict[str, Any]) -> None:
-        self.file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _save(self, data: Dict[str, Any], key: Optional[str] = None) -> None:
+        self._write(self._file_for(key), data)
 
+    @synchronized_key
     def append_event(self, user_id: str, chat_id: Optional[str], role: str, text: str, meta: Optional[Dict[str, Any]] = None, max_items: int = 100) -> None:
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         cur = data.get(k) or {}
         history: List[Dict[str, Any]] = list(cur.get("history") or [])
         history.append({
@@ -58,30 +65,34 @@ class ConversationRepository:
         cur["history"] = history
         cur["last_active"] = time.time()
         data[k] = cur
-        self._save(data)
+        self._save(data, k)
 
+    @synchronized_key
     def get_history(self, user_id: str, chat_id: Optional[str], limit: int = 20) -> List[Dict[str, Any]]:
-        d = self._load().get(self._key(user_id, chat_id)) or {}
+        k = self._key(user_id, chat_id)
+        d = self._load(k).get(k) or {}
         hist: List[Dict[str, Any]] = list(d.get("history") or [])
         if limit > 0:
             return hist[-limit:]
         return hist
 
+    @synchronized_key
     def clear_history(self, user_id: str, chat_id: Optional[str]) -> None:
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         cur = data.get(k) or {}
         cur["history"] = []
         data[k] = cur
-        self._save(data)
+        self._save(data, k)
 
+    @synchronized_key
     def set_topic(self, user_id: str, chat_id: Optional[str], name: str, topic_data: Optional[Dict[str, Any]] = None, ttl_days: Optional[int] = None) -> None:
         now = time.time()
         expires_at = None
         if isinstance(ttl_days, int) and ttl_days > 0:
             expires_at = now + ttl_days * 86400
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         cur = data.get(k) or {}
         cur["topic"] = {
             "name": name,
@@ -91,10 +102,12 @@ class ConversationRepository:
         }
         cur["last_active"] = now
         data[k] = cur
-        self._save(data)
+        self._save(data, k)
 
+    @synchronized_key
     def get_topic(self, user_id: str, chat_id: Optional[str]) -> Optional[Dict[str, Any]]:
-        cur = self._load().get(self._key(user_id, chat_id)) or {}
+        k = self._key(user_id, chat_id)
+        cur = self._load(k).get(k) or {}
         topic = cur.get("topic")
         if not topic:
             return None
@@ -105,11 +118,12 @@ class ConversationRepository:
             return None
         return topic
 
+    @synchronized_key
     def clear_topic(self, user_id: str, chat_id: Optional[str]) -> None:
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         cur = data.get(k) or {}
         if "topic" in cur:
             del cur["topic"]
         data[k] = cur
-        self._save(data)
+        self._save(data, k)
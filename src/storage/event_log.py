@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:  # bloqueo entre procesos (no disponible en Windows)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+from .locking import atomic_write_bytes, atomic_write_text, file_lock, synchronized
+
+READ_BLOCK = 8192
+# Marca de importación de conversations.json completada
+IMPORTED_MARKER = ".imported"
+
+
+class EventLogConversationRepository:
+    """ConversationRepository sobre un log append-only por conversación.
+
+    Cada conversación tiene su segmento `<dir>/<hash>.jsonl` con un evento por
+    línea; append_event escribe una sola línea con O_APPEND, así que el costo de
+    escribir no depende de cuántos usuarios haya. get_history(limit=N) lee el
+    archivo desde el final en bloques hasta tener N eventos.
+
+    El recorte a max_items es perezoso: cuando un segmento supera
+    max_items * compact_factor líneas se compacta (se reescribe con los últimos
+    max_items eventos y os.replace). Hasta entonces get_history(limit=0) puede
+    devolver más de max_items eventos. El tema abierto va aparte en
+    `<hash>.topic.json` (un archivo pequeño por conversación).
+    """
+
+    def __init__(self, data_dir: Path, dirname: str = "conversations_log", compact_factor: float = 2.0):
+        self.dir = Path(data_dir) / dirname
+        self.compact_factor = max(1.0, compact_factor)
+        self._lock = threading.RLock()
+        # Líneas por segmento desde que este proceso lo vio (se cuentan una vez)
+        self._lines: Dict[str, int] = {}
+        self.dir.mkdir(parents=True, exist_ok=True)
+        legacy = Path(data_dir) / "conversations.json"
+        marker = self.dir / IMPORTED_MARKER
+        if legacy.exists() and not marker.exists():
+            # Un solo proceso importa; los demás esperan el lock y ven la marca
+            with file_lock(legacy):
+                if not marker.exists():
+                    self.import_json(legacy)
+                    atomic_write_text(marker, json.dumps({"source": str(legacy), "ts": time.time()}))
+
+    @staticmethod
+    def _key(user_id: str, chat_id: Optional[str]) -> str:
+        return f"{chat_id or '-'}|{user_id or '-'}"
+
+    def _segment(self, user_id: str, chat_id: Optional[str]) -> Path:
+        digest = hashlib.sha1(self._key(user_id, chat_id).encode("utf-8")).hexdigest()[:20]
+        return self.dir / f"{digest}.jsonl"
+
+    # --- Escritura ------------------------------------------------------------
+
+    def _append_lines(self, path: Path, lines: List[bytes]) -> None:
+        """Agrega líneas con una sola write() en O_APPEND.
+
+        Con fcntl toma un lock compartido (la compactación toma el exclusivo) y
+        comprueba que el archivo abierto siga siendo el segmento vigente: si una
+        compactación lo reemplazó entre open y flock, reabre. Si el archivo no
+        termina en salto de línea (write interrumpida) se empieza con uno, para
+        que la línea rota no arrastre a la nueva.
+        """
+        data = b"".join(lines)
+        while True:
+            fd = os.open(str(path), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_SH)
+                    try:
+                        if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    data = b"\n" + data
+                os.write(fd, data)
+                return
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _line(event: Dict[str, Any]) -> bytes:
+        return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+    @synchronized
+    def append_event(self, user_id: str, chat_id: Optional[str], role: str, text: str, meta: Optional[Dict[str, Any]] = None, max_items: int = 100) -> None:
+        path = self._segment(user_id, chat_id)
+        self._append_lines(path, [self._line({"ts": time.time(), "role": role, "text": text, "meta": meta or {}})])
+        name = path.name
+        if name not in self._lines:
+            self._lines[name] = self._count_lines(path)
+        else:
+            self._lines[name] += 1
+        if max_items > 0 and self._lines[name] > max_items * self.compact_factor:
+            self._compact(path, max_items)
+
+    @staticmethod
+    def _count_lines(path: Path) -> int:
+        try:
+            with path.open("rb") as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def _exclusive(self, path: Path) -> Iterator[None]:
+        """Lock exclusivo (con fcntl) sobre el segmento vigente.
+
+        Igual que en _append_lines, si otro proceso reemplazó el archivo entre
+        open y flock se reabre: el lock sobre el inode viejo no excluiría a los
+        que ya escriben en el nuevo.
+        """
+        while True:
+            fd = os.open(str(path), os.O_RDONLY | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    try:
+                        if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                yield
+                return
+            finally:
+                os.close(fd)
+
+    def _compact(self, path: Path, max_items: int) -> None:
+        """Reescribe el segmento con sus últimos max_items eventos (temp + fsync + os.replace)."""
+        with self._exclusive(path):
+            tail = self._tail_lines(path, max_items)
+            atomic_write_bytes(path, b"".join(line + b"\n" for line in tail))
+            self._lines[path.name] = len(tail)
+
+    # --- Lectura --------------------------------------------------------------
+
+    @staticmethod
+    def _tail_lines(path: Path, limit: int) -> List[bytes]:
+        """Últimas `limit` líneas completas (todas si limit <= 0), leyendo desde el final."""
+        try:
+            f = path.open("rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            if limit <= 0:
+                return [ln for ln in f.read().split(b"\n") if ln.strip()]
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            buf = b""
+            while pos > 0:
+                step = min(READ_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+                # +1: la primera línea del buffer puede estar cortada
+                if buf.count(b"\n") > limit:
+                    break
+            lines = [ln for ln in buf.split(b"\n") if ln.strip()]
+            if pos > 0:
+                lines = lines[1:]
+            return lines[-limit:]
+
+    @staticmethod
+    def _parse(lines: List[bytes]) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for ln in lines:
+            try:
+                out.append(json.loads(ln))
+            except ValueError:
+                # Línea incompleta (p. ej. proceso interrumpido a mitad de write): se ignora
+                logging.warning("event_log: línea inválida ignorada")
+        return out
+
+    @synchronized
+    def get_history(self, user_id: str, chat_id: Optional[str], limit: int = 20) -> List[Dict[str, Any]]:
+        return self._parse(self._tail_lines(self._segment(user_id, chat_id), limit))
+
+    @synchronized
+    def clear_history(self, user_id: str, chat_id: Optional[str]) -> None:
+        path = self._segment(user_id, chat_id)
+        if path.exists():
+            with self._exclusive(path):
+                atomic_write_bytes(path, b"")
+        self._lines[path.name] = 0
+
+    # --- Tema abierto -----------------------------------------------------------
+
+    def _topic_file(self, user_id: str, chat_id: Optional[str]) -> Path:
+        return self._segment(user_id, chat_id).with_suffix(".topic.json")
+
+    @synchronized
+    def set_topic(self, user_id: str, chat_id: Optional[str], name: str, topic_data: Optional[Dict[str, Any]] = None, ttl_days: Optional[int] = None) -> None:
+        now = time.time()
+        expires_at = None
+        if isinstance(ttl_days, int) and ttl_days > 0:
+            expires_at = now + ttl_days * 86400
+        topic = {"name": name, "data": topic_data or {}, "ts": now, "expires_at": expires_at}
+        atomic_write_text(self._topic_file(user_id, chat_id), json.dumps(topic, ensure_ascii=False))
+
+    @synchronized
+    def get_topic(self, user_id: str, chat_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        try:
+            topic = json.loads(self._topic_file(user_id, chat_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if not topic:
+            return None
+        # si expiró, limpiarlo
+        exp = topic.get("expires_at")
+        if isinstance(exp, (int, float)) and exp > 0 and time.time() > float(exp):
+            self.clear_topic(user_id, chat_id)
+            return None
+        return topic
+
+    @synchronized
+    def clear_topic(self, user_id: str, chat_id: Optional[str]) -> None:
+        try:
+            self._topic_file(user_id, chat_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    # --- Migración --------------------------------------------------------------
+
+    @synchronized
+    def import_json(self, path: Path) -> int:
+        """Importa un conversations.json (historial y tema); devuelve cuántos eventos escribió.
+
+        Cada segmento se escribe completo y de forma atómica, y las conversaciones
+        que ya tienen segmento se saltan: una importación interrumpida se puede
+        repetir sin duplicar eventos ni pisar lo escrito después.
+        """
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except Exception:
+            logging.exception(f"event_log: no se pudo leer {path}")
+            return 0
+        count = 0
+        for key, cur in (data or {}).items():
+            if not isinstance(cur, dict):
+                continue
+            chat, _, user = key.partition("|")
+            chat_id = None if chat == "-" else chat
+            user_id = "" if user == "-" else user
+            segment = self._segment(user_id, chat_id)
+            if segment.exists():
+                continue
+            topic = cur.get("topic")
+            if topic:
+                atomic_write_text(self._topic_file(user_id, chat_id), json.dumps(topic, ensure_ascii=False))
+            # El segmento va al final: su existencia marca la conversación como importada
+            history = [h for h in cur.get("history") or [] if isinstance(h, dict)]
+            atomic_write_bytes(segment, b"".join(self._line(h) for h in history))
+            count += len(history)
+        logging.info(f"event_log: importados {count} eventos de {path}")
+        return count
+
+
+__all__ = ["EventLogConversationRepository"]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+try:  # locks entre procesos (no disponible en Windows: ahí solo quedan los locks de hilo)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Reintentos de un leer-modificar-escribir cuando otro proceso cambió el archivo
+RETRIES = 5
+
+Signature = Optional[Tuple[int, int, int]]
+
+
+class ConcurrentWriteError(RuntimeError):
+    """El archivo cambió entre la lectura y la escritura (otro proceso escribió)."""
+
+
+class CorruptStoreError(ValueError):
+    """El archivo JSON existe pero no se puede leer: no se sobreescribe con datos vacíos."""
+
+
+def file_signature(path: Path) -> Signature:
+    """(inode, mtime_ns, tamaño) del archivo, o None si no existe."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def read_json(path: Path, default: Any) -> Tuple[Any, Signature]:
+    """Lee un JSON y su firma. Vacío o inexistente -> default; inválido -> CorruptStoreError."""
+    sig = file_signature(path)
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return default, None
+    if not text.strip():
+        return default, sig
+    try:
+        return json.loads(text), sig
+    except ValueError as e:
+        logging.error(f"{path} no es JSON válido; no se modificará hasta repararlo")
+        raise CorruptStoreError(str(path)) from e
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Escribe en un temporal del mismo directorio, fsync y os.replace: nunca queda a medias."""
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """atomic_write_text para bytes (temporal único por escritura: mkstemp)."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def ensure_file(path: Path, text: str) -> None:
+    """Crea el archivo con `text` solo si no existe (O_EXCL: sin pisar lo que otro proceso creó)."""
+    try:
+        fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_json(path: Path, data: Any, expected: Signature = None, check: bool = False) -> None:
+    """atomic_write_text de `data`; con check=True falla si la firma ya no es `expected`."""
+    if check and file_signature(path) != expected:
+        raise ConcurrentWriteError(str(path))
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+_held = threading.local()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Lock exclusivo entre procesos (flock sobre `<archivo>.lock`), reentrante por hilo.
+
+    flock es por descriptor: volver a tomarlo desde el mismo hilo con otro open()
+    se bloquearía, así que las llamadas anidadas (get_topic -> clear_topic)
+    reutilizan el lock ya tomado.
+    """
+    if fcntl is None:
+        yield
+        return
+    key = str(path)
+    held = _held.__dict__.setdefault("paths", {})
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        held[key] = 1
+        yield
+    finally:
+        held.pop(key, None)
+        os.close(fd)
+
+
+class JsonFileMixin:
+    """_read/_write de los repositorios JSON con control optimista por archivo.
+
+    _read guarda la firma del archivo leído; _write solo reemplaza el archivo si
+    la firma sigue igual (si no, ConcurrentWriteError). Con fcntl el lock entre
+    procesos ya evita el conflicto; sin flock (Windows) el decorador reintenta el
+    método completo.
+    """
+
+    def _read(self, path: Path, default: Any) -> Any:
+        data, sig = read_json(path, default)
+        self._signatures()[str(path)] = sig
+        return data
+
+    def _write(self, path: Path, data: Any) -> None:
+        sigs = self._signatures()
+        key = str(path)
+        # Solo se compara contra la lectura de esta misma operación
+        write_json(path, data, sigs.get(key), check=key in sigs)
+        sigs.pop(key, None)
+
+    def _signatures(self) -> Dict[str, Signature]:
+        local = self.__dict__.get("_sig_local")
+        if local is None:
+            local = self.__dict__.setdefault("_sig_local", threading.local())
+        if not hasattr(local, "sigs"):
+            local.sigs = {}
+        return local.sigs
+
+
+def _locked_call(lock: Any, path: Path, method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Lock de hilo + lock de archivo; sin fcntl, reintento optimista del leer-modificar-escribir.
+
+    Con flock ningún otro proceso escribe el archivo mientras corre el método, así
+    que el reintento solo hace falta donde file_lock no bloquea (Windows).
+    """
+    with lock, file_lock(path):
+        if fcntl is not None:
+            return method(*args, **kwargs)
+        for attempt in range(RETRIES):
+            try:
+                return method(*args, **kwargs)
+            except ConcurrentWriteError:
+                if attempt == RETRIES - 1:
+                    raise
+                logging.warning(f"{path} cambió durante la escritura; reintento {attempt + 1}")
+
+
+def synchronized(method: F) -> F:
+    """Ejecuta el método con el lock del repositorio (`self._lock`, un RLock) tomado.
+
+    Los repositorios JSON leen y reescriben el archivo completo; con varios hilos
+    (process_message_async) dos escrituras simultáneas perderían cambios y una
+    lectura podría ver el archivo a medio escribir.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def synchronized_key(method: F) -> F:
+    """Como synchronized, pero con el lock de la clave (user_id, chat_id) del método.
+
+    Usa `self._lock_for(user_id, chat_id)`: en los repositorios de un solo archivo
+    es el lock del repositorio y en los particionados el de la partición. Además
+    toma el lock entre procesos del archivo de la clave y reintenta el método si
+    otro proceso escribió el archivo a la vez (ConcurrentWriteError).
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: Any, user_id: str, chat_id: Any, *args: Any, **kwargs: Any) -> Any:
+        path = self._file_for(self._key(user_id, chat_id))
+        return _locked_call(self._lock_for(user_id, chat_id), path, method, self, user_id, chat_id, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def synchronized_file(method: F) -> F:
+    """synchronized + lock entre procesos de `self.file` y reintento optimista."""
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        return _locked_call(self._lock, self.file, method, self, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
@@ -1,21 +1,24 @@
 from pathlib import Path
-import json
+import threading
 from typing import Optional
 
-class TicketRepository:
+from .locking import JsonFileMixin, ensure_file, synchronized_file
+
+class TicketRepository(JsonFileMixin):
     def __init__(self, data_dir: Path):
         self.dir = data_dir
+        self._lock = threading.RLock()
         self.dir.mkdir(parents=True, exist_ok=True)
         self.file = self.dir / "tickets.json"
-        if not self.file.exists():
-            self.file.write_text("[]", encoding="utf-8")
+        ensure_file(self.file, "[]")
 
     def _load(self):
-        return json.loads(self.file.read_text(encoding="utf-8"))
+        return self._read(self.file, [])
 
     def _save(self, data):
-        self.file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        self._write(self.file, data)
 
+    @synchronized_file
     def create(self, user_id: str, text: str) -> dict:
         data = self._load()
         ticket_id = len(data) + 1
@@ -24,6 +27,7 @@ class TicketRepository:
         self._save(data)
         return ticket
 
+    @synchronized_file
     def get(self, ticket_id: int) -> Optional[dict]:
         data = self._load()
         for t in data:
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .conversation_repository import ConversationRepository
+from .locking import atomic_write_text, file_lock
+from .state_repository import StateRepository
+
+META_FILE = "_shards.json"
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Partición de una clave "<chat>|<user>" (crc32: estable entre procesos y versiones)."""
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def _shard_name(index: int, shards: int) -> str:
+    return f"{index:0{max(2, len(str(shards - 1)))}d}.json"
+
+
+def read_shard_count(shard_dir: Path) -> Optional[int]:
+    try:
+        return int(json.loads((Path(shard_dir) / META_FILE).read_text(encoding="utf-8"))["shards"])
+    except FileNotFoundError:
+        return None
+
+
+class _ShardedMixin:
+    """Reparte las claves de un repositorio JSON en `shards` archivos de `shard_dir`.
+
+    Cada operación lee y reescribe solo la partición de su clave, con un lock
+    por partición: conversaciones de particiones distintas no se esperan entre
+    sí. El número de particiones queda en `_shards.json`; abrir el directorio
+    con otro número es un error (usar reshard() para cambiarlo).
+    """
+
+    def _init_shards(self, shard_dir: Path, shards: int) -> None:
+        if shards < 1:
+            raise ValueError("shards debe ser >= 1")
+        self.shard_dir = Path(shard_dir)
+        self.shards = shards
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        meta = self.shard_dir / META_FILE
+        # Lock entre procesos: dos workers que arrancan a la vez no escriben ambos el meta
+        with file_lock(meta):
+            current = read_shard_count(self.shard_dir)
+            if current is None:
+                atomic_write_text(meta, json.dumps({"shards": shards}))
+        if current is not None and current != shards:
+            raise ValueError(
+                f"{self.shard_dir} tiene {current} particiones y se pidieron {shards}; usa scripts/reshard_json.py"
+            )
+        self._shard_locks = [threading.RLock() for _ in range(shards)]
+
+    def _shard(self, key: Optional[str]) -> int:
+        if key is None:
+            raise KeyError("los repositorios particionados necesitan la clave")
+        return shard_of(key, self.shards)
+
+    def _file_for(self, key: Optional[str] = None) -> Path:
+        return self.shard_dir / _shard_name(self._shard(key), self.shards)
+
+    def _lock_for(self, user_id: str, chat_id: Optional[str]):
+        return self._shard_locks[self._shard(self._key(user_id, chat_id))]  # type: ignore[attr-defined]
+
+
+class ShardedStateRepository(_ShardedMixin, StateRepository):
+    """StateRepository particionado: `data/state/NN.json`."""
+
+    def __init__(self, data_dir: Path, shards: int = 16, dirname: str = "state"):
+        self.dir = Path(data_dir)
+        self._lock = threading.RLock()
+        self._init_shards(self.dir / dirname, shards)
+
+
+class ShardedConversationRepository(_ShardedMixin, ConversationRepository):
+    """ConversationRepository particionado: `data/conversations/NN.json`."""
+
+    def __init__(self, data_dir: Path, shards: int = 16, dirname: str = "conversations"):
+        self.dir = Path(data_dir)
+        self._lock = threading.RLock()
+        self._init_shards(self.dir / dirname, shards)
+
+
+# --- Reparticionado -------------------------------------------------------------
+
+KINDS = ("state", "conversations")
+
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} no es un objeto JSON")
+    return data
+
+
+def _iter_source(data_dir: Path, kind: str) -> Iterator[Tuple[str, Any]]:
+    """Entradas actuales de `kind`: del directorio particionado si existe, si no del archivo único."""
+    shard_dir = data_dir / kind
+    if read_shard_count(shard_dir) is not None:
+        for path in sorted(shard_dir.glob("*.json")):
+            if path.name != META_FILE:
+                yield from _read_json(path).items()
+    else:
+        yield from _read_json(data_dir / f"{kind}.json").items()
+
+
+def reshard(data_dir: Path, kind: str, shards: int) -> Dict[str, int]:
+    """Reparte los datos de `kind` ("state" o "conversations") en `shards` particiones.
+
+    Lee el archivo único (`state.json`) o el directorio particionado actual y
+    escribe el nuevo en un directorio temporal que luego reemplaza al anterior;
+    el archivo único no se borra. Toma el lock entre procesos de `<kind>.json`
+    (el mismo de las escrituras al archivo único), pero las escrituras a las
+    particiones no lo usan: ejecutar con el bot detenido.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind debe ser uno de {list(KINDS)}")
+    if shards < 1:
+        raise ValueError("shards debe ser >= 1")
+    data_dir = Path(data_dir)
+    with file_lock(data_dir / f"{kind}.json"):
+        buckets: List[Dict[str, Any]] = [{} for _ in range(shards)]
+        total = 0
+        for key, value in _iter_source(data_dir, kind):
+            buckets[shard_of(key, shards)][key] = value
+            total += 1
+        target = data_dir / kind
+        # Directorios temporales únicos: otra ejecución no borra el trabajo de esta
+        tmp = Path(tempfile.mkdtemp(dir=str(data_dir), prefix=f".{kind}.reshard."))
+        old = Path(tempfile.mkdtemp(dir=str(data_dir), prefix=f".{kind}.old."))
+        try:
+            for i, bucket in enumerate(buckets):
+                atomic_write_text(tmp / _shard_name(i, shards), json.dumps(bucket, ensure_ascii=False, indent=2))
+            atomic_write_text(tmp / META_FILE, json.dumps({"shards": shards}))
+            if target.exists():
+                os.replace(target, old / kind)
+            os.replace(tmp, target)
+        except BaseException:
+            if (old / kind).exists() and not target.exists():
+                os.replace(old / kind, target)
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        finally:
+            if not (old / kind).exists() or target.exists():
+                shutil.rmtree(old, ignore_errors=True)
+    return {"keys": total, "shards": shards}
+
+
+__all__ = ["ShardedConversationRepository", "ShardedStateRepository", "read_shard_count", "reshard", "shard_of"]
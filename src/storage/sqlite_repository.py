@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Adaptación a SQLite de las tablas de docs/sql/schema.sql que usa el bot. En vez
+# de UUIDs y end_users, las conversaciones se identifican por (chat_id, user_id),
+# igual que las claves "<chat>|<user>" de los repositorios JSON.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversation_state (
+    chat_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    name TEXT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS conversations (
+    chat_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    topic TEXT NULL,
+    last_active REAL NULL,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    content TEXT NOT NULL,
+    meta TEXT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conv ON messages (chat_id, user_id, id);
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NULL,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status);
+"""
+
+
+def _conv_key(user_id: str, chat_id: Optional[str]) -> Tuple[str, str]:
+    """(chat_id, user_id) normalizados como _key() de los repositorios JSON ("-" si vacío)."""
+    return (chat_id or "-", user_id or "-")
+
+
+class SqliteDatabase:
+    """Archivo SQLite compartido por los repositorios (una conexión por hilo).
+
+    Modo WAL: las lecturas no bloquean a la escritura y varios procesos (workers
+    de uvicorn) pueden usar el mismo archivo; synchronous=NORMAL basta con WAL.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+class SqliteStateRepository:
+    """StateRepository sobre la tabla conversation_state (misma interfaz)."""
+
+    def __init__(self, db: SqliteDatabase) -> None:
+        self.db = db
+
+    def get(self, user_id: str, chat_id: Optional[str]) -> Dict[str, Any]:
+        row = self.db.connect().execute(
+            "SELECT name, data FROM conversation_state WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id)
+        ).fetchone()
+        if row is None:
+            return {}
+        # update_field sobre un estado inexistente no tiene name (igual que en JSON)
+        state: Dict[str, Any] = {"name": row[0]} if row[0] is not None else {}
+        state["data"] = json.loads(row[1])
+        return state
+
+    def set(self, user_id: str, chat_id: Optional[str], name: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        with self.db.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_state (chat_id, user_id, name, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (*_conv_key(user_id, chat_id), name, json.dumps(payload or {}, ensure_ascii=False), time.time()),
+            )
+
+    def update_field(self, user_id: str, chat_id: Optional[str], field: str, value: Any) -> None:
+        with self.db.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT name, data FROM conversation_state WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id)
+            ).fetchone()
+            name, data = (row[0], json.loads(row[1])) if row else (None, {})
+            data[field] = value
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_state (chat_id, user_id, name, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (*_conv_key(user_id, chat_id), name, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+    def clear(self, user_id: str, chat_id: Optional[str]) -> None:
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM conversation_state WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id))
+
+
+class SqliteConversationRepository:
+    """ConversationRepository sobre messages + conversations (misma interfaz).
+
+    append_event inserta una fila y recorta lo que excede max_items de esa
+    conversación por índice: el costo no depende de cuántos usuarios haya.
+    """
+
+    def __init__(self, db: SqliteDatabase) -> None:
+        self.db = db
+
+    def append_event(self, user_id: str, chat_id: Optional[str], role: str, text: str, meta: Optional[Dict[str, Any]] = None, max_items: int = 100) -> None:
+        key = _conv_key(user_id, chat_id)
+        now = time.time()
+        with self.db.connect() as conn:
+            conn.execute(
+                "INSERT INTO messages (chat_id, user_id, sender, content, meta, sent_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, role, text, json.dumps(meta or {}, ensure_ascii=False), now),
+            )
+            if max_items > 0:
+                conn.execute(
+                    "DELETE FROM messages WHERE chat_id = ? AND user_id = ? AND id <= "
+                    "(SELECT id FROM messages WHERE chat_id = ? AND user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (*key, *key, max_items),
+                )
+            self._touch(conn, key, now)
+
+    @staticmethod
+    def _touch(conn: sqlite3.Connection, key: Tuple[str, str], now: float) -> None:
+        conn.execute(
+            "INSERT INTO conversations (chat_id, user_id, last_active) VALUES (?, ?, ?) "
+            "ON CONFLICT (chat_id, user_id) DO UPDATE SET last_active = excluded.last_active",
+            (*key, now),
+        )
+
+    def get_history(self, user_id: str, chat_id: Optional[str], limit: int = 20) -> List[Dict[str, Any]]:
+        sql = "SELECT sent_at, sender, content, meta FROM messages WHERE chat_id = ? AND user_id = ? ORDER BY id DESC"
+        params: Tuple[Any, ...] = _conv_key(user_id, chat_id)
+        if limit > 0:
+            sql += " LIMIT ?"
+            params += (limit,)
+        rows = self.db.connect().execute(sql, params).fetchall()
+        return [{"ts": ts, "role": role, "text": text, "meta": json.loads(meta or "{}")} for ts, role, text, meta in reversed(rows)]
+
+    def clear_history(self, user_id: str, chat_id: Optional[str]) -> None:
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM messages WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id))
+
+    def set_topic(self, user_id: str, chat_id: Optional[str], name: str, topic_data: Optional[Dict[str, Any]] = None, ttl_days: Optional[int] = None) -> None:
+        now = time.time()
+        expires_at = None
+        if isinstance(ttl_days, int) and ttl_days > 0:
+            expires_at = now + ttl_days * 86400
+        topic = {"name": name, "data": topic_data or {}, "ts": now, "expires_at": expires_at}
+        with self.db.connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (chat_id, user_id, topic, last_active) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (chat_id, user_id) DO UPDATE SET topic = excluded.topic, last_active = excluded.last_active",
+                (*_conv_key(user_id, chat_id), json.dumps(topic, ensure_ascii=False), now),
+            )
+
+    def get_topic(self, user_id: str, chat_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        row = self.db.connect().execute(
+            "SELECT topic FROM conversations WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        topic = json.loads(row[0])
+        # si expiró, limpiarlo
+        exp = topic.get("expires_at")
+        if isinstance(exp, (int, float)) and exp > 0 and time.time() > float(exp):
+            self.clear_topic(user_id, chat_id)
+            return None
+        return topic
+
+    def clear_topic(self, user_id: str, chat_id: Optional[str]) -> None:
+        with self.db.connect() as conn:
+            conn.execute("UPDATE conversations SET topic = NULL WHERE chat_id = ? AND user_id = ?", _conv_key(user_id, chat_id))
+
+
+class SqliteTicketRepository:
+    """TicketRepository sobre la tabla tickets (ids enteros autoincrementales)."""
+
+    def __init__(self, db: SqliteDatabase) -> None:
+        self.db = db
+
+    def create(self, user_id: str, text: str) -> dict:
+        with self.db.connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO tickets (user_id, description, status, created_at) VALUES (?, ?, 'open', ?)",
+                (user_id, text, time.time()),
+            )
+            ticket_id = cur.lastrowid
+        return {"id": ticket_id, "user_id": user_id, "text": text, "status": "open"}
+
+    def get(self, ticket_id: int) -> Optional[dict]:
+        row = self.db.connect().execute(
+            "SELECT id, user_id, description, status FROM tickets WHERE id = ?", (ticket_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "user_id": row[1], "text": row[2], "status": row[3]}
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return default
+    except Exception:
+        logging.exception(f"migración: no se pudo leer {path}")
+        return default
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    chat, _, user = key.partition("|")
+    return (chat or "-", user or "-")
+
+
+def migrate_json(data_dir: Path, db: SqliteDatabase, force: bool = False) -> Dict[str, int]:
+    """Importa state.json, conversations.json y tickets.json de data_dir a la base.
+
+    Se ejecuta una sola vez (marca `json_migrated` en meta) salvo con force=True;
+    los archivos JSON no se modifican. Devuelve cuántas filas importó por tabla.
+    La comprobación de la marca, la importación y la marca van en una sola
+    transacción BEGIN IMMEDIATE: si dos procesos abren la base a la vez, el
+    segundo espera y ve la marca del primero (sin duplicar el historial).
+    """
+    counts = {"state": 0, "messages": 0, "conversations": 0, "tickets": 0}
+    if db.get_meta("json_migrated") and not force:
+        return counts
+    data_dir = Path(data_dir)
+    with db.connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if not force and conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return counts
+        state = _read_json(data_dir / "state.json", {})
+        conversations = _read_json(data_dir / "conversations.json", {})
+        tickets = _read_json(data_dir / "tickets.json", [])
+        now = time.time()
+        for key, st in (state or {}).items():
+            if not isinstance(st, dict):
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_state (chat_id, user_id, name, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (*_split_key(key), st.get("name"), json.dumps(st.get("data") or {}, ensure_ascii=False), now),
+            )
+            counts["state"] += 1
+        for key, cur in (conversations or {}).items():
+            if not isinstance(cur, dict):
+                continue
+            ck = _split_key(key)
+            if force:
+                conn.execute("DELETE FROM messages WHERE chat_id = ? AND user_id = ?", ck)
+            for ev in cur.get("history") or []:
+                conn.execute(
+                    "INSERT INTO messages (chat_id, user_id, sender, content, meta, sent_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (*ck, ev.get("role") or "", ev.get("text") or "", json.dumps(ev.get("meta") or {}, ensure_ascii=False), float(ev.get("ts") or now)),
+                )
+                counts["messages"] += 1
+            topic = cur.get("topic")
+            conn.execute(
+                "INSERT OR REPLACE INTO conversations (chat_id, user_id, topic, last_active) VALUES (?, ?, ?, ?)",
+                (*ck, json.dumps(topic, ensure_ascii=False) if topic else None, cur.get("last_active")),
+            )
+            counts["conversations"] += 1
+        for t in tickets or []:
+            if not isinstance(t, dict) or t.get("id") is None:
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO tickets (id, user_id, description, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (int(t["id"]), t.get("user_id"), t.get("text") or "", t.get("status") or "open", now),
+            )
+            counts["tickets"] += 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),))
+    logging.info(f"migración JSON -> SQLite ({db.path}): {counts}")
+    return counts
+
+
+__all__ = [
+    "SqliteConversationRepository",
+    "SqliteDatabase",
+    "SqliteStateRepository",
+    "SqliteTicketRepository",
+    "migrate_json",
+]
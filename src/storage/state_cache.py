@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import copy
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from .locking import file_lock, read_json, write_json
+from .state_repository import StateRepository
+
+
+class CachedStateRepository(StateRepository):
+    """StateRepository con caché write-back en memoria.
+
+    state.json se lee una vez; get/set/update_field/clear trabajan sobre el dict
+    en memoria y marcan la clave como sucia. Cada flush toma el lock entre
+    procesos de state.json, lo relee, aplica encima solo las claves sucias y lo
+    reescribe (temp + fsync + os.replace, nunca queda un archivo truncado); las
+    claves no sucias de la caché se refrescan con lo leído. Se hace flush cuando:
+    - hay `max_dirty` claves sucias (se guarda en el mismo hilo que escribió), o
+    - pasaron `flush_interval` segundos (hilo de fondo), o
+    - se llama a flush() (apagado: lifespan de FastAPI, fin del polling, atexit).
+
+    Compromiso durabilidad/latencia: ante una caída se pierden como mucho los
+    cambios de los últimos flush_interval segundos (y menos de max_dirty claves).
+    flush_interval <= 0 desactiva el hilo; max_dirty <= 1 equivale a escribir en
+    cada cambio. Con varios procesos no se pisan los cambios de los demás, pero
+    cada uno lee su copia en memoria: una clave escrita por otro proceso se ve
+    aquí tras el siguiente flush (hasta flush_interval segundos de retraso).
+    """
+
+    def __init__(self, data_dir: Path, flush_interval: float = 2.0, max_dirty: int = 100):
+        super().__init__(data_dir)
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self._data: Dict[str, Any] = self._load()
+        self._dirty: Set[str] = set()
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+        self.flush_last = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="state-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("state cache: error en flush periódico")
+
+    def _mark(self, key: str) -> bool:
+        """Marca la clave como sucia (con self._lock tomado); True si toca hacer flush."""
+        self._dirty.add(key)
+        return len(self._dirty) >= self.max_dirty
+
+    def get(self, user_id: str, chat_id: Optional[str]) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._data.get(self._key(user_id, chat_id), {}) or {})
+
+    def set(self, user_id: str, chat_id: Optional[str], name: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        k = self._key(user_id, chat_id)
+        with self._lock:
+            self._data[k] = {"name": name, "data": copy.deepcopy(payload or {})}
+            full = self._mark(k)
+        # flush fuera de self._lock: el hilo de fondo toma _flush_lock y luego self._lock
+        if full:
+            self.flush()
+
+    def update_field(self, user_id: str, chat_id: Optional[str], field: str, value: Any) -> None:
+        k = self._key(user_id, chat_id)
+        with self._lock:
+            cur = self._data.get(k) or {}
+            cur["data"] = {**(cur.get("data") or {}), field: copy.deepcopy(value)}
+            self._data[k] = cur
+            full = self._mark(k)
+        if full:
+            self.flush()
+
+    def clear(self, user_id: str, chat_id: Optional[str]) -> None:
+        k = self._key(user_id, chat_id)
+        with self._lock:
+            full = k in self._data and self._mark(k)
+            self._data.pop(k, None)
+        if full:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Persiste las claves sucias sobre lo que hay en disco; devuelve si escribió."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                dirty, self._dirty = self._dirty, set()
+                # None = clave borrada con clear()
+                changes = {k: copy.deepcopy(self._data.get(k)) for k in dirty}
+            start = time.perf_counter()
+            try:
+                with file_lock(self.file):
+                    data, _ = read_json(self.file, {})
+                    for k, value in changes.items():
+                        if value is None:
+                            data.pop(k, None)
+                        else:
+                            data[k] = value
+                    write_json(self.file, data)
+            except Exception:
+                # Siguen sucias: el próximo flush lo reintenta
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            with self._lock:
+                # Lo que otros procesos escribieron en claves que aquí no cambiaron
+                for k in set(self._data) | set(data):
+                    if k not in self._dirty:
+                        if k in data:
+                            self._data[k] = data[k]
+                        else:
+                            self._data.pop(k, None)
+            elapsed = time.perf_counter() - start
+            self.flushes += 1
+            self.flush_total += elapsed
+            self.flush_max = max(self.flush_max, elapsed)
+            self.flush_last = elapsed
+            return True
+
+    def close(self) -> None:
+        """Detiene el hilo de fondo y hace el último flush."""
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._data),
+                "dirty": len(self._dirty),
+                "flush_interval": self.flush_interval,
+                "max_dirty": self.max_dirty,
+                "flushes": self.flushes,
+                "flush_last_ms": self.flush_last * 1000,
+                "flush_max_ms": self.flush_max * 1000,
+                "flush_avg_ms": (self.flush_total / self.flushes * 1000) if self.flushes else 0.0,
+            }
+
+
+__all__ = ["CachedStateRepository"]
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from pathlib import Path
-import json
+import copy
+import threading
 from typing import Optional, Dict, Any
 
+from .locking import JsonFileMixin, ensure_file, synchronized_key
 
-class StateRepository:
+
+class StateRepository(JsonFileMixin):
     """Almacena el estado de conversación por usuario y chat.
 
     Persistencia simple en archivo JSON: {"<chat_id>|<user_id>": {"name": str, "data": dict}}
@@ -13,50 +16,111 @@ class StateRepository:
 
     def __init__(self, data_dir: Path):
         self.dir = data_dir
+        self._lock = threading.RLock()
         self.dir.mkdir(parents=True, exist_ok=True)
         self.file = self.dir / "state.json"
-        if not self.file.exists():
-            self.file.write_text("{}", encoding="utf-8")
+        ensure_file(self.file, "{}")
+
+    def _file_for(self, key: Optional[str] = None) -> Path:
+        """Archivo que guarda la clave (uno solo aquí; ver ShardedStateRepository)."""
+        return self.file
+
+    def _lock_for(self, user_id: str, chat_id: Optional[str]):
+        return self._lock
 
-    def _load(self) -> Dict[str, Any]:
-        try:
-            return json.loads(self.file.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
+    def _load(self, key: Optional[str] = None) -> Dict[str, Any]:
+        return self._read(self._file_for(key), {})
 
-    def _save(self, data: Dict[str, Any]) -> None:
-        self.file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _save(self, data: Dict[str, Any], key: Optional[str] = None) -> None:
+        self._write(self._file_for(key), data)
 
     @staticmethod
     def _key(user_id: str, chat_id: Optional[str]) -> str:
         return f"{chat_id or '-'}|{user_id or '-'}"
 
+    @synchronized_key
     def get(self, user_id: str, chat_id: Optional[str]) -> Dict[str, Any]:
-        data = self._load()
-        return data.get(self._key(user_id, chat_id), {}) or {}
+        k = self._key(user_id, chat_id)
+        return self._load(k).get(k, {}) or {}
 
+    @synchronized_key
     def set(self, user_id: str, chat_id: Optional[str], name: str, payload: Optional[Dict[str, Any]] = None) -> None:
-        data = self._load()
-        data[self._key(user_id, chat_id)] = {"name": name, "data": payload or {}}
-        self._save(data)
+        k = self._key(user_id, chat_id)
+        data = self._load(k)
+        data[k] = {"name": name, "data": payload or {}}
+        self._save(data, k)
 
+    @synchronized_key
     def update_field(self, user_id: str, chat_id: Optional[str], field: str, value: Any) -> None:
         """Actualizar un campo dentro del objeto data para el estado del usuario.
 
         Útil para marcar flags como 'greet_shown'.
         """
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         cur = data.get(k) or {}
         cur_data = cur.get("data") or {}
         cur_data[field] = value
         cur["data"] = cur_data
         data[k] = cur
-        self._save(data)
+        self._save(data, k)
 
+    @synchronized_key
     def clear(self, user_id: str, chat_id: Optional[str]) -> None:
-        data = self._load()
         k = self._key(user_id, chat_id)
+        data = self._load(k)
         if k in data:
             del data[k]
-            self._save(data)
+            self._save(data, k)
+
+
+class BufferedState:
+    """Estado de una sola conversación leído una vez y escrito una vez.
+
+    Misma interfaz que StateRepository (get/set/update_field/clear) pero en
+    memoria: se usa en process_batch para que varios mensajes seguidos de una
+    conversación no relean y reescriban state.json cada uno. flush() persiste el
+    resultado final (solo si hubo cambios).
+    """
+
+    def __init__(self, repo: StateRepository, user_id: str, chat_id: Optional[str]):
+        self.repo = repo
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self._value: Dict[str, Any] = repo.get(user_id, chat_id)
+        self._dirty = False
+
+    def _check(self, user_id: str, chat_id: Optional[str]) -> None:
+        if StateRepository._key(user_id, chat_id) != StateRepository._key(self.user_id, self.chat_id):
+            raise KeyError("BufferedState solo guarda el estado de su conversación")
+
+    def get(self, user_id: str, chat_id: Optional[str]) -> Dict[str, Any]:
+        self._check(user_id, chat_id)
+        return copy.deepcopy(self._value)
+
+    def set(self, user_id: str, chat_id: Optional[str], name: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        self._check(user_id, chat_id)
+        self._value = {"name": name, "data": copy.deepcopy(payload or {})}
+        self._dirty = True
+
+    def update_field(self, user_id: str, chat_id: Optional[str], field: str, value: Any) -> None:
+        self._check(user_id, chat_id)
+        cur = dict(self._value)
+        cur["data"] = {**(cur.get("data") or {}), field: copy.deepcopy(value)}
+        self._value = cur
+        self._dirty = True
+
+    def clear(self, user_id: str, chat_id: Optional[str]) -> None:
+        self._check(user_id, chat_id)
+        if self._value:
+            self._value = {}
+            self._dirty = True
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        if self._value:
+            self.repo.set(self.user_id, self.chat_id, self._value.get("name") or "", self._value.get("data") or {})
+        else:
+            self.repo.clear(self.user_id, self.chat_id)
+        self._dirty = False
@@ -0,0 +1,128 @@
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """Autómata Aho–Corasick para "¿aparece alguna keyword dentro del texto?".
+
+    Se construye una vez con la lista de keywords y recorre el mensaje en una sola
+    pasada, independientemente de cuántas keywords haya (miles incluidas). Los
+    índices devueltos son posiciones en `patterns`, así que "la primera keyword de la
+    lista contenida en el texto" es `first(text)`.
+
+    No normaliza: quien lo construye decide (p.ej. keywords en minúsculas y texto en
+    minúsculas). Una keyword vacía coincide con cualquier texto, como `"" in text`.
+
+    Con pocas keywords (< LINEAR_MAX) any()/first() usan `in` de CPython, que en C es
+    más rápido que recorrer el autómata en Python; el resultado es el mismo.
+    """
+
+    LINEAR_MAX = 64
+
+    def __init__(self, patterns: Iterable[str], groups: Optional[List[int]] = None) -> None:
+        self.patterns: List[str] = list(patterns)
+        # Grupo de cada patrón (p.ej. índice de la opción de menú a la que pertenece)
+        self.groups = groups if groups is not None else list(range(len(self.patterns)))
+        self._joined = "\x00".join(self.patterns)
+        self._empty = [i for i, p in enumerate(self.patterns) if not p]
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for idx, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    out.append([])
+                    goto[state][ch] = nxt
+                state = nxt
+            out[state].append(idx)
+
+        # Enlaces de fallo por BFS; cada estado hereda las salidas de su enlace de fallo
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out: List[Tuple[int, ...]] = [tuple(sorted(o)) for o in out]
+
+    @classmethod
+    def from_groups(cls, groups: Iterable[Optional[Iterable[Any]]], lower: bool = True) -> "KeywordMatcher":
+        """Un solo autómata para varias listas; first_group() da la primera lista con coincidencia."""
+        patterns: List[str] = []
+        owners: List[int] = []
+        for g, words in enumerate(groups):
+            for w in words or []:
+                if isinstance(w, str):
+                    patterns.append(w.lower() if lower else w)
+                    owners.append(g)
+        return cls(patterns, owners)
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield i, out[state]
+
+    def search(self, text: str) -> List[Tuple[int, int]]:
+        """Todas las coincidencias como (inicio, índice del patrón), en orden de aparición."""
+        found = [(0, idx) for idx in self._empty]
+        for end, ids in self._scan(text):
+            found += [(end - len(self.patterns[idx]) + 1, idx) for idx in ids]
+        return found
+
+    def any(self, text: str) -> bool:
+        if len(self.patterns) < self.LINEAR_MAX:
+            return any(p in text for p in self.patterns)
+        if self._empty:
+            return True
+        for _ in self._scan(text):
+            return True
+        return False
+
+    def first(self, text: str) -> Optional[int]:
+        """Menor índice de patrón contenido en el texto (None si ninguno)."""
+        if len(self.patterns) < self.LINEAR_MAX:
+            return next((i for i, p in enumerate(self.patterns) if p in text), None)
+        if self._empty:
+            return self._empty[0]
+        best: Optional[int] = None
+        for _, ids in self._scan(text):
+            if best is None or ids[0] < best:
+                best = ids[0]
+                if best == 0:
+                    break
+        return best
+
+    def first_group(self, text: str) -> Optional[int]:
+        idx = self.first(text)
+        return None if idx is None else self.groups[idx]
+
+    def any_contains(self, text: str) -> bool:
+        """True si el texto aparece dentro de alguna keyword (dirección inversa a any())."""
+        if not self.patterns:
+            return False
+        if "\x00" in text:
+            return any(text in p for p in self.patterns)
+        return text in self._joined
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+__all__ = ["KeywordMatcher"]
@@ -1,7 +1,44 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # Asegura que el directorio raíz esté en sys.path (para importar 'src.*')
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def isolated_manager(monkeypatch):
+    """Fábrica: devuelve el módulo manager con sus repositorios en `data_dir`.
+
+    No recarga módulos: parchea settings.data_dir y los repositorios globales
+    (manager._state/_conv, ticket._repo) con monkeypatch y vacía el registro y la
+    caché NLU al empezar y al terminar, para no dejar rutas temporales ni escribir
+    en data/ del repositorio.
+    """
+    from src.app.config import settings
+    from src.bot_core import manager
+    from src.handlers import ticket
+    from src.nlu.cache import classification_cache
+    from src.nlu.registry import registry
+    from src.storage import backends
+
+    monkeypatch.setattr(backends, "_caches", [])
+
+    def make(data_dir):
+        data_dir = Path(data_dir)
+        monkeypatch.setattr(settings, "data_dir", str(data_dir))
+        monkeypatch.setattr(manager, "_state", backends.state_repository(data_dir))
+        monkeypatch.setattr(manager, "_conv", backends.conversation_repository(data_dir))
+        monkeypatch.setattr(ticket, "_repo", backends.ticket_repository(data_dir))
+        registry.clear()
+        classification_cache.clear()
+        return manager
+
+    yield make
+    for repo in backends._caches:
+        repo.close()
+    registry.clear()
+    classification_cache.clear()
@@ -0,0 +1,47 @@
+import random
+
+from src.utils.aho_corasick import KeywordMatcher
+
+
+def _automaton(patterns, groups=None):
+    m = KeywordMatcher(patterns, groups)
+    m.LINEAR_MAX = 0  # forzar el recorrido del autómata también con pocas keywords
+    return m
+
+
+def test_matches_equal_brute_force():
+    rnd = random.Random(3)
+    for _ in range(200):
+        patterns = ["".join(rnd.choice("abc ") for _ in range(rnd.randint(1, 4))) for _ in range(rnd.randint(1, 12))]
+        text = "".join(rnd.choice("abcd ") for _ in range(rnd.randint(0, 20)))
+        m = _automaton(patterns)
+        expected = sorted((i, idx) for idx, p in enumerate(patterns) for i in range(len(text)) if text.startswith(p, i))
+        assert sorted(m.search(text)) == expected
+        assert m.any(text) == any(p in text for p in patterns)
+        assert m.first(text) == next((i for i, p in enumerate(patterns) if p in text), None)
+        assert KeywordMatcher(patterns).first(text) == m.first(text)
+
+
+def test_overlapping_and_nested_keywords():
+    m = _automaton(["he", "she", "his", "hers"])
+    assert sorted(m.search("ushers")) == [(1, 1), (2, 0), (2, 3)]
+    assert m.first("ushers") == 0
+    assert not m.any("xyz")
+
+
+def test_groups_return_first_matching_group():
+    m = KeywordMatcher.from_groups([["Productos", "1"], None, ["faq", "precios"], ["ver precios"]])
+    m.LINEAR_MAX = 0
+    assert m.first_group("quiero ver precios") == 2
+    assert m.first_group("1") == 0
+    assert m.first_group("nada") is None
+
+
+def test_empty_keyword_and_reverse_containment():
+    assert _automaton(["xyz", ""]).first("abc") == 1
+    m = KeywordMatcher(["ver catálogo", "productos"])
+    assert m.any("quiero ver catálogo")
+    assert m.any_contains("catálogo")
+    assert not m.any_contains("precios")
+    assert not KeywordMatcher([]).any_contains("")
+
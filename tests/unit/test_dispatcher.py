@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+from src.bot_core.dispatcher import ConversationDispatcher
+
+
+def test_same_conversation_runs_in_order_one_at_a_time():
+    d = ConversationDispatcher(max_workers=4, burst=2)
+    seen = []
+    busy = set()
+
+    def work(key, i):
+        assert key not in busy  # nunca dos mensajes de la misma conversación a la vez
+        busy.add(key)
+        time.sleep(0.002)
+        seen.append((key, i))
+        busy.discard(key)
+        return i
+
+    futs = [d.submit(k, work, k, i) for i in range(10) for k in ("a", "b", "c")]
+    assert [f.result(timeout=5) for f in futs] == [i for i in range(10) for _ in range(3)]
+    for k in ("a", "b", "c"):
+        assert [i for key, i in seen if key == k] == list(range(10))
+    stats = d.stats()
+    assert stats["processed"] == 30 and stats["pending"] == 0 and stats["max_depth"] >= 2
+
+
+def test_different_conversations_run_concurrently():
+    d = ConversationDispatcher(max_workers=2)
+    barrier = threading.Barrier(2, timeout=2)
+    # Si se serializaran, el primero esperaría en la barrera para siempre (BrokenBarrierError)
+    futs = [d.submit(k, barrier.wait) for k in ("a", "b")]
+    assert sorted(f.result(timeout=5) for f in futs) == [0, 1]
+
+
+def test_errors_propagate_and_mailbox_keeps_going():
+    d = ConversationDispatcher(max_workers=1)
+
+    def boom():
+        raise ValueError("x")
+
+    async def run():
+        try:
+            await d.run("a", boom)
+        except ValueError:
+            pass
+        return await d.run("a", lambda: "ok")
+
+    assert asyncio.run(run()) == "ok"
+    assert d.stats()["errors"] == 1
+
+
+def test_idle_mailboxes_are_evicted():
+    d = ConversationDispatcher(max_workers=1, idle_seconds=0.01)
+    d.submit("a", lambda: 1).result(timeout=5)
+    time.sleep(0.05)
+    d.submit("b", lambda: 2).result(timeout=5)
+    stats = d.stats()
+    assert stats["evictions"] == 1 and stats["mailboxes"] == 1
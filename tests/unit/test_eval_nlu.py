@@ -0,0 +1,24 @@
+import json
+import os
+import runpy
+
+
+def test_eval_nlu_writes_json_report(tmp_path):
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    script = runpy.run_path(os.path.join(repo_root, "scripts", "eval_nlu.py"))
+
+    extra = tmp_path / "extra.jsonl"
+    extra.write_text(json.dumps({"text": "necesito un asesor", "intent": "hablar_agente"}) + "\n", encoding="utf-8")
+    out = tmp_path / "report.json"
+    script["main"](["--folds", "3", "--providers", "simple,ml", "--data", str(extra), "--out", str(out)])
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["config"]["folds"] == 3
+    for provider in ("simple", "ml"):
+        res = report["providers"][provider]
+        assert res["examples"] == report["config"]["examples"]
+        assert 0.0 <= res["accuracy"] <= 1.0
+        assert set(res["latency_ms"]) == {"p50", "p95", "p99"}
+        assert res["throughput_msgs_per_s"] > 0
+        assert "hablar_agente" in res["per_intent"]
+        assert sum(sum(row.values()) for row in res["confusion"].values()) == res["examples"]
@@ -0,0 +1,83 @@
+import time
+
+from src.storage.conversation_repository import ConversationRepository
+from src.storage.event_log import EventLogConversationRepository
+
+
+def _texts(hist):
+    return [h["text"] for h in hist]
+
+
+def test_append_and_tail_reads(tmp_path):
+    repo = EventLogConversationRepository(tmp_path)
+    for i in range(500):
+        repo.append_event("u1", "c", role="user", text=f"mensaje largo número {i} " * 3, meta={"i": i}, max_items=1000)
+    repo.append_event("u2", None, role="bot", text="hola")
+    hist = repo.get_history("u1", "c", limit=20)
+    assert [h["meta"]["i"] for h in hist] == list(range(480, 500))
+    assert len(repo.get_history("u1", "c", limit=0)) == 500
+    assert _texts(repo.get_history("u2", None)) == ["hola"]
+    assert repo.get_history("nadie", "c") == []
+
+
+def test_writes_touch_only_the_conversation_segment(tmp_path):
+    repo = EventLogConversationRepository(tmp_path)
+    repo.append_event("u1", "c", role="user", text="a")
+    other = repo._segment("u1", "c")
+    before = other.stat().st_mtime_ns
+    time.sleep(0.01)
+    repo.append_event("u2", "c", role="user", text="b")
+    assert other.stat().st_mtime_ns == before
+
+
+def test_lazy_compaction_keeps_last_events(tmp_path):
+    repo = EventLogConversationRepository(tmp_path, compact_factor=2)
+    for i in range(10):
+        repo.append_event("u", "c", role="user", text=str(i), max_items=3)
+    # Compacta al superar 6 líneas: quedan entre 3 y 6, siempre las últimas
+    kept = _texts(repo.get_history("u", "c", limit=0))
+    assert 3 <= len(kept) <= 6 and kept == [str(i) for i in range(10 - len(kept), 10)]
+    assert not list(repo.dir.glob("*.tmp"))
+    # Un proceso nuevo sigue contando desde lo que hay en disco
+    again = EventLogConversationRepository(tmp_path, compact_factor=2)
+    again.append_event("u", "c", role="user", text="10", max_items=3)
+    assert _texts(again.get_history("u", "c", limit=2)) == ["9", "10"]
+
+
+def test_topic_clear_and_corrupt_line(tmp_path):
+    repo = EventLogConversationRepository(tmp_path)
+    repo.append_event("u", "c", role="user", text="a")
+    repo.set_topic("u", "c", "pedido", {"id": 1}, ttl_days=1)
+    assert repo.get_topic("u", "c")["data"] == {"id": 1}
+    repo.clear_topic("u", "c")
+    assert repo.get_topic("u", "c") is None
+    with repo._segment("u", "c").open("ab") as f:
+        f.write(b'{"ts": 1, "role": "us')
+    repo.append_event("u", "c", role="user", text="b")
+    assert _texts(repo.get_history("u", "c")) == ["a", "b"]
+    repo.clear_history("u", "c")
+    assert repo.get_history("u", "c") == []
+
+
+def test_imports_existing_conversations_json(tmp_path):
+    legacy = ConversationRepository(tmp_path)
+    legacy.append_event("u", "c", role="user", text="viejo")
+    legacy.set_topic("u", None, "pedido")
+    repo = EventLogConversationRepository(tmp_path)
+    assert _texts(repo.get_history("u", "c")) == ["viejo"]
+    assert repo.get_topic("u", None)["name"] == "pedido"
+
+
+def test_interrupted_import_resumes_without_duplicates(tmp_path):
+    legacy = ConversationRepository(tmp_path)
+    legacy.append_event("u1", "c", role="user", text="uno")
+    legacy.append_event("u2", "c", role="user", text="dos")
+    repo = EventLogConversationRepository(tmp_path)
+    # Simula una caída a mitad de la importación: sin marca y con un segmento perdido
+    (repo.dir / ".imported").unlink()
+    repo._segment("u2", "c").unlink()
+    repo.append_event("u1", "c", role="user", text="después")
+    again = EventLogConversationRepository(tmp_path)
+    assert _texts(again.get_history("u1", "c")) == ["uno", "después"]
+    assert _texts(again.get_history("u2", "c")) == ["dos"]
+    assert (again.dir / ".imported").exists()
@@ -0,0 +1,47 @@
+from src.handlers.faq import FaqIndex, _normalize, get_faq_index
+from src.handlers.faq_bm25 import Bm25FaqIndex, _terms
+
+RULES = {
+    "features": {"faq": {"engine": "bm25", "match_threshold": 0.5}},
+    "faq": [
+        {"q": "horario de atencion", "keywords": ["horas", "abren"], "a": "De 9 a 18"},
+        {"q": "metodos de pago", "keywords": ["tarjeta", "transferencia"], "a": "Tarjeta o transferencia"},
+        {"q": "envios", "keywords": ["despacho a domicilio"], "a": "Enviamos a todo el país"},
+        {"q": "devoluciones", "keywords": ["reembolso", "garantia"], "a": "Tienes 30 días"},
+    ],
+}
+
+
+def test_terms_normalize_accents_and_plural():
+    assert _terms("¿Métodos de PAGO?") == ["metodo", "de", "pago"]
+    assert _terms("a y envíos") == ["envio"]
+
+
+def test_engine_dispatch_and_compiled_once():
+    index = get_faq_index(RULES)
+    assert isinstance(index, Bm25FaqIndex)
+    assert get_faq_index(RULES) is index
+    assert isinstance(get_faq_index({"faq": RULES["faq"]}), FaqIndex)
+
+
+def test_ranking_threshold_and_unknown_terms():
+    index = Bm25FaqIndex(RULES)
+    assert index.match(_normalize("quisiera saber los métodos de pago"), 0.5) == "Tarjeta o transferencia"
+    assert index.match(_normalize("hacen despacho a domicilio?"), 0.5) == "Enviamos a todo el país"
+    assert index.match(_normalize("a qué hora abren"), 0.5) == "De 9 a 18"
+    # Sin términos conocidos no hay candidatos
+    assert index.scores(_normalize("zzz qwerty")) == {}
+    assert index.match(_normalize("zzz"), 0.0) is None
+    # Puntajes normalizados a 0..1 y match_threshold respetado
+    scores = index.scores(_normalize("devoluciones reembolso garantia"))
+    assert all(0.0 < s <= 1.0 for s in scores.values())
+    assert index.match(_normalize("devoluciones"), 1.01) is None
+
+
+def test_typo_correction_edit_distance_one():
+    index = Bm25FaqIndex(RULES)
+    assert index.match(_normalize("transferncia"), 0.5) == "Tarjeta o transferencia"
+    assert index.match(_normalize("rembolso"), 0.5) == "Tienes 30 días"
+    assert index.match(_normalize("garamtia"), 0.5) == "Tienes 30 días"
+    # Palabras cortas no se corrigen (evita "hola" -> "hora")
+    assert index._correct("hola") is None
@@ -0,0 +1,94 @@
+import random
+from difflib import SequenceMatcher
+
+from src.config.rules_loader import get_rules
+from src.handlers.faq import FaqIndex, _normalize, answer_faq, build_auto_capabilities, get_faq_index
+
+
+def _reference_answer(text, rules, threshold=0.75):
+    """Recorrido lineal original (sin índice) usado como referencia."""
+    t = _normalize(text)
+    if not t or len(t) <= 2:
+        return None
+    t_tokens = set(t.split())
+    cfg_threshold = rules.get("features", {}).get("faq", {}).get("match_threshold")
+    if isinstance(cfg_threshold, (int, float)):
+        threshold = float(cfg_threshold)
+    best_score = 0.0
+    best_answer = None
+    for item in rules.get("faq", []) or []:
+        keywords = [_normalize(item.get("q") or "")]
+        if isinstance(item.get("keywords"), list):
+            keywords += [_normalize(k) for k in item["keywords"] if isinstance(k, str)]
+        for kw in keywords:
+            if kw == t or kw in t:
+                ans = item.get("a") or None
+                if ans and "{auto}" in ans:
+                    ans = ans.replace("{auto}", build_auto_capabilities(rules))
+                return ans
+            ratio = SequenceMatcher(None, kw, t).ratio()
+            if ratio > best_score:
+                best_score, best_answer = ratio, item.get("a")
+            kw_tokens = set(kw.split())
+            overlap = sum(1 for k in kw_tokens if any(k == w or k in w or w in k for w in t_tokens))
+            score = overlap / max(1, len(kw_tokens))
+            if score > best_score:
+                best_score, best_answer = score, item.get("a")
+    if best_score >= threshold and best_answer:
+        if "{auto}" in best_answer:
+            best_answer = best_answer.replace("{auto}", build_auto_capabilities(rules))
+        return best_answer
+    return None
+
+
+def _inputs(rules, n=150):
+    seeds = []
+    for item in rules.get("faq") or []:
+        seeds.append(item.get("q") or "")
+        seeds += [k for k in item.get("keywords") or [] if isinstance(k, str)]
+        seeds += (item.get("a") or "").split()[:6]
+    rnd = random.Random(7)
+
+    def mutate(s):
+        chars = list(s)
+        for _ in range(rnd.randint(0, 3)):
+            if not chars:
+                break
+            i = rnd.randrange(len(chars))
+            chars[i:i + 1] = rnd.choice([[], [rnd.choice("aeiou ")], [chars[i], rnd.choice("aeiou")]])
+        return "".join(chars)
+
+    out = list(seeds) + ["", "ok", "no", "zzz", "¿?"]
+    for _ in range(n):
+        a, b = rnd.choice(seeds), rnd.choice(seeds)
+        out += [mutate(a), mutate(a) + " " + mutate(b), "quisiera saber " + mutate(a)]
+    return out
+
+
+def test_faq_index_matches_linear_scan_on_rules_faq():
+    rules = get_rules().get("default") or {}
+    assert rules.get("faq"), "rules.yaml debe tener FAQ"
+    for text in _inputs(rules):
+        assert answer_faq(text) == _reference_answer(text, rules), text
+
+
+def test_faq_index_compiled_once_per_rules_version():
+    rules = get_rules().get("default") or {}
+    index = get_faq_index(rules)
+    assert get_faq_index(rules) is index
+    assert get_faq_index(dict(rules)) is not index
+
+
+def test_faq_index_order_and_empty_answers():
+    rules = {
+        "faq": [
+            {"q": "horario", "a": ""},
+            {"q": "horario de atencion", "keywords": ["horas"], "a": "De 9 a 18"},
+            {"q": "envios", "keywords": ["despacho a domicilio"], "a": "Enviamos a todo el país"},
+        ]
+    }
+    index = FaqIndex(rules)
+    # La primera keyword incluida gana aunque su respuesta esté vacía
+    assert index.match(_normalize("horario de atencion?"), 0.75) is None
+    for text in ["horas", "despacho a domicilio por favor", "envio", "despachos a domicilo", "xyz"]:
+        assert index.match(_normalize(text), 0.75) == _reference_answer(text, rules)
@@ -0,0 +1,102 @@
+import json
+import os
+
+from src.handlers.faq import _normalize, get_faq_index
+from src.handlers.faq_store import ExternalFaqIndex, FaqStore, get_faq_store, read_faq_source
+
+
+def _write_jsonl(path, items):
+    path.write_text("\n".join(json.dumps(i, ensure_ascii=False) for i in items) + "\n", encoding="utf-8")
+    # mtime distinto aunque el test escriba dos veces en el mismo instante
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+ITEMS = [
+    {"id": "horario", "q": "horario de atención", "keywords": ["horas", "abren"], "a": "De 9 a 18"},
+    {"id": "pago", "q": "métodos de pago", "keywords": ["tarjeta", "transferencia"], "a": "Tarjeta o transferencia"},
+    {"id": "envios", "q": "envíos", "keywords": ["despacho a domicilio"], "a": "Enviamos a todo el país"},
+]
+
+
+def test_read_source_directory_jsonl_and_csv(tmp_path):
+    src = tmp_path / "faq"
+    src.mkdir()
+    _write_jsonl(src / "a.jsonl", ITEMS[:1])
+    (src / "b.csv").write_text("id,q,a,keywords\ndev,devoluciones,Tienes 30 días,reembolso|garantía\n", encoding="utf-8")
+    (src / "notas.txt").write_text("ignorado", encoding="utf-8")
+    entries = read_faq_source(src)
+    assert [e["id"] for e in entries] == ["horario", "dev"]
+    assert entries[1]["keywords"] == ["reembolso", "garantía"]
+
+
+def test_sync_reindexes_only_changed_entries(tmp_path):
+    src = tmp_path / "faq.jsonl"
+    _write_jsonl(src, ITEMS)
+    store = FaqStore(src, tmp_path / "idx.sqlite")
+    assert store.sync() == {"added": 3, "updated": 0, "removed": 0, "unchanged": 0}
+    # Sin cambios en disco no se vuelve a leer la fuente
+    assert store.sync() == {"added": 0, "updated": 0, "removed": 0, "unchanged": 3}
+
+    changed = [dict(ITEMS[0], a="De 8 a 20"), ITEMS[1], {"id": "dev", "q": "devoluciones", "a": "Tienes 30 días"}]
+    _write_jsonl(src, changed)
+    assert store.sync() == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+    assert len(store) == 3
+    assert [c[1] for c in store.candidates(_normalize("envios"))] == []
+    (entry_id, q, _, has_answer), = store.candidates(_normalize("horario"))
+    assert q == "horario de atención" and has_answer
+    assert store.answer(entry_id) == "De 8 a 20"
+
+    # Reabrir el índice existente no reindexa nada
+    store.close()
+    assert FaqStore(src, tmp_path / "idx.sqlite").sync()["unchanged"] == 3
+
+
+def test_external_index_answers_from_disk(tmp_path):
+    src = tmp_path / "faq.jsonl"
+    _write_jsonl(src, ITEMS + [{"q": "qué puedes hacer", "a": "{auto}"}])
+    rules = {
+        "features": {"faq": {"enabled": True, "source": str(src), "index_path": str(tmp_path / "idx.sqlite")}},
+        "faq": [{"q": "precios", "a": "Desde $10"}],
+    }
+    index = get_faq_index(rules)
+    assert isinstance(index, ExternalFaqIndex)
+    assert get_faq_index(rules) is index
+    # El índice se crea en segundo plano
+    index._sync_thread.join(5)
+    assert index.match(_normalize("¿Cuáles son los precios?"), 0.75) == "Desde $10"
+    assert index.match(_normalize("quisiera saber los métodos de pago"), 0.75) == "Tarjeta o transferencia"
+    assert index.match(_normalize("hacen despacho a domicilio?"), 0.75) == "Enviamos a todo el país"
+    assert index.match(_normalize("a que hora abren"), 0.75) == "De 9 a 18"
+    assert index.match(_normalize("xyz"), 0.75) is None
+    assert index.match(_normalize("que puedes hacer"), 0.75).startswith("Puedo responder preguntas frecuentes")
+
+    # Los cambios en la fuente se detectan sin recargar las reglas, en segundo
+    # plano: mientras se reindexa se sigue respondiendo con el índice anterior
+    _write_jsonl(src, [dict(ITEMS[0], a="De 8 a 20")])
+    index.check_interval = 0
+    with index.store._sync_lock:
+        assert index.match(_normalize("horario de atencion"), 0.75) == "De 9 a 18"
+    index._sync_thread.join(5)
+    index.check_interval = 60
+    assert index.match(_normalize("horario de atencion"), 0.75) == "De 8 a 20"
+    assert index.match(_normalize("transferencia"), 0.75) is None
+
+
+def test_index_defaults_to_data_dir_and_first_sync_does_not_block(tmp_path, monkeypatch):
+    from src.app.config import settings
+
+    monkeypatch.setattr(settings, "data_dir", str(tmp_path / "data"))
+    src = tmp_path / "faq.jsonl"
+    _write_jsonl(src, ITEMS)
+    store = get_faq_store(src, tmp_path / "data" / "faq_index.sqlite")
+    store.sync()
+    _write_jsonl(src, [dict(ITEMS[0], a="De 8 a 20")])
+    with store._sync_lock:
+        # Crear el índice (recarga de reglas) no espera a la sincronización y
+        # mientras tanto responde con el índice existente
+        index = ExternalFaqIndex({"features": {"faq": {"enabled": True, "source": str(src)}}})
+        assert index.store is store
+        assert index.match(_normalize("horario de atencion"), 0.75) == "De 9 a 18"
+    index._sync_thread.join(5)
+    assert index.match(_normalize("horario de atencion"), 0.75) == "De 8 a 20"
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import re
+
+TEXTS = ["hola", "1", "planes", "menu", "precios", "xyz"]
+
+
+def _no_ids(results):
+    return re.sub(r"\d+", "N", json.dumps(results, ensure_ascii=False))
+
+
+def _payload(user, text):
+    return {"text": text, "platform_user_id": user, "group_id": "async"}
+
+
+def test_async_matches_sync_with_concurrent_users(tmp_path, isolated_manager):
+    users = [f"u{i}" for i in range(8)]
+    m = isolated_manager(tmp_path / "sync")
+    bot = m.BotManager()
+    expected = {u: [bot.process_message(_payload(u, t)) for t in TEXTS] for u in users}
+
+    m = isolated_manager(tmp_path / "async")
+    bot = m.BotManager()
+
+    async def user_flow(u):
+        return [await bot.process_message_async(_payload(u, t)) for t in TEXTS]
+
+    async def run():
+        return await asyncio.gather(*(user_flow(u) for u in users))
+
+    got = dict(zip(users, asyncio.run(run())))
+    assert got == expected
+    # Ninguna escritura concurrente se perdió: cada usuario tiene todo su historial
+    for u in users:
+        texts = [h["text"] for h in m._conv.get_history(u, "async", limit=100) if h.get("role") == "user"]
+        assert texts == TEXTS
+
+
+def test_process_batch_matches_sequential_and_saves_state_once(tmp_path, monkeypatch, isolated_manager):
+    batch = [_payload(f"u{i % 3}", t) for t in ["hola", "1", "necesito soporte", "la app se cierra", "menu"] for i in range(3)]
+    m = isolated_manager(tmp_path / "seq")
+    bot = m.BotManager()
+    expected = [bot.process_message(p) for p in batch]
+    expected_state = json.loads(m._state.file.read_text(encoding="utf-8"))
+
+    m = isolated_manager(tmp_path / "batch")
+    saves = []
+    save = m._state._save
+    monkeypatch.setattr(m._state, "_save", lambda *args: (saves.append(1), save(*args)))
+    bot = m.BotManager()
+    # Los números de ticket dependen del orden entre usuarios, que corre en paralelo
+    assert _no_ids(bot.process_batch(batch)) == _no_ids(expected)
+    assert json.loads(m._state.file.read_text(encoding="utf-8")) == expected_state
+    # Como mucho una escritura de estado por conversación (3 usuarios)
+    assert len(saves) <= 3
+    assert asyncio.run(bot.process_batch_async([_payload("u9", "hola"), _payload("u9", "xyz")])) == [
+        bot.process_message(_payload("u8", "hola")),
+        bot.process_message(_payload("u8", "xyz")),
+    ]
+
+
+def test_nlu_settings_applied_once_per_rules_version(tmp_path, monkeypatch, isolated_manager):
+    m = isolated_manager(tmp_path)
+    monkeypatch.setattr(m, "_nlu_settings_plan", None)
+    calls = []
+    configure = m.nlu_registry.configure
+    monkeypatch.setattr(m.nlu_registry, "configure", lambda **kw: (calls.append(kw), configure(**kw)))
+    bot = m.BotManager()
+    for text in ["quiero ver el catálogo", "precios por favor", "xyz"]:
+        bot.process_message(_payload("u1", text))
+    assert len(calls) == 1
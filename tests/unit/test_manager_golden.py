@@ -0,0 +1,90 @@
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+import pytest
+
+from src.app import config as app_config
+from src.config.rules_loader import get_rules
+
+GOLDEN = Path(__file__).resolve().parents[1] / "fixtures" / "manager_replay.json"
+
+SCRIPTED = [
+    ("u1", ["/start", "1", "planes", "0", "menu", "2", "mi pedido no llega", "/historial"]),
+    ("u2", ["hola", "precios", "quiero ver el catálogo", "que bien", "quiero hablar con un agente", "xyz"]),
+    ("u3", ["ticket", "   ", "no puedo iniciar sesión", "gracias", "menu", "3", "volver"]),
+    ("u4", ["¿Qué puedes hacer?", "horario", "/ticket", "la app se cierra", "ok"]),
+]
+# Inactividad y reanudar tema: {"advance": segundos} adelanta el reloj antes del
+# mensaje y {"topic": nombre} deja un tema pendiente
+TIMED = [
+    {"user": "u5", "text": "necesito soporte"},
+    {"user": "u5", "text": "hola", "advance": 200},
+    {"user": "u5", "text": "hola", "advance": 200},
+    {"user": "u5", "text": "necesito soporte"},
+    {"user": "u5", "text": "hola", "advance": 90000},
+    {"user": "u6", "text": "hola"},
+    {"user": "u6", "text": "precios", "advance": 7200, "topic": "pedido"},
+    {"user": "u6", "text": "precios"},
+]
+
+
+def _generate_inputs():
+    """Conversaciones scriptadas + aleatorias con el vocabulario de rules (solo al regenerar)."""
+    rules = get_rules().get("default") or {}
+    words = []
+    for values in (rules.get("synonyms") or {}).values():
+        words += [w for w in values or [] if isinstance(w, str)]
+    for it in (rules.get("nlu") or {}).get("intents") or []:
+        words += [str(p) for p in it.get("patterns") or []]
+    for item in rules.get("faq") or []:
+        words += [item.get("q") or ""] + [k for k in item.get("keywords") or [] if isinstance(k, str)]
+    words += ["1", "2", "3", "0", "volver", "hola", "menu", "/start", "gracias", "xyz", "mi pedido no llega"]
+    rnd = random.Random(5)
+    inputs = [{"user": user, "text": text} for user, texts in SCRIPTED for text in texts] + [dict(r) for r in TIMED]
+    for _ in range(240):
+        text = rnd.choice(words)
+        if rnd.random() < 0.3:
+            text = "quisiera " + text + " por favor"
+        inputs.append({"user": f"r{rnd.randrange(12)}", "text": text})
+    return inputs
+
+
+def _replay(make_manager, tmp_path, monkeypatch, inputs, backend="json"):
+    if backend == "log":
+        monkeypatch.setattr(app_config.settings, "conversation_backend", backend)
+    elif backend == "shards":
+        monkeypatch.setattr(app_config.settings, "json_shards", 4)
+    elif backend == "state_cache":
+        monkeypatch.setattr(app_config.settings, "state_cache", True)
+    else:
+        monkeypatch.setattr(app_config.settings, "data_backend", backend)
+    m = make_manager(tmp_path)
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    bot = m.BotManager()
+    out = []
+    for row in inputs:
+        clock[0] += row.get("advance", 0) + 1
+        if row.get("topic"):
+            m._conv.set_topic(row["user"], "golden", row["topic"], ttl_days=14)
+        out.append(bot.process_message({"text": row["text"], "platform_user_id": row["user"], "group_id": "golden"}))
+    return out
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "log", "state_cache", "shards"])
+def test_responses_match_golden_replay(tmp_path, monkeypatch, isolated_manager, backend):
+    if os.environ.get("UPDATE_GOLDEN"):
+        inputs = _generate_inputs()
+        expected = _replay(isolated_manager, tmp_path, monkeypatch, inputs)
+        GOLDEN.parent.mkdir(parents=True, exist_ok=True)
+        rows = [{**row, "response": r} for row, r in zip(inputs, expected)]
+        GOLDEN.write_text(json.dumps(rows, ensure_ascii=False, indent=1), encoding="utf-8")
+    if not GOLDEN.exists():
+        pytest.fail(f"falta {GOLDEN}; regenerarlo con UPDATE_GOLDEN=1")
+    rows = json.loads(GOLDEN.read_text(encoding="utf-8"))
+    got = _replay(isolated_manager, tmp_path / "replay", monkeypatch, rows, backend)
+    for row, response in zip(rows, got):
+        assert response == row["response"], (row["user"], row["text"])
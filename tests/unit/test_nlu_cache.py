@@ -0,0 +1,57 @@
+from src.nlu.cache import ClassificationCache
+from src.nlu.classifier import SimpleNLU
+
+CFG = {
+    "threshold": 0.78,
+    "intents": [
+        {"name": "ver_menu", "patterns": ["menu", "opciones"], "action": "goto"},
+        {"name": "saludo", "patterns": ["hola", "buenas"], "action": "reply"},
+    ],
+}
+
+
+class _Counting(SimpleNLU):
+    calls = 0
+
+    def classify(self, text):
+        type(self).calls += 1
+        return super().classify(text)
+
+
+def test_cache_hits_on_normalized_text():
+    cache = ClassificationCache(max_entries=10)
+    nlu = _Counting(CFG)
+    _Counting.calls = 0
+    first = cache.classify(nlu, "Menú")
+    second = cache.classify(nlu, "  menu ")
+    assert first == second
+    assert _Counting.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_new_model_version_misses():
+    cache = ClassificationCache(max_entries=10)
+    old = SimpleNLU(CFG)
+    new = SimpleNLU({**CFG, "intents": CFG["intents"] + [{"name": "otro", "patterns": ["x"]}]})
+    assert old.version != new.version
+    cache.classify(old, "hola")
+    cache.classify(new, "hola")
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_eviction_counter():
+    cache = ClassificationCache(max_entries=2)
+    nlu = SimpleNLU(CFG)
+    for text in ["hola", "menu", "opciones", "hola"]:
+        cache.classify(nlu, text)
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 0
+
+
+def test_disabled_cache_passes_through():
+    cache = ClassificationCache(max_entries=0)
+    match, _ = cache.classify(SimpleNLU(CFG), "hola")
+    assert match and match.name == "saludo"
+    assert len(cache) == 0
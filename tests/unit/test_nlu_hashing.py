@@ -0,0 +1,42 @@
+from src.nlu.classifier import MLNLU
+
+INTENTS = [
+    {"name": "ver_menu", "patterns": ["ver menu", "menu", "opciones", "inicio"], "action": "goto"},
+    {"name": "abrir_ticket", "patterns": ["abrir ticket", "tengo un problema", "soporte"], "action": "ticket_ask_detail"},
+    {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor", "humano"], "action": "escalation"},
+]
+
+
+def _cfg(path, **ml):
+    return {"threshold": 0.7, "intents": INTENTS, "ml": {"model_path": str(path), **ml}}
+
+
+def test_hashed_features_are_bounded_buckets(tmp_path):
+    m = MLNLU(_cfg(tmp_path / "m.bin", hash_features=64), data_dir=tmp_path)
+    feats = m._extract_features("quiero hablar con un agente humano")
+    assert feats and all(isinstance(b, int) and 0 <= b < 64 for b in feats)
+    assert len(m._model["vocab"]) <= 64
+    # Mismo número de n-gramas que el modo exacto (solo cambian las claves)
+    exact = MLNLU(_cfg(tmp_path / "e.bin"), data_dir=tmp_path)
+    text = "quiero hablar con un agente humano"
+    assert sum(feats.values()) == sum(exact._extract_features(text).values())
+
+
+def test_hashed_model_classifies_and_persists(tmp_path):
+    path = tmp_path / "m.bin"
+    trained = MLNLU(_cfg(path, hash_features=4096), data_dir=tmp_path)
+    loaded = MLNLU(_cfg(path, hash_features=4096), data_dir=tmp_path)
+    assert loaded._model["hash_features"] == 4096
+    for text, name in [("ver el menu", "ver_menu"), ("abrirr tiket", "abrir_ticket"), ("asesor", "hablar_agente")]:
+        m1, _ = trained.classify(text)
+        m2, _ = loaded.classify(text)
+        assert m1 and m1.name == name
+        assert m2 and m2.name == name
+
+
+def test_changing_hash_mode_retrains(tmp_path):
+    path = tmp_path / "m.bin"
+    MLNLU(_cfg(path), data_dir=tmp_path)
+    hashed = MLNLU(_cfg(path, hash_features=512), data_dir=tmp_path)
+    assert hashed._model["hash_features"] == 512
+    assert all(isinstance(k, int) for k in hashed._model["vocab"])
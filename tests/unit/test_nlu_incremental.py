@@ -0,0 +1,42 @@
+import copy
+
+from src.nlu.classifier import MLNLU
+
+INTENTS = [
+    {"name": "ver_menu", "patterns": ["ver menu", "menu", "opciones"], "action": "goto"},
+    {"name": "abrir_ticket", "patterns": ["abrir ticket", "tengo un problema"], "action": "ticket_ask_detail"},
+    {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor"], "action": "escalation"},
+]
+
+
+def _cfg(path, intents, **ml):
+    return {"threshold": 0.7, "intents": intents, "ml": {"model_path": str(path), "retrain_on_start": True, **ml}}
+
+
+def test_incremental_retrain_only_recounts_changed_intents(tmp_path):
+    intents = copy.deepcopy(INTENTS)
+    MLNLU(_cfg(tmp_path / "m.bin", intents), data_dir=tmp_path)
+    assert (tmp_path / "m.bin.counts.json").exists() and not list(tmp_path.glob("*.tmp"))
+
+    intents[1]["patterns"].append("necesito soporte")
+    intents = [i for i in intents if i["name"] != "hablar_agente"] + [
+        {"name": "despedida", "patterns": ["adios", "chao"], "action": "reply"},
+    ]
+    inc = MLNLU(_cfg(tmp_path / "m.bin", intents), data_dir=tmp_path)
+    training = inc._model["meta"]["training"]
+    assert training["recounted"] == ["abrir_ticket", "despedida"]
+    assert training["reused"] == ["ver_menu"]
+    assert training["removed"] == ["hablar_agente"]
+
+    full = MLNLU(_cfg(tmp_path / "full.bin", intents, incremental=False), data_dir=tmp_path)
+    assert full._model["meta"]["training"]["reused"] == []
+    assert set(inc._model["vocab"]) == set(full._model["vocab"])
+    for lbl in full._model["labels"]:
+        assert inc._model["log_probs"][lbl] == full._model["log_probs"][lbl]
+        assert inc._model["logpriors"][lbl] == full._model["logpriors"][lbl]
+
+
+def test_incompatible_train_state_is_ignored(tmp_path):
+    MLNLU(_cfg(tmp_path / "m.bin", INTENTS), data_dir=tmp_path)
+    other = MLNLU(_cfg(tmp_path / "m.bin", INTENTS, char_ngrams=[2, 4]), data_dir=tmp_path)
+    assert other._model["meta"]["training"]["reused"] == []
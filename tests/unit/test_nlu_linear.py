@@ -0,0 +1,86 @@
+import pytest
+
+from src.nlu.classifier import MLNLU
+from src.nlu.registry import NLURegistry
+
+np = pytest.importorskip("numpy")
+
+from src.nlu.linear import LinearNLU  # noqa: E402
+
+INTENTS = [
+    {"name": "ver_menu", "patterns": ["ver menu", "menu", "opciones", "inicio"], "action": "goto"},
+    {"name": "abrir_ticket", "patterns": ["abrir ticket", "tengo un problema", "soporte"], "action": "ticket_ask_detail"},
+    {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor", "humano"], "action": "escalation"},
+]
+
+SAMPLES = ["ver el menu", "abrirr tiket", "quiero hablar con un humano", "men", "zzz", "", "soporte por favor"]
+
+
+def _cfg(tmp_path, **linear):
+    return {
+        "provider": "linear",
+        "threshold": 0.5,
+        "intents": INTENTS,
+        "linear": {"model_path": str(tmp_path / "models" / "nlu_linear.bin"), **linear},
+    }
+
+
+def test_linear_trains_and_classifies(tmp_path):
+    model = LinearNLU(_cfg(tmp_path), data_dir=tmp_path)
+    meta = model._model["meta"]
+    assert meta["algorithm"] == "logistic_regression"
+    assert meta["training"]["train_accuracy"] == 1.0
+    for text, expected in [("ver el menu", "ver_menu"), ("tengo un problema", "abrir_ticket"), ("asesor", "hablar_agente")]:
+        match, score = model.classify(text)
+        assert match is not None and match.name == expected
+        assert score >= model.threshold
+
+
+def test_linear_reload_matches_trained(tmp_path):
+    trained = LinearNLU(_cfg(tmp_path), data_dir=tmp_path)
+    loaded = LinearNLU(_cfg(tmp_path), data_dir=tmp_path)
+    assert loaded._model["format"]["name"] == "binary"
+    assert not loaded.is_stale()
+    for text in SAMPLES:
+        m1, s1 = trained.classify(text)
+        m2, s2 = loaded.classify(text)
+        assert (m1 and m1.name) == (m2 and m2.name)
+        assert s1 == pytest.approx(s2, abs=1e-5)  # la matriz se guarda en float32
+
+
+def test_linear_classify_many_and_dict_engine(tmp_path):
+    fast = LinearNLU(_cfg(tmp_path), data_dir=tmp_path)
+    slow = LinearNLU(_cfg(tmp_path, engine="dict"), data_dir=tmp_path)
+    assert slow._arrays is None
+    for text, (match, score) in zip(SAMPLES, fast.classify_many(SAMPLES)):
+        single, single_score = fast.classify(text)
+        other, other_score = slow.classify(text)
+        assert (match and match.name) == (single and single.name) == (other and other.name)
+        assert score == pytest.approx(single_score, abs=1e-9)
+        assert score == pytest.approx(other_score, abs=1e-5)
+
+
+def test_linear_pruning_shrinks_vocab(tmp_path):
+    full = LinearNLU(_cfg(tmp_path, prune=0.0), data_dir=tmp_path)
+    pruned = LinearNLU(_cfg(tmp_path, prune=0.1, retrain_on_start=True), data_dir=tmp_path)
+    assert len(pruned._model["vocab"]) < len(full._model["vocab"])
+    assert pruned._model["matrix"].shape == (3, len(pruned._model["vocab"]))
+    assert pruned._model["meta"]["vocab_size_unpruned"] == len(full._model["vocab"])
+
+
+def test_linear_and_ml_sharing_a_path_retrain(tmp_path):
+    path = str(tmp_path / "shared.bin")
+    LinearNLU({**_cfg(tmp_path), "linear": {"model_path": path}}, data_dir=tmp_path)
+    nb = MLNLU({"intents": INTENTS, "ml": {"model_path": path}}, data_dir=tmp_path)
+    # El archivo era de otro algoritmo: se considera desactualizado y se reentrena
+    assert nb._model["meta"]["algorithm"] == "naive_bayes"
+    assert not nb.is_stale()
+
+
+def test_registry_linear_provider(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path)
+    a = reg.get(cfg, data_dir=tmp_path)
+    assert isinstance(a, LinearNLU)
+    assert reg.get(dict(cfg), data_dir=tmp_path) is a
+    assert (tmp_path / "models" / "nlu_linear.bin").exists()
@@ -0,0 +1,89 @@
+import pickle
+
+import pytest
+
+from src.nlu.classifier import MLNLU
+from src.nlu.model_io import is_binary_model, load_binary
+
+INTENTS = [
+    {"name": "ver_menu", "patterns": ["ver menú", "menu", "opciones"], "action": "goto"},
+    {"name": "abrir_ticket", "patterns": ["abrir ticket", "tengo un problema"], "action": "ticket_ask_detail"},
+    {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor"], "action": "escalation"},
+]
+
+
+def _cfg(path, **ml):
+    return {"threshold": 0.7, "intents": INTENTS, "ml": {"model_path": str(path), **ml}}
+
+
+def test_binary_roundtrip(tmp_path):
+    path = tmp_path / "nlu_nb.bin"
+    trained = MLNLU(_cfg(path), data_dir=tmp_path)
+    assert is_binary_model(path)
+
+    raw = load_binary(path)
+    assert raw["labels"] == trained._model["labels"]
+    assert raw["vocab"] == trained._model["vocab"]
+    assert raw["meta"]["checksum"] == trained._model["meta"]["checksum"]
+
+    loaded = MLNLU(_cfg(path), data_dir=tmp_path)
+    for text in ["ver menu", "abrirr tiket", "asesor por favor", "xyz"]:
+        m1, s1 = trained.classify(text)
+        m2, s2 = loaded.classify(text)
+        assert (m1 and m1.name) == (m2 and m2.name)
+        # La matriz en disco es float32
+        assert s1 == pytest.approx(s2, abs=1e-4)
+
+
+def test_binary_model_with_dict_engine(tmp_path):
+    path = tmp_path / "nlu_nb.bin"
+    trained = MLNLU(_cfg(path), data_dir=tmp_path)
+    loaded = MLNLU(_cfg(path, engine="dict"), data_dir=tmp_path)
+    assert loaded._arrays is None
+    m1, s1 = trained.classify("tengo un problema")
+    m2, s2 = loaded.classify("tengo un problema")
+    assert m1 and m2 and m1.name == m2.name
+    assert s1 == pytest.approx(s2, abs=1e-4)
+
+
+def test_legacy_pickle_still_loads(tmp_path):
+    path = tmp_path / "nlu_nb.pkl"
+    trained = MLNLU(_cfg(path), data_dir=tmp_path)
+    assert not is_binary_model(path)
+    with open(path, "rb") as f:
+        assert pickle.load(f)["labels"] == trained._model["labels"]
+
+    loaded = MLNLU(_cfg(path), data_dir=tmp_path)
+    match, _ = loaded.classify("hablar con agente")
+    assert match and match.name == "hablar_agente"
+
+
+def test_model_can_be_replaced_while_loaded_without_mmap(tmp_path, monkeypatch):
+    # Camino de Windows: el modelo se lee a memoria y save_binary puede reemplazar el archivo
+    from src.nlu import model_io
+
+    monkeypatch.setattr(model_io, "MMAP_MODELS", False)
+    path = tmp_path / "nlu_nb.bin"
+    trained = MLNLU(_cfg(path), data_dir=tmp_path)
+    loaded = MLNLU(_cfg(path), data_dir=tmp_path)
+    assert isinstance(loaded._model["_mmap"], bytes)
+    model_io.save_binary(trained._model, path)
+    match, _ = loaded.classify("hablar con agente")
+    assert match and match.name == "hablar_agente"
+
+
+def test_concurrent_saves_use_unique_temp_files(tmp_path):
+    # Varios workers reentrenando el mismo modelo: cada escritura usa su propio temporal
+    import threading
+
+    from src.nlu import model_io
+
+    path = tmp_path / "nlu_nb.bin"
+    model = MLNLU(_cfg(path), data_dir=tmp_path)._model
+    threads = [threading.Thread(target=model_io.save_binary, args=(model, path)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert load_binary(path)["labels"] == model["labels"]
+    assert not list(tmp_path.glob("*.tmp"))
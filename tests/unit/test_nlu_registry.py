@@ -0,0 +1,175 @@
+import os
+import threading
+
+from src.nlu.classifier import MLNLU, SimpleNLU
+from src.nlu.registry import NLURegistry
+
+
+def _cfg(tmp_path, **extra):
+    cfg = {
+        "provider": "ml",
+        "threshold": 0.7,
+        "ml": {"model_path": str(tmp_path / "models" / "nlu_nb.pkl")},
+        "intents": [
+            {"name": "saludo", "patterns": ["hola", "buenas"], "action": "reply"},
+            {"name": "ticket", "patterns": ["abrir ticket", "tengo un problema"], "action": "ticket_ask_detail"},
+        ],
+    }
+    cfg.update(extra)
+    return cfg
+
+
+def test_registry_reuses_instance(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path)
+    a = reg.get(cfg, data_dir=tmp_path)
+    b = reg.get(dict(cfg), data_dir=tmp_path)
+    assert isinstance(a, MLNLU)
+    assert a is b
+    assert len(reg) == 1
+
+
+def test_registry_swaps_on_config_change(tmp_path):
+    reg = NLURegistry(background=False)
+    a = reg.get(_cfg(tmp_path), data_dir=tmp_path)
+    b = reg.get(_cfg(tmp_path, threshold=0.9), data_dir=tmp_path)
+    assert a is not b
+    assert b.threshold == 0.9
+
+
+def test_registry_swaps_on_model_file_change(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path)
+    a = reg.get(cfg, data_dir=tmp_path)
+    st = a.model_path.stat()
+    os.utime(a.model_path, (st.st_atime, st.st_mtime + 10))
+    # Mientras se recarga en segundo plano se sigue sirviendo el modelo anterior
+    assert reg.get(cfg, data_dir=tmp_path) is a
+    reg.wait()
+    b = reg.get(cfg, data_dir=tmp_path)
+    assert a is not b
+    assert reg.get(cfg, data_dir=tmp_path) is b
+
+
+def test_registry_retrain_on_start_trains_once(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path, ml={"model_path": str(tmp_path / "m.pkl"), "retrain_on_start": True})
+    a = reg.get(cfg, data_dir=tmp_path)
+    assert reg.get(cfg, data_dir=tmp_path) is a
+
+
+def test_registry_simple_provider(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path, provider="simple")
+    a = reg.get(cfg, data_dir=tmp_path)
+    assert isinstance(a, SimpleNLU)
+    assert reg.get(cfg, data_dir=tmp_path) is a
+
+
+def test_registry_retrains_in_background_on_rules_change(tmp_path):
+    reg = NLURegistry()
+    cfg = _cfg(tmp_path)
+    old = reg.get(cfg, data_dir=tmp_path)
+    old_checksum = old._model["meta"]["checksum"]
+
+    new_cfg = _cfg(tmp_path)
+    new_cfg["intents"] = new_cfg["intents"] + [{"name": "despedida", "patterns": ["adios", "chao"], "action": "reply"}]
+    # La petición no espera al reentrenamiento: recibe el modelo anterior
+    assert reg.get(new_cfg, data_dir=tmp_path) is old
+    reg.wait()
+    new = reg.get(new_cfg, data_dir=tmp_path)
+    assert new is not old
+    assert not new.is_stale()
+    assert new._model["meta"]["checksum"] != old_checksum
+    assert "despedida" in new._model["labels"]
+    assert new._model["meta"]["training"]["reused"] == ["saludo", "ticket"]
+
+
+def test_registry_shared_path_does_not_ping_pong(tmp_path):
+    reg = NLURegistry()
+    a_cfg = _cfg(tmp_path)
+    b_cfg = _cfg(tmp_path)
+    b_cfg["intents"] = b_cfg["intents"] + [{"name": "otro", "patterns": ["otra cosa"], "action": "reply"}]
+    a = reg.get(a_cfg, data_dir=tmp_path)
+    reg.get(b_cfg, data_dir=tmp_path)
+    reg.wait()
+    b = reg.get(b_cfg, data_dir=tmp_path)
+    # El archivo cambió (lo reentrenó b); a no debe reentrenar de vuelta
+    assert reg.get(a_cfg, data_dir=tmp_path) is a
+    reg.wait()
+    assert reg.get(a_cfg, data_dir=tmp_path) is a
+    assert reg.get(b_cfg, data_dir=tmp_path) is b
+    assert not b.is_stale()
+
+
+def _tenant_cfg(tmp_path, extra_intent):
+    cfg = _cfg(tmp_path)
+    cfg["intents"] = cfg["intents"] + [extra_intent]
+    return cfg
+
+
+def test_registry_tenants_get_own_model_paths(tmp_path):
+    reg = NLURegistry()
+    base = reg.get(_cfg(tmp_path), data_dir=tmp_path)
+    a_cfg = _tenant_cfg(tmp_path, {"name": "precios", "patterns": ["precio", "cuanto cuesta"], "action": "reply"})
+    a = reg.get(a_cfg, data_dir=tmp_path, tenant="chat-a")
+    a2 = reg.get(dict(a_cfg), data_dir=tmp_path, tenant="chat-a2")
+    reg.wait()
+    # Mismo override de intents => mismo modelo; nunca el archivo global
+    assert a is a2
+    assert a.model_path != base.model_path
+    assert a.model_path.parent.parent.name == "tenants"
+    assert "precios" in a._model["labels"]
+    assert not base.is_stale() and "precios" not in base._model["labels"]
+    assert reg.get(_cfg(tmp_path), data_dir=tmp_path) is base
+
+
+def test_registry_lru_eviction_by_count_and_memory(tmp_path):
+    reg = NLURegistry(max_entries=2)
+    cfgs = [
+        _tenant_cfg(tmp_path, {"name": f"extra{i}", "patterns": [f"palabra{i}"], "action": "reply"})
+        for i in range(3)
+    ]
+    first = reg.get(cfgs[0], data_dir=tmp_path, tenant="t0")
+    reg.get(cfgs[1], data_dir=tmp_path, tenant="t1")
+    assert reg.get(cfgs[0], data_dir=tmp_path, tenant="t0") is first  # t0 pasa a ser el más reciente
+    reg.get(cfgs[2], data_dir=tmp_path, tenant="t2")
+    stats = reg.stats()
+    assert [e["tenant"] for e in stats["entries"]] == ["t0", "t2"]
+    assert stats["evictions"] == 1
+
+    # Presupuesto de memoria menor que dos modelos: solo queda el último usado
+    reg.configure(memory_budget=stats["entries"][-1]["bytes"] + 1)
+    assert len(reg) == 1
+    # Un tenant desalojado se vuelve a cargar desde su archivo (sin reentrenar)
+    again = reg.get(cfgs[0], data_dir=tmp_path, tenant="t0")
+    assert again is not first
+    assert again._model["meta"]["created_at"] == first._model["meta"]["created_at"]
+
+
+def test_registry_cold_load_does_not_block_other_tenants(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowRegistry(NLURegistry):
+        @staticmethod
+        def _build(provider, nlu_cfg, data_dir):
+            if any(i["name"] == "lento" for i in nlu_cfg.get("intents") or []):
+                started.set()
+                release.wait(5)
+            return NLURegistry._build(provider, nlu_cfg, data_dir)
+
+    reg = SlowRegistry()
+    slow_cfg = _tenant_cfg(tmp_path, {"name": "lento", "patterns": ["espera"], "action": "reply"})
+    fast_cfg = _tenant_cfg(tmp_path, {"name": "rapido", "patterns": ["ya"], "action": "reply"})
+    result = {}
+    worker = threading.Thread(target=lambda: result.setdefault("slow", reg.get(slow_cfg, data_dir=tmp_path, tenant="slow")))
+    worker.start()
+    assert started.wait(5)
+    try:
+        fast = reg.get(fast_cfg, data_dir=tmp_path, tenant="fast")
+        assert "rapido" in fast._model["labels"]
+    finally:
+        release.set()
+        worker.join(5)
+    assert "lento" in result["slow"]._model["labels"]
@@ -0,0 +1,39 @@
+import pytest
+
+from src.nlu.classifier import MLNLU
+
+np = pytest.importorskip("numpy")
+
+INTENTS = [
+    {"name": "ver_menu", "patterns": ["ver menu", "menu", "opciones", "inicio"], "action": "goto"},
+    {"name": "abrir_ticket", "patterns": ["abrir ticket", "tengo un problema", "soporte"], "action": "ticket_ask_detail"},
+    {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor", "humano"], "action": "escalation"},
+]
+
+SAMPLES = ["ver el menu", "abrirr tiket", "quiero hablar con un humano", "men", "zzz", "", "soporte por favor", "ok"]
+
+
+def _model(tmp_path, engine):
+    cfg = {"threshold": 0.7, "intents": INTENTS, "ml": {"model_path": str(tmp_path / f"{engine}.pkl"), "engine": engine}}
+    return MLNLU(cfg, data_dir=tmp_path)
+
+
+def test_numpy_engine_matches_dict_engine(tmp_path):
+    slow = _model(tmp_path, "dict")
+    fast = _model(tmp_path, "numpy")
+    assert slow._arrays is None and fast._arrays is not None
+    for text in SAMPLES:
+        m1, s1 = slow.classify(text)
+        m2, s2 = fast.classify(text)
+        assert (m1 and m1.name) == (m2 and m2.name)
+        assert s1 == pytest.approx(s2, abs=1e-12)
+
+
+def test_classify_many_matches_classify(tmp_path):
+    fast = _model(tmp_path, "numpy")
+    batch = fast.classify_many(SAMPLES)
+    assert len(batch) == len(SAMPLES)
+    for text, (match, score) in zip(SAMPLES, batch):
+        single, single_score = fast.classify(text)
+        assert (match and match.name) == (single and single.name)
+        assert score == pytest.approx(single_score, abs=1e-12)
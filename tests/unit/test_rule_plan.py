@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from src.config import rules_loader
+from src.config.rule_plan import RulePlan
+from src.config.rules_loader import get_rules_for
+
+RULES = {
+    "default": {
+        "fallback_text": "No entendí",
+        "synonyms": {"menu": ["Menu", "Inicio"], "menu_accept": ["Sí", "dale"], "agent": ["agente"]},
+        "features": {"tickets": {"enabled": False}, "faq": {}},
+        "memory": {"resume_after": "2h", "inactivity": {"reminder_after": "3m", "close_after": "1d"}},
+        "menus": {
+            "root": "main",
+            "items": {
+                "main": {
+                    "text": "Elige",
+                    "options": [
+                        {"triggers": ["1", "Productos"], "action": "goto", "target": "prod"},
+                        {"triggers": ["2"], "action": "reply", "responses": ["Hola", "Otra"]},
+                        {"triggers": ["3"], "action": "escalation", "enabled": False},
+                    ],
+                },
+                "prod": {"text": "Productos", "options": [{"triggers": ["volver"], "action": "BACK"}]},
+                "off": {"text": "Oculto", "enabled": False},
+            },
+        },
+        "nlu": {
+            "greetings": {"triggers": ["Hola"]},
+            "intents": [
+                {"name": "Ver_Catalogo", "patterns": ["Ver catálogo"], "responses": ["Aquí está"]},
+                {"name": "satisfaccion", "patterns": ["que bien"], "reply_text": "Me alegra"},
+            ],
+        },
+    },
+    "vip": {"fallback_text": "VIP", "nlu": {"intents": []}},
+}
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    monkeypatch.setattr(rules_loader, "_cache", RULES)
+    monkeypatch.setattr(rules_loader, "_cache_mtime", rules_loader.RULES_FILE.stat().st_mtime)
+    return RULES
+
+
+def test_plan_compiled_once_per_chat_and_version(rules):
+    plan = get_rules_for(None)
+    assert isinstance(plan, RulePlan)
+    assert get_rules_for(None) is plan
+    # Chats sin override comparten el plan de default
+    assert get_rules_for("otro") is plan
+    vip = get_rules_for("vip")
+    assert vip is not plan and vip.own_nlu and not plan.own_nlu
+    assert vip["fallback_text"] == "VIP" and vip.get("synonyms") == RULES["default"]["synonyms"]
+    # Una nueva versión de reglas recompila
+    rules_loader._cache = dict(RULES)
+    assert get_rules_for(None) is not plan
+
+
+def test_plan_is_read_only_mapping(rules):
+    plan = get_rules_for(None)
+    assert plan.get("fallback_text") == "No entendí" and "menus" in plan and len(plan) == len(RULES["default"])
+    with pytest.raises(AttributeError):
+        plan.fallback_text = "x"
+    with pytest.raises(TypeError):
+        plan["fallback_text"] = "x"
+
+
+def test_plan_precompiles_derived_config(rules):
+    plan = get_rules_for(None)
+    assert plan.synonym("menu").any("ir al inicio") and not plan.synonym("ticket").any("ticket")
+    assert plan.menu_accept == {"sí", "dale"}
+    assert plan.greeting_triggers == {"hola"}
+    assert not plan.enabled("tickets") and plan.enabled("faq") and plan.enabled("escalation")
+    assert (plan.resume_seconds, plan.reminder_after, plan.close_after) == (7200, 180, 86400)
+    assert set(plan.menu_nodes) == {"main", "prod"}
+    main = plan.menu_nodes["main"]
+    assert len(main.options) == 2
+    assert main.match("productos").target == "prod"
+    assert main.match("2").reply == "Hola"
+    assert plan.menu_nodes["prod"].match("volver").action == "back"
+    assert plan.menu_text("off") == "Escribe tu consulta."
+    assert plan.intents["ver_catalogo"]["patterns"] == ["Ver catálogo"]
+    assert plan.catalog.matches("quiero ver catálogo") and plan.catalog.reply == "Aquí está"
+    assert plan.satisfaction.matches("que bien") and plan.satisfaction.reply == "Me alegra"
+
+
+def test_plan_compiled_from_old_rules_is_not_cached_under_new_ones(rules, monkeypatch):
+    # Hilo A compila con las reglas viejas mientras el hilo B ya ve las nuevas
+    building, release = threading.Event(), threading.Event()
+    real = rules_loader.RulePlan
+
+    def slow_plan(merged, **kwargs):
+        if merged.get("fallback_text") == "No entendí" and not building.is_set():
+            building.set()
+            release.wait(5)
+        return real(merged, **kwargs)
+
+    monkeypatch.setattr(rules_loader, "RulePlan", slow_plan)
+    monkeypatch.setattr(rules_loader, "_plans_source", None)
+    a = threading.Thread(target=get_rules_for, args=(None,))
+    a.start()
+    assert building.wait(5)
+    rules_loader._cache = {**RULES, "default": {**RULES["default"], "fallback_text": "Nuevo"}}
+    b = threading.Thread(target=get_rules_for, args=(None,))
+    b.start()
+    time.sleep(0.05)
+    release.set()
+    a.join(5)
+    b.join(5)
+    assert get_rules_for(None)["fallback_text"] == "Nuevo"
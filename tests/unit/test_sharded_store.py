@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from src.storage.conversation_repository import ConversationRepository
+from src.storage.sharded import ShardedConversationRepository, ShardedStateRepository, reshard, shard_of
+from src.storage.state_repository import StateRepository
+
+
+def test_each_operation_touches_one_shard(tmp_path):
+    repo = ShardedStateRepository(tmp_path, shards=4)
+    for i in range(20):
+        repo.set(f"u{i}", "c", "menu:main", {"i": i})
+    repo.update_field("u3", "c", "greet_shown", True)
+    repo.clear("u4", "c")
+    assert repo.get("u3", "c") == {"name": "menu:main", "data": {"i": 3, "greet_shown": True}}
+    assert repo.get("u4", "c") == {}
+    files = sorted(p.name for p in (tmp_path / "state").glob("*.json"))
+    assert files == ["00.json", "01.json", "02.json", "03.json", "_shards.json"]
+    shard = json.loads((tmp_path / "state" / f"{shard_of('c|u7', 4):02d}.json").read_text(encoding="utf-8"))
+    assert shard["c|u7"]["data"] == {"i": 7}
+    assert all(shard_of(k, 4) == shard_of("c|u7", 4) for k in shard)
+
+
+def test_sharded_conversations_match_single_file(tmp_path):
+    single = ConversationRepository(tmp_path / "single")
+    sharded = ShardedConversationRepository(tmp_path / "sharded", shards=3)
+    for repo in (single, sharded):
+        for i in range(6):
+            repo.append_event(f"u{i % 2}", None, role="user", text=f"m{i}", max_items=2)
+        repo.set_topic("u0", None, "pedido")
+    strip = lambda hist: [h["text"] for h in hist]
+    for user in ("u0", "u1"):
+        assert strip(sharded.get_history(user, None, limit=0)) == strip(single.get_history(user, None, limit=0))
+    assert sharded.get_topic("u0", None)["name"] == "pedido"
+
+
+def test_reshard_migrates_and_changes_count(tmp_path):
+    single = StateRepository(tmp_path)
+    for i in range(30):
+        single.set(f"u{i}", "c", "s", {"i": i})
+    assert reshard(tmp_path, "state", 4) == {"keys": 30, "shards": 4}
+    repo = ShardedStateRepository(tmp_path, shards=4)
+    assert all(repo.get(f"u{i}", "c")["data"] == {"i": i} for i in range(30))
+    with pytest.raises(ValueError):
+        ShardedStateRepository(tmp_path, shards=8)
+    repo.set("nuevo", "c", "s")
+    assert reshard(tmp_path, "state", 8)["keys"] == 31
+    repo = ShardedStateRepository(tmp_path, shards=8)
+    assert repo.get("nuevo", "c")["name"] == "s" and repo.get("u29", "c")["data"] == {"i": 29}
+    assert len(list((tmp_path / "state").glob("0*.json"))) == 8
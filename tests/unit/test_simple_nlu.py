@@ -0,0 +1,56 @@
+import difflib
+
+from src.nlu.classifier import SimpleNLU, _lcs_length, _normalize
+
+CFG = {
+    "threshold": 0.78,
+    "intents": [
+        {"name": "ver_menu", "patterns": ["ver menú", "menu", "opciones"], "action": "goto"},
+        {"name": "abrir_ticket", "patterns": ["abrir ticket", "crear ticket", "soporte"], "action": "ticket_ask_detail"},
+        {"name": "hablar_agente", "patterns": ["hablar con agente", "asesor", "soporte"], "action": "escalation"},
+        {"name": "eco_menu", "patterns": ["menu"], "action": "reply"},
+    ],
+}
+
+
+def _reference(text):
+    """Recorrido original: ratio de difflib contra cada patrón de cada intent."""
+    t = _normalize(text)
+    best, best_score = None, 0.0
+    for intent in CFG["intents"]:
+        pats = [_normalize(p) for p in intent["patterns"]]
+        score = max(difflib.SequenceMatcher(a=t, b=p).ratio() for p in pats) if t else 0.0
+        if score > best_score:
+            best, best_score = intent["name"], score
+    return best, best_score
+
+
+def test_scores_match_difflib_reference():
+    nlu = SimpleNLU(CFG)
+    for text in ["ver menu", "MENU", "abrirr tiket", "soporte", "asesr", "zzz", "", "hablar con un agente ya", "m"]:
+        match, score = nlu.classify(text)
+        assert ((match.name if match else None), score) == _reference(text)
+
+
+def test_ties_keep_first_intent():
+    nlu = SimpleNLU(CFG)
+    # 'soporte' existe en abrir_ticket y hablar_agente; 'menu' en ver_menu y eco_menu
+    assert nlu.classify("soporte")[0].name == "abrir_ticket"
+    assert nlu.classify("menu")[0].name == "ver_menu"
+
+
+def test_bit_parallel_lcs():
+    def lcs(a, b):
+        prev = [0] * (len(b) + 1)
+        for ca in a:
+            cur = [0]
+            for j, cb in enumerate(b):
+                cur.append(prev[j] + 1 if ca == cb else max(prev[j + 1], cur[j]))
+            prev = cur
+        return prev[-1]
+
+    for a, b in [("abrir ticket", "abrirr tiket"), ("menu", "opciones"), ("", "x"), ("aaa", "a")]:
+        masks = {}
+        for i, ch in enumerate(b):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        assert _lcs_length(a, masks, len(b)) == lcs(a, b)
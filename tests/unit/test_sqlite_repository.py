@@ -0,0 +1,103 @@
+import json
+import time
+
+from src.storage.conversation_repository import ConversationRepository
+from src.storage.repository import TicketRepository
+from src.storage.sqlite_repository import (
+    SqliteConversationRepository,
+    SqliteDatabase,
+    SqliteStateRepository,
+    SqliteTicketRepository,
+    migrate_json,
+)
+from src.storage.state_repository import StateRepository
+
+
+def test_sqlite_uses_wal(tmp_path):
+    db = SqliteDatabase(tmp_path / "db.sqlite3")
+    assert db.connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sqlite_repositories_match_json(tmp_path):
+    db = SqliteDatabase(tmp_path / "db.sqlite3")
+    pairs = [
+        (StateRepository(tmp_path / "json"), SqliteStateRepository(db)),
+        (ConversationRepository(tmp_path / "json"), SqliteConversationRepository(db)),
+        (TicketRepository(tmp_path / "json"), SqliteTicketRepository(db)),
+    ]
+    (js, ss), (jc, sc), (jt, st) = pairs
+    for repo in (js, ss):
+        repo.set("u1", "c", "menu:dyn", {"current": "main", "stack": []})
+        repo.update_field("u1", "c", "greet_shown", True)
+        repo.set("u2", None, "ticket:ask_detail")
+        repo.clear("u2", None)
+        repo.update_field("u3", "c", "x", 1)
+    for who in ("u1", "u2", "u3"):
+        assert ss.get(who, "c") == js.get(who, "c")
+    assert ss.get("u2", None) == js.get("u2", None) == {}
+
+    for repo in (jc, sc):
+        for i in range(7):
+            repo.append_event("u1", "c", role="user" if i % 2 else "bot", text=f"m{i}", meta={"i": i}, max_items=5)
+        repo.append_event("u2", "c", role="user", text="otro")
+        repo.set_topic("u1", "c", "pedido", {"id": 3}, ttl_days=1)
+    strip = lambda hist: [{k: v for k, v in h.items() if k != "ts"} for h in hist]
+    assert strip(sc.get_history("u1", "c", limit=3)) == strip(jc.get_history("u1", "c", limit=3))
+    assert strip(sc.get_history("u1", "c", limit=0)) == strip(jc.get_history("u1", "c", limit=0))
+    assert len(sc.get_history("u1", "c", limit=0)) == 5
+    assert sc.get_topic("u1", "c")["name"] == jc.get_topic("u1", "c")["name"] == "pedido"
+    sc.clear_topic("u1", "c")
+    sc.clear_history("u1", "c")
+    assert sc.get_topic("u1", "c") is None and sc.get_history("u1", "c") == []
+    assert sc.get_history("u2", "c")[0]["text"] == "otro"
+
+    assert st.create("u1", "no anda") == jt.create("u1", "no anda")
+    assert st.create("u2", "otro")["id"] == 2
+    assert st.get(1) == jt.get(1) and st.get(9) is None
+
+
+def test_expired_topic_is_cleared(tmp_path):
+    sc = SqliteConversationRepository(SqliteDatabase(tmp_path / "db.sqlite3"))
+    sc.set_topic("u", "c", "viejo", ttl_days=1)
+    with sc.db.connect() as conn:
+        topic = json.loads(conn.execute("SELECT topic FROM conversations").fetchone()[0])
+        topic["expires_at"] = time.time() - 1
+        conn.execute("UPDATE conversations SET topic = ?", (json.dumps(topic),))
+    assert sc.get_topic("u", "c") is None
+    assert sc.db.connect().execute("SELECT topic FROM conversations").fetchone()[0] is None
+
+
+def test_migrate_json_once(tmp_path):
+    data = tmp_path / "data"
+    StateRepository(data).set("u1", "c", "menu:main", {"a": 1})
+    conv = ConversationRepository(data)
+    conv.append_event("u1", "c", role="user", text="hola")
+    conv.set_topic("u1", "c", "pedido")
+    TicketRepository(data).create("u1", "falla")
+    TicketRepository(data).create("u2", "otra")
+
+    db = SqliteDatabase(data / "db.sqlite3")
+    counts = migrate_json(data, db)
+    assert counts == {"state": 1, "messages": 1, "conversations": 1, "tickets": 2}
+    assert SqliteStateRepository(db).get("u1", "c") == {"name": "menu:main", "data": {"a": 1}}
+    sc = SqliteConversationRepository(db)
+    assert sc.get_history("u1", "c")[0]["text"] == "hola" and sc.get_topic("u1", "c")["name"] == "pedido"
+    st = SqliteTicketRepository(db)
+    assert st.get(2)["text"] == "otra" and st.create("u3", "nuevo")["id"] == 3
+    # Segunda vez no vuelve a importar
+    assert migrate_json(data, db)["messages"] == 0
+    assert len(sc.get_history("u1", "c", limit=0)) == 1
+
+
+def test_migrate_json_concurrent_opens_import_once(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    conv = ConversationRepository(data)
+    conv.append_event("u1", "c", role="user", text="hola")
+    conv.append_event("u1", "c", role="bot", text="¡Hola!")
+    db1 = SqliteDatabase(data / "db.sqlite3")
+    db2 = SqliteDatabase(data / "db.sqlite3")
+    # Dos procesos que pasaron la comprobación rápida antes de que el otro marcara
+    monkeypatch.setattr(SqliteDatabase, "get_meta", lambda self, key: None)
+    assert migrate_json(data, db1)["messages"] == 2
+    assert migrate_json(data, db2)["messages"] == 0
+    assert len(SqliteConversationRepository(db2).get_history("u1", "c", limit=0)) == 2
@@ -0,0 +1,82 @@
+import json
+import time
+
+from src.storage.state_cache import CachedStateRepository
+from src.storage.state_repository import StateRepository
+
+
+def _on_disk(tmp_path):
+    return json.loads((tmp_path / "state.json").read_text(encoding="utf-8"))
+
+
+def test_writes_stay_in_memory_until_flush(tmp_path):
+    StateRepository(tmp_path).set("u0", "c", "menu:main")
+    repo = CachedStateRepository(tmp_path, flush_interval=0, max_dirty=100)
+    assert repo.get("u0", "c")["name"] == "menu:main"
+    repo.set("u1", "c", "menu:dyn", {"stack": ["main"]})
+    repo.update_field("u1", "c", "greet_shown", True)
+    repo.clear("u0", "c")
+    # get devuelve copias: mutarlas no cambia la caché
+    repo.get("u1", "c")["data"]["stack"].append("x")
+    assert repo.get("u1", "c") == {"name": "menu:dyn", "data": {"stack": ["main"], "greet_shown": True}}
+    assert set(_on_disk(tmp_path)) == {"c|u0"}
+    assert repo.stats()["dirty"] == 2
+    assert repo.flush() and not repo.flush()
+    assert _on_disk(tmp_path) == {"c|u1": {"name": "menu:dyn", "data": {"stack": ["main"], "greet_shown": True}}}
+    stats = repo.stats()
+    assert stats["dirty"] == 0 and stats["flushes"] == 1 and stats["flush_last_ms"] >= 0
+    assert StateRepository(tmp_path).get("u1", "c")["name"] == "menu:dyn"
+
+
+def test_max_dirty_triggers_flush(tmp_path):
+    repo = CachedStateRepository(tmp_path, flush_interval=0, max_dirty=3)
+    repo.set("u1", None, "a")
+    repo.set("u2", None, "a")
+    assert _on_disk(tmp_path) == {}
+    repo.set("u3", None, "a")
+    assert len(_on_disk(tmp_path)) == 3 and repo.stats()["dirty"] == 0
+
+
+def test_background_flush_and_close(tmp_path):
+    repo = CachedStateRepository(tmp_path, flush_interval=0.02, max_dirty=100)
+    repo.set("u1", None, "a")
+    deadline = time.time() + 2
+    while "-|u1" not in _on_disk(tmp_path) and time.time() < deadline:
+        time.sleep(0.01)
+    assert "-|u1" in _on_disk(tmp_path)
+    repo.close()
+    repo.set("u2", None, "b")
+    time.sleep(0.05)
+    assert "-|u2" not in _on_disk(tmp_path)
+    repo.flush()
+    assert "-|u2" in _on_disk(tmp_path)
+
+
+def test_flush_keeps_changes_from_other_processes(tmp_path):
+    a = CachedStateRepository(tmp_path, flush_interval=0, max_dirty=100)
+    b = CachedStateRepository(tmp_path, flush_interval=0, max_dirty=100)
+    a.set("u1", None, "a")
+    b.set("u2", None, "b")
+    other = StateRepository(tmp_path)
+    other.set("u3", None, "c")
+    assert a.flush() and b.flush()
+    assert set(_on_disk(tmp_path)) == {"-|u1", "-|u2", "-|u3"}
+    # Tras su flush, b ve las claves que escribieron los demás
+    assert b.get("u1", None)["name"] == "a" and b.get("u3", None)["name"] == "c"
+    other.clear("u3", None)
+    b.set("u2", None, "b2")
+    b.flush()
+    assert b.get("u3", None) == {} and set(_on_disk(tmp_path)) == {"-|u1", "-|u2"}
+
+
+def test_state_cache_with_shards_is_reported(tmp_path, monkeypatch, caplog):
+    from src.app.config import settings
+    from src.storage import backends
+
+    monkeypatch.setattr(backends, "_effective", {})
+    monkeypatch.setattr(settings, "state_cache", True)
+    monkeypatch.setattr(settings, "json_shards", 2)
+    repo = backends.state_repository(tmp_path)
+    assert not isinstance(repo, CachedStateRepository)
+    assert "STATE_CACHE se ignora" in caplog.text
+    assert backends.storage_stats()["backends"]["state"] == "json_shards(2)"
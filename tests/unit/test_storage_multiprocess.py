@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from src.storage.conversation_repository import ConversationRepository
+from src.storage.locking import CorruptStoreError, atomic_write_text
+from src.storage.repository import TicketRepository
+from src.storage.state_repository import StateRepository
+
+PROCS = 4
+EVENTS = 25
+
+fork = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requiere fork (Linux/macOS)"
+)
+
+
+def _writer(data_dir, worker):
+    conv = ConversationRepository(data_dir)
+    tickets = TicketRepository(data_dir)
+    for i in range(EVENTS):
+        # Mismo archivo para todos: usuarios propios y uno compartido
+        conv.append_event(f"w{worker}", "c", role="user", text=str(i), max_items=1000)
+        conv.append_event("shared", "c", role="user", text=f"{worker}:{i}", max_items=1000)
+        if i % 5 == 0:
+            tickets.create(f"w{worker}", f"t{i}")
+
+
+@fork
+def test_concurrent_processes_lose_no_events(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(tmp_path, w)) for w in range(PROCS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    conv = ConversationRepository(tmp_path)
+    for w in range(PROCS):
+        assert [h["text"] for h in conv.get_history(f"w{w}", "c", limit=0)] == [str(i) for i in range(EVENTS)]
+    shared = [h["text"] for h in conv.get_history("shared", "c", limit=0)]
+    assert sorted(shared) == sorted(f"{w}:{i}" for w in range(PROCS) for i in range(EVENTS))
+    tickets = json.loads((tmp_path / "tickets.json").read_text(encoding="utf-8"))
+    assert sorted(t["id"] for t in tickets) == list(range(1, PROCS * EVENTS // 5 + 1))
+
+
+def test_atomic_write_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "state.json"
+    atomic_write_text(path, '{"a": 1}')
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 1}
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
+
+
+def test_corrupt_file_is_not_overwritten(tmp_path):
+    repo = StateRepository(tmp_path)
+    repo.set("u", "c", "menu:main")
+    (tmp_path / "state.json").write_text('{"c|u": {"name": "menu', encoding="utf-8")
+    with pytest.raises(CorruptStoreError):
+        repo.set("v", "c", "menu:main")
+    assert (tmp_path / "state.json").read_text(encoding="utf-8") == '{"c|u": {"name": "menu'
+
+
+def test_optimistic_retry_without_flock(tmp_path, monkeypatch):
+    # Sin fcntl (Windows) file_lock no bloquea: otro escritor puede cambiar el
+    # archivo entre la lectura y la escritura y el método se reintenta
+    from src.storage import locking
+
+    monkeypatch.setattr(locking, "fcntl", None)
+    repo = StateRepository(tmp_path)
+    repo.set("u", "c", "a")
+    real_read = repo._read
+    calls = []
+
+    def racing_read(path, default):
+        data = real_read(path, default)
+        if not calls:
+            other = threading.Thread(target=StateRepository(tmp_path).set, args=("otro", "c", "x"))
+            other.start()
+            other.join()
+            os.utime(path, ns=(1, 1))
+        calls.append(1)
+        return data
+
+    monkeypatch.setattr(repo, "_read", racing_read)
+    repo.set("v", "c", "b")
+    assert len(calls) == 2
+    assert set(json.loads((tmp_path / "state.json").read_text(encoding="utf-8"))) == {"c|u", "c|v", "c|otro"}
+
+
+def _open_sharded(data_dir, worker):
+    from src.storage.backends import _sharded
+
+    _sharded(data_dir, "state").set(f"w{worker}", "c", "s", {"w": worker})
+
+
+@fork
+def test_first_open_reshards_once_across_processes(tmp_path, monkeypatch):
+    from src.app.config import settings
+
+    single = StateRepository(tmp_path)
+    for i in range(50):
+        single.set(f"u{i}", "c", "s", {"i": i})
+    monkeypatch.setattr(settings, "json_shards", 4)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_open_sharded, args=(tmp_path, w)) for w in range(PROCS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    from src.storage.sharded import ShardedStateRepository
+
+    repo = ShardedStateRepository(tmp_path, shards=4)
+    assert all(repo.get(f"u{i}", "c")["data"] == {"i": i} for i in range(50))
+    assert all(repo.get(f"w{w}", "c")["data"] == {"w": w} for w in range(PROCS))
+    assert not [p.name for p in tmp_path.iterdir() if p.name.startswith(".state.")]
+
+
+def _open_event_log(data_dir, worker):
+    from src.storage.event_log import EventLogConversationRepository
+
+    EventLogConversationRepository(data_dir).append_event("u0", "c", role="user", text=f"nuevo{worker}", max_items=1000)
+
+
+@fork
+def test_first_open_imports_event_log_once_across_processes(tmp_path):
+    legacy = ConversationRepository(tmp_path)
+    for i in range(40):
+        legacy.append_event(f"u{i % 4}", "c", role="user", text=str(i), max_items=1000)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_open_event_log, args=(tmp_path, w)) for w in range(6)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    from src.storage.event_log import EventLogConversationRepository
+
+    repo = EventLogConversationRepository(tmp_path)
+    texts = [h["text"] for h in repo.get_history("u0", "c", limit=0)]
+    # Historial importado una sola vez y antes de los eventos nuevos
+    assert texts[:10] == [str(i) for i in range(0, 40, 4)]
+    assert sorted(texts[10:]) == [f"nuevo{w}" for w in range(6)]
+    assert all(len(repo.get_history(f"u{u}", "c", limit=0)) == 10 for u in (1, 2, 3))